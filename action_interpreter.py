@@ -1,145 +1,251 @@
 # action_interpreter.py
 
 from __future__ import annotations
-from typing import List, Dict, Any, TYPE_CHECKING
+from typing import List, Dict, Any, Callable, TYPE_CHECKING
+
+from enums import TriggerPhase
+from expression import compile_expression, PURE_EFFECT_ATTRIBUTES
+from battle_log import battle_log, INFO, EffectsClearedEvent, FlagSetEvent, HealEvent
 
 if TYPE_CHECKING:
     from hero import Unit
     from effect import GenericEffect
 
+# 编译后的钩子：接收上下文字典，返回被动修饰符字典或 None
+HookCallable = Callable[[Dict[str, Any]], Any]
+
 class ActionInterpreter:
     """
     负责解释并执行在YAML中定义的 action 列表。
+
+    动作列表在加载时被编译成预绑定的可调用对象（处理函数、目标访问器和数值
+    计算都已解析完毕），运行时每个阶段只需一次直接调用。
     """
     def execute(self, actions: List[Dict[str, Any]], context: Dict[str, Any]) -> Any:
         """
         执行一系列动作。
+        每次调用都会重新编译，热路径应使用 compile_hooks 预先编译的结果。
         Args:
             actions (List[Dict]): 从效果定义中获取的动作列表。
             context (Dict): 执行动作所需的上下文，包含 effect, target, user 等。
         """
-        return_values = {}
-        for action in actions:
+        return self.compile(actions)(context)
+
+    def compile_hooks(self, logic_hooks: Dict[Any, Any]) -> Dict[TriggerPhase, HookCallable]:
+        """
+        将一个效果的全部 logic_hooks 编译为按触发阶段索引的可调用对象。
+        Args:
+            logic_hooks (Dict): 键为阶段名或 TriggerPhase，值为动作列表或自定义函数。
+        """
+        compiled = {}
+        for phase_key, actions in logic_hooks.items():
+            if isinstance(phase_key, TriggerPhase):
+                phase = phase_key
+            else:
+                phase = TriggerPhase.__members__.get(str(phase_key))
+                if phase is None:
+                    battle_log.warning(f"警告：未知的触发阶段 '{phase_key}'")
+                    continue
+            compiled[phase] = self.compile(actions)
+        return compiled
+
+    def compile(self, actions: Any) -> HookCallable:
+        """
+        将一个阶段的动作列表编译为单个可调用对象。
+        返回的对象带有 action_steps 属性：((动作类型, 单步可调用对象), ...)，
+        供 instrumentation 按动作类型计数和计时；以及 pure 属性：结果是否只取决于
+        效果本身（不读取持有者/施加者，也不是自定义函数），Unit 据此决定能否缓存被动属性。
+        """
+        # 通过 EffectFactory.register 注册的自定义逻辑函数
+        if callable(actions):
+            logic = actions
+            hook = lambda context: logic(context['effect'], context['target'])
+            hook.action_steps = (('CUSTOM', hook),)
+            hook.pure = False
+            return hook
+
+        steps = []
+        for action in actions or []:
             action_type = action.get('type')
             if action_type:
-                handler_method = getattr(self, f"_handle_{action_type.lower()}", None)
-
-                if handler_method:
-                    # 对于被动效果，我们需要收集返回值
-                    result = handler_method(action, context)
-                    if result:
-                        return_values.update(result)
+                compiler = getattr(self, f"_compile_{action_type.lower()}", None)
+                if compiler:
+                    steps.append((action_type.upper(), compiler(action)))
                 else:
-                    print(f"警告：未知的动作类型 '{action_type}'")
-        
-        if return_values:
-            return return_values
+                    battle_log.warning(f"警告：未知的动作类型 '{action_type}'")
 
-    def _resolve_value(self, value_def: Any, context: Dict[str, Any]) -> Any:
-        """解析一个值，可以是直接量，也可以是来自上下文的引用。"""
+        if not steps:
+            hook = lambda context: None
+            hook.action_steps = ()
+            hook.pure = True
+            return hook
+        if len(steps) == 1:
+            hook = steps[0][1]
+            hook.action_steps = tuple(steps)
+            hook.pure = getattr(hook, 'pure', False)
+            return hook
+        action_steps = tuple(steps)
+        steps = [step for _, step in action_steps]
+
+        def run_all(context: Dict[str, Any]) -> Any:
+            # 对于被动效果，我们需要收集返回值
+            return_values = {}
+            for step in steps:
+                result = step(context)
+                if result:
+                    return_values.update(result)
+            if return_values:
+                return return_values
+        run_all.action_steps = action_steps
+        run_all.pure = all(getattr(step, 'pure', False) for step in steps)
+        return run_all
+
+    def compile_value(self, value_def: Any) -> HookCallable:
+        """
+        编译一个值定义，可以是直接量，也可以是来自上下文的引用。
+        返回的可调用对象带有 pure 属性（见 compile）；pure 为 True 时结果只取决于效果本身，
+        可以用 {'effect': effect} 作为上下文预先求值。
+        """
         if isinstance(value_def, dict):
             source_name = value_def.get('source')
-            
+
             # 处理基于施加者攻击力的伤害计算
             if source_name == 'source_attack':
-                source_unit = context.get('user')  # 效果的施加者
-                if source_unit:
-                    base_attack = source_unit.attack
-                    multiplier = value_def.get('multiplier', 1.0)
-                    if isinstance(multiplier, str):
-                        effect = context.get('effect')
-                        if effect and hasattr(effect, 'params'):
-                            multiplier = effect.params.get(multiplier, 1.0)
-                        else:
-                            multiplier = 1.0
-                    return int(base_attack * multiplier)
-                return 0
-            
+                multiplier = value_def.get('multiplier', 1.0)
+                if isinstance(multiplier, str):
+                    param_name = multiplier
+                    def source_attack_by_param(context: Dict[str, Any]) -> int:
+                        source_unit = context.get('user')  # 效果的施加者
+                        if source_unit:
+                            effect = context.get('effect')
+                            if effect and hasattr(effect, 'params'):
+                                return int(source_unit.attack * effect.params.get(param_name, 1.0))
+                            return int(source_unit.attack)
+                        return 0
+                    source_attack_by_param.pure = False
+                    return source_attack_by_param
+
+                def source_attack(context: Dict[str, Any]) -> int:
+                    source_unit = context.get('user')
+                    if source_unit:
+                        return int(source_unit.attack * multiplier)
+                    return 0
+                source_attack.pure = False
+                return source_attack
+
             # 处理其他来源
-            if source_name:
-                source_obj = context.get(source_name) # e.g., context['effect']
-                if source_obj:
-                    value_key = value_def.get('value')
-                    if value_key:
+            value_key = value_def.get('value')
+            if source_name and value_key:
+                def from_source(context: Dict[str, Any]) -> Any:
+                    source_obj = context.get(source_name)  # e.g., context['effect']
+                    if source_obj:
                         return getattr(source_obj, value_key, 0)
-        # 简单的表达式求值 (警告: eval有风险，真实项目需使用更安全的解析器)
+                    return value_def
+                from_source.pure = source_name == 'effect' and value_key in PURE_EFFECT_ATTRIBUTES
+                return from_source
+        # 受限表达式，只编译一次并缓存；非法表达式在加载时抛出 ExpressionError
         elif isinstance(value_def, str):
-            try:
-                # 创建一个安全的局部命名空间来执行eval
-                local_namespace = {'effect': context.get('effect')}
-                return eval(value_def, {}, local_namespace)
-            except Exception as e:
-                print(f"表达式求值错误: {value_def}, 错误: {e}")
-                return 0
-        return value_def # 直接返回值
-
-    def _resolve_target(self, target_def: str, context: Dict[str, Any]) -> Unit | None:
-        """解析目标单位。"""
+            return compile_expression(value_def)
+        constant = lambda context: value_def  # 直接返回值
+        constant.pure = True
+        return constant
+
+    def _resolve_value(self, value_def: Any, context: Dict[str, Any]) -> Any:
+        """解析一个值，可以是直接量，也可以是来自上下文的引用。"""
+        return self.compile_value(value_def)(context)
+
+    def _compile_target(self, target_def: str) -> Callable[[Dict[str, Any]], Unit | None] | None:
+        """将目标定义解析为上下文访问器。"""
         if target_def == 'owner':
-            return context.get('target') # 效果的持有者
+            return lambda context: context.get('target')  # 效果的持有者
         elif target_def == 'source':
-            return context.get('user') # 效果的施加者
+            return lambda context: context.get('user')  # 效果的施加者
+        elif target_def == 'attacker':
+            # 仅在 ON_TAKE_DAMAGE / ON_DEAL_DAMAGE 中有效：本次伤害的来源
+            return lambda context: (context.get('damage_info') or {}).get('source')
+        elif target_def == 'victim':
+            # 仅在 ON_TAKE_DAMAGE / ON_DEAL_DAMAGE 中有效：本次伤害的承受者
+            return lambda context: (context.get('damage_info') or {}).get('target')
         return None
 
-    # --- 具体的 Action Handler ---
+    # --- 具体的 Action 编译器 ---
 
-    def _handle_deal_damage(self, params: Dict, context: Dict):
-        target_def = params.get('target')
-        if target_def:
-            target = self._resolve_target(target_def, context)
-            amount = self._resolve_value(params.get('amount'), context)
+    def _compile_deal_damage(self, params: Dict) -> HookCallable:
+        get_target = self._compile_target(params.get('target'))
+        get_amount = self.compile_value(params.get('amount'))
+        if get_target is None:
+            return lambda context: None
+
+        def deal_damage(context: Dict[str, Any]) -> None:
+            target = get_target(context)
+            amount = get_amount(context)
             if target and amount > 0:
-                # 持续伤害不触发暴击
+                # 持续伤害不触发暴击；在伤害钩子中造成的伤害不再触发伤害钩子
                 silent = context.get('silent', False)
-                target.take_damage(int(amount), is_crit=False, silent=silent)
+                target.take_damage(int(amount), is_crit=False, silent=silent,
+                                   source=context.get('user'), trigger_hooks='damage_info' not in context)
+        return deal_damage
+
+    def _compile_heal(self, params: Dict) -> HookCallable:
+        get_target = self._compile_target(params.get('target'))
+        get_amount = self.compile_value(params.get('amount'))
+        if get_target is None:
+            return lambda context: None
 
-    def _handle_heal(self, params: Dict, context: Dict):
-        target_def = params.get('target')
-        if target_def:
-            target = self._resolve_target(target_def, context)
-            amount = self._resolve_value(params.get('amount'), context)
+        def heal(context: Dict[str, Any]) -> None:
+            target = get_target(context)
+            amount = get_amount(context)
             if target and amount > 0:
                 heal_amount = min(amount, target.hp - target.current_hp)
                 target.current_hp += heal_amount
-                silent = context.get('silent', False)
-                if not silent:
-                    print(f"[{target.name}] 恢复了 {heal_amount} 点生命值，当前生命值: {target.current_hp}/{target.hp}")
+                if not context.get('silent', False) and battle_log.level <= INFO:
+                    battle_log.emit(HealEvent(target.name, heal_amount, target.current_hp, target.hp))
+        return heal
+
+    def _compile_clear_effects(self, params: Dict) -> HookCallable:
+        get_target = self._compile_target(params.get('target'))
+        if get_target is None:
+            return lambda context: None
 
-    def _handle_clear_effects(self, params: Dict, context: Dict):
-        target_def = params.get('target')
-        if target_def:
-            target = self._resolve_target(target_def, context)
+        def clear_effects(context: Dict[str, Any]) -> None:
+            target = get_target(context)
             if target and target.effects:
-                removed_effects = list(target.effects)
-                target.effects.clear()
                 silent = context.get('silent', False)
-                for effect in removed_effects:
-                    effect.on_remove(target, silent=silent)
-                if not silent:
-                    print(f"[{target.name}] 的所有效果被清除了！")
-
-    def _handle_set_flag(self, params: Dict, context: Dict):
-        target_def = params.get('target')
-        if target_def:
-            target = self._resolve_target(target_def, context)
-            flag_name = params.get('flag_name')
-            value = params.get('value')
-            if target and flag_name:
-                setattr(target, flag_name, value)
-                silent = context.get('silent', False)
-                if not silent:
-                    print(f"[{target.name}] 的状态标志 '{flag_name}' 被设置为 {value}。")
-    
-    def _handle_modify_attribute(self, params: Dict, context: Dict) -> Dict | None:
+                target.clear_effects(silent=silent)
+                if not silent and battle_log.level <= INFO:
+                    battle_log.emit(EffectsClearedEvent(target.name))
+        return clear_effects
+
+    def _compile_set_flag(self, params: Dict) -> HookCallable:
+        get_target = self._compile_target(params.get('target'))
+        flag_name = params.get('flag_name')
+        value = params.get('value')
+        if get_target is None or not flag_name:
+            return lambda context: None
+
+        def set_flag(context: Dict[str, Any]) -> None:
+            target = get_target(context)
+            if target:
+                target.set_flag(flag_name, value)
+                if not context.get('silent', False) and battle_log.level <= INFO:
+                    battle_log.emit(FlagSetEvent(target.name, flag_name, value))
+        return set_flag
+
+    def _compile_modify_attribute(self, params: Dict) -> HookCallable:
         """处理被动属性修改，它只返回值，不执行动作。"""
-        target_attr_name = context.get('attr_name')
-        effect_target_attr = context['effect'].params.get('target_attribute')
-
-        if target_attr_name == effect_target_attr:
-            returns = params.get('returns', {})
-            modifiers = {
-                'ratio': self._resolve_value(returns.get('ratio', 1.0), context),
-                'flat': self._resolve_value(returns.get('flat', 0.0), context)
-            }
-            return modifiers
-        return None
\ No newline at end of file
+        returns = params.get('returns', {})
+        get_ratio = self.compile_value(returns.get('ratio', 1.0))
+        get_flat = self.compile_value(returns.get('flat', 0.0))
+
+        def modify_attribute(context: Dict[str, Any]) -> Dict | None:
+            target_attr_name = context.get('attr_name')
+            effect_target_attr = context['effect'].params.get('target_attribute')
+
+            if target_attr_name == effect_target_attr:
+                return {
+                    'ratio': get_ratio(context),
+                    'flat': get_flat(context)
+                }
+            return None
+        modify_attribute.pure = get_ratio.pure and get_flat.pure
+        return modify_attribute
@@ -0,0 +1,251 @@
+# balance_evaluation.py
+"""
+数值平衡评估：用一组修改后的数值创建待调英雄，与对手进行一批固定种子的 1v1 战斗，
+统计胜率和战斗时长。
+
+- 第 i 场战斗的随机数流由 (seed, i) 派生，所以同一 seed 下不同候选数值面对的是
+  相同的随机序列（公共随机数），比较候选时方差更小，结果也与进程数无关。
+- 每个分片只创建一次待调英雄和对手，之后每场战斗前原地重置。
+- workers > 1 时分片在常驻进程池中运行；evaluate_many 把多组候选数值的全部分片
+  一次性提交，批量评估。
+- 可选的 MatchupCache 按单场缓存结果，重复或部分重叠的评估只模拟缺失的战斗。
+- 可选的 SequentialStopRule 使评估分批进行：胜率的置信区间足够窄或已判定高于/低于
+  阈值的候选提前停止，num_battles 成为每组数值的最大场数。
+"""
+from __future__ import annotations
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import headless_simulation
+from battle_rng import BattleRNG
+from headless_simulation import run_prepared_battle
+from matchup_cache import MatchupCache, Outcome, matchup_key
+from sequential_stopping import SequentialStopRule
+
+if TYPE_CHECKING:
+    from factory_unit import UnitFactory
+    from hero import Unit
+
+# 一组可调数值：基础属性名 -> 数值，技能名 -> 伤害倍率
+HeroStats = Dict[str, float]
+
+# 待调英雄视角的单场结果编码（与 WINNER_CODES 中待调英雄位于队伍1时一致）
+DRAW, HERO_WIN, HERO_LOSS = 0, 1, 2
+
+
+def tunable_stats(unit_factory: UnitFactory, hero_name: str) -> HeroStats:
+    """
+    从英雄模板中提取可调数值：全部基础属性，以及伤害倍率大于 0 的技能的倍率。
+    """
+    template = unit_factory._templates[hero_name]
+    stats = dict(template.get('base_stats', {}))
+    for skill_config in template.get('skills', []):
+        multiplier = skill_config.get('damage_multiplier', 0)
+        if skill_config.get('name') and multiplier > 0:
+            stats[skill_config['name']] = multiplier
+    return stats
+
+
+def create_tuned_unit(unit_factory: UnitFactory, hero_name: str, stats: HeroStats) -> Optional[Unit]:
+    """按给定数值创建英雄：基础属性通过模板覆盖，技能倍率直接写入技能实例。"""
+    base_stats = unit_factory._templates[hero_name].get('base_stats', {})
+    overrides = {name: value for name, value in stats.items() if name in base_stats}
+    unit = unit_factory.create(hero_name, **overrides)
+    if unit is None:
+        return None
+    for name, value in stats.items():
+        if name in unit.skills:
+            unit.skills[name].damage_multiplier = value
+        elif name not in base_stats:
+            raise KeyError(f"英雄 '{hero_name}' 没有可调数值 '{name}'")
+    return unit
+
+
+def evaluate_chunk(unit_factory: UnitFactory, hero_name: str, stats: HeroStats, opponent_names: Sequence[str],
+                   seed: int, indices: Sequence[int], swap_sides: bool = True) -> Dict[int, Outcome]:
+    """
+    运行给定序号的评估战斗，返回 {序号: (待调英雄视角的结果编码, 回合数)}。
+    第 i 场的对手为 opponent_names[i % 对手数]；swap_sides 时奇数场待调英雄在队伍2。
+    """
+    outcomes = {}
+    hero = create_tuned_unit(unit_factory, hero_name, stats)
+    opponents = {name: unit_factory.create(name) for name in dict.fromkeys(opponent_names)}
+    for i in indices:
+        opponent = opponents[opponent_names[i % len(opponent_names)]]
+        hero_is_team1 = not (swap_sides and i % 2)
+        teams = ([hero], [opponent]) if hero_is_team1 else ([opponent], [hero])
+        result = run_prepared_battle(*teams, silent=True, rng=BattleRNG.for_battle(seed, i))
+
+        hero_team = 'team1' if hero_is_team1 else 'team2'
+        if result['winner'] == 'draw':
+            code = DRAW
+        elif result['winner'] == hero_team:
+            code = HERO_WIN
+        else:
+            code = HERO_LOSS
+        outcomes[i] = (code, result['turns'])
+    return outcomes
+
+
+def summarize_evaluation(outcomes: Iterable[Outcome]) -> Dict[str, Any]:
+    """由逐场结果计算胜率、负率、平局率和回合数的均值与标准差。"""
+    counts = {DRAW: 0, HERO_WIN: 0, HERO_LOSS: 0}
+    battles = turns = turns_sq = 0
+    for code, battle_turns in outcomes:
+        counts[code] += 1
+        battles += 1
+        turns += battle_turns
+        turns_sq += battle_turns ** 2
+    if not battles:
+        return {'battles': 0, 'win_rate': 0.0, 'loss_rate': 0.0, 'draw_rate': 0.0,
+                'avg_turns': 0.0, 'turns_std': 0.0}
+    avg_turns = turns / battles
+    return {
+        'battles': battles,
+        'win_rate': counts[HERO_WIN] / battles,
+        'loss_rate': counts[HERO_LOSS] / battles,
+        'draw_rate': counts[DRAW] / battles,
+        'avg_turns': avg_turns,
+        'turns_std': math.sqrt(max(0.0, turns_sq / battles - avg_turns ** 2)),
+    }
+
+
+def _evaluate_chunk_in_worker(task):
+    return evaluate_chunk(headless_simulation._worker_unit_factory, *task)
+
+
+class BalanceEvaluator:
+    """
+    待调英雄的批量评估器。
+    Args:
+        unit_factory: 单进程评估时使用的工厂（工作进程各自加载一份）。
+        hero_name: 待调英雄。
+        opponent_names: 对手英雄名或名称列表，战斗按序号轮换对手。
+        num_battles: 每组数值评估的战斗场数。
+        seed: 评估使用的固定主种子。
+        workers: 工作进程数，大于 1 时使用常驻进程池。
+        swap_sides: 是否让待调英雄轮流站在两边，抵消同速时队伍1先手的优势。
+        cache: 可选的单场结果缓存。
+        stop_rule: 可选的序贯停止规则；给定时 num_battles 为最大场数，
+                   评估结果另含 'sequential'（置信区间、实际场数和停止原因）。
+    """
+
+    def __init__(self, unit_factory: UnitFactory, hero_name: str, opponent_names: Any,
+                 num_battles: int = 100, seed: int = 0, workers: int = 1, swap_sides: bool = True,
+                 cache: Optional[MatchupCache] = None, stop_rule: Optional[SequentialStopRule] = None):
+        self.unit_factory = unit_factory
+        self.hero_name = hero_name
+        self.opponent_names: Tuple[str, ...] = ((opponent_names,) if isinstance(opponent_names, str)
+                                                else tuple(opponent_names))
+        self.num_battles = num_battles
+        self.seed = seed
+        self.workers = workers
+        self.swap_sides = swap_sides
+        self.cache = cache
+        self.stop_rule = stop_rule
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def cache_key(self, stats: HeroStats) -> str:
+        return matchup_key(self.unit_factory, [(self.hero_name, stats)], list(self.opponent_names), self.seed,
+                           mode='balance', swap_sides=self.swap_sides)
+
+    def _tasks(self, stats: HeroStats, indices: Sequence[int]) -> List[tuple]:
+        chunk_size = max(1, -(-len(indices) // max(1, self.workers * 2)))
+        return [(self.hero_name, stats, self.opponent_names, self.seed,
+                 list(indices[start:start + chunk_size]), self.swap_sides)
+                for start in range(0, len(indices), chunk_size)]
+
+    def simulate_many(self, requests: Sequence[Tuple[HeroStats, Sequence[int]]]) -> List[Dict[int, Outcome]]:
+        """
+        模拟多组 (数值, 战斗序号列表)，返回每组的 {序号: 结果}。
+        所有分片一次性提交给进程池。
+        """
+        task_lists = [self._tasks(dict(stats), list(indices)) for stats, indices in requests]
+        tasks = [task for task_list in task_lists for task in task_list]
+        if self.workers > 1 and tasks:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=headless_simulation._init_worker)
+            chunks = list(self._executor.map(_evaluate_chunk_in_worker, tasks))
+        else:
+            chunks = [evaluate_chunk(self.unit_factory, *task) for task in tasks]
+
+        results, offset = [], 0
+        for task_list in task_lists:
+            merged = {}
+            for chunk in chunks[offset:offset + len(task_list)]:
+                merged.update(chunk)
+            results.append(merged)
+            offset += len(task_list)
+        return results
+
+    def outcomes_many(self, requests: Sequence[Tuple[HeroStats, Sequence[int]]]) -> List[Dict[int, Outcome]]:
+        """与 simulate_many 相同，但先查缓存，只模拟缺失的序号。"""
+        if self.cache is None:
+            return self.simulate_many(requests)
+        keys = [self.cache_key(stats) for stats, _ in requests]
+        found = [self.cache.get(key, indices) for key, (_, indices) in zip(keys, requests)]
+        missing = [[i for i in indices if i not in cached] for cached, (_, indices) in zip(found, requests)]
+        self.cache.hits += sum(len(cached) for cached in found)
+        self.cache.misses += sum(len(indices) for indices in missing)
+        simulated = self.simulate_many([(stats, indices) for (stats, _), indices in zip(requests, missing)])
+        for key, cached, new in zip(keys, found, simulated):
+            self.cache.put(key, new)
+            cached.update(new)
+        return found
+
+    def evaluate(self, stats: HeroStats) -> Dict[str, Any]:
+        """评估一组数值。"""
+        return self.evaluate_many([stats])[0]
+
+    def evaluate_many(self, stats_list: Sequence[HeroStats]) -> List[Dict[str, Any]]:
+        """批量评估多组数值，每组使用序号 0..num_battles-1 的战斗。"""
+        if self.stop_rule is not None:
+            return self._evaluate_sequential(stats_list)
+        indices = range(self.num_battles)
+        outcomes = self.outcomes_many([(stats, indices) for stats in stats_list])
+        return [summarize_evaluation(result[i] for i in indices) for result in outcomes]
+
+    def _evaluate_sequential(self, stats_list: Sequence[HeroStats]) -> List[Dict[str, Any]]:
+        """
+        分批评估：每轮把所有尚未停止的候选的下一批战斗一起提交，
+        各候选按自己的累计结果独立判断是否停止。
+        """
+        rule = self.stop_rule
+        batches = list(rule.batches(self.num_battles))
+        outcomes: List[Dict[int, Outcome]] = [{} for _ in stats_list]
+        wins = [0] * len(stats_list)
+        stopped_by: List[Optional[str]] = [None] * len(stats_list)
+        active = list(range(len(stats_list)))
+        for start, stop in batches:
+            if not active:
+                break
+            indices = range(start, stop)
+            new = self.outcomes_many([(stats_list[k], indices) for k in active])
+            still_active = []
+            for k, batch in zip(active, new):
+                outcomes[k].update(batch)
+                wins[k] += sum(1 for code, _ in batch.values() if code == HERO_WIN)
+                stopped_by[k] = rule.check(wins[k], len(outcomes[k]))
+                if stopped_by[k] is None:
+                    still_active.append(k)
+            active = still_active
+
+        evaluations = []
+        for k, result in enumerate(outcomes):
+            evaluation = summarize_evaluation(result[i] for i in sorted(result))
+            evaluation['sequential'] = rule.summarize(wins[k], len(result), stopped_by[k])
+            evaluations.append(evaluation)
+        return evaluations
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
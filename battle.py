@@ -1,13 +1,15 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from hero import Unit
+    from battle_rng import BattleRNG
 
 class Battle:
-    def __init__(self, unit1: Unit, unit2: Unit):
+    def __init__(self, unit1: Unit, unit2: Unit, rng: Optional[BattleRNG] = None):
         self.unit1 = unit1
         self.unit2 = unit2
+        self.rng = rng
         print("====== 战斗开始 ======")
         print(f"{self.unit1.name} VS {self.unit2.name}")
 
@@ -23,7 +25,7 @@ class Battle:
             # 当前攻击者行动
             print(f"\n轮到 [{attacker.name}] 行动...")
             attacker.process_turn_start()
-            attacker.act(defender)
+            attacker.act(defender, rng=self.rng)
             attacker.process_turn_end()
 
             # 检查战斗是否结束
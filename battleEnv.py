@@ -1,85 +1,213 @@
 import gymnasium as gym
 from gymnasium import spaces
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
 import numpy as np
 
-# 假设您已将所有工厂和无头战斗函数导入
 from factory_unit import UnitFactory
-from battle import run_headless_battle 
+from balance_evaluation import BalanceEvaluator, tunable_stats
+from matchup_cache import MatchupCache
+from sequential_stopping import SequentialStopRule
+
+# 低层动作：对所选数值做的相对修改幅度
+MODIFY_RATIOS = (-0.10, -0.05, -0.02, 0.02, 0.05, 0.10)
+
 
 class BalanceEnv(gym.Env):
     """
     一个用于平衡英雄数值的强化学习环境。
+
+    状态是待调英雄的可调数值（基础属性 + 各技能伤害倍率），按基准值归一化：
+    0.5 表示基准值，0 和 1 分别对应 0 倍和 2 倍基准值。
+    每一步修改一个数值，然后用固定种子跑一批无头战斗来评估，奖励越接近目标胜率越高。
     """
-    def __init__(self, unit_factory: UnitFactory, hero_name_to_tune: str, opponent_name: str):
+    def __init__(self, unit_factory: UnitFactory, hero_name_to_tune: str, opponent_name,
+                 num_battles: int = 100, seed: int = 0, workers: int = 1,
+                 target_win_rate: float = 0.5, target_turns: float = None, duration_weight: float = 0.0,
+                 max_steps: int = 1, evaluator: BalanceEvaluator = None, cache: MatchupCache = None,
+                 stop_rule: SequentialStopRule = None):
+        """
+        Args:
+            opponent_name: 对手英雄名，或多个对手的列表（评估战斗轮换对手）。
+            num_battles: 每步评估的战斗场数。
+            seed: 评估战斗的固定主种子。
+            workers: 评估使用的工作进程数。
+            target_win_rate: 目标胜率。
+            target_turns / duration_weight: 可选的目标回合数及其在奖励中的权重。
+            max_steps: 每个回合（episode）修改数值的步数。
+            evaluator: 共享的评估器，省略时按上述参数创建。
+            cache: 可选的单场结果缓存，重复评估相同数值时不再重新模拟。
+            stop_rule: 可选的序贯停止规则，胜率已足够确定时提前结束评估（num_battles 为上限）。
+        """
         super().__init__()
         self.unit_factory = unit_factory
         self.hero_name_to_tune = hero_name_to_tune
         self.opponent_name = opponent_name
-        
-        # 英雄的N个可调整数值 (hp, attack, armor, skill1_mult, ...)
-        # 我们将状态定义为这些数值的列表，并进行归一化
-        num_stats = 7 # 假设hp, atk, arm, spd, s1, s2, s3, s4
+        self.target_win_rate = target_win_rate
+        self.target_turns = target_turns
+        self.duration_weight = duration_weight
+        self.max_steps = max_steps
+
+        self._owns_evaluator = evaluator is None
+        self.evaluator = evaluator or BalanceEvaluator(unit_factory, hero_name_to_tune, opponent_name,
+                                                       num_battles=num_battles, seed=seed, workers=workers,
+                                                       cache=cache, stop_rule=stop_rule)
+
+        # 英雄的N个可调整数值 (hp, attack, armor, speed, crit_rate, 技能倍率...)
+        self.baseline_stats = self._get_baseline_stats()
+        self.stat_names = list(self.baseline_stats)
+        self._baseline = np.array([self.baseline_stats[name] for name in self.stat_names], dtype=np.float64)
+        num_stats = len(self.stat_names)
         self.observation_space = spaces.Box(low=0, high=1, shape=(num_stats,), dtype=np.float32)
 
         # 【核心】定义分层的动作空间
-        # 高层：选择要修改的属性 (7个属性 + 1个不变 = 8)
-        # 低层：选择修改的幅度 (6种)
+        # 高层：选择要修改的属性 (N个属性 + 1个不变)
+        # 低层：选择修改的幅度 (见 MODIFY_RATIOS)
         self.action_space = spaces.Tuple((
-            spaces.Discrete(8),
-            spaces.Discrete(6)
+            spaces.Discrete(num_stats + 1),
+            spaces.Discrete(len(MODIFY_RATIOS))
         ))
 
         # 用于存储当前正在调整的英雄的数值
-        self.current_stats = self._get_baseline_stats()
+        self.current_stats = dict(self.baseline_stats)
+        self.steps = 0
 
     def _get_baseline_stats(self) -> dict:
         """从YAML获取英雄的初始基准数值。"""
-        template = self.unit_factory._templates[self.hero_name_to_tune]
-        # ... 此处需要写逻辑来提取和组织数值 ...
-        return template['base_stats'] 
+        return tunable_stats(self.unit_factory, self.hero_name_to_tune)
+
+    def _stats_to_observation(self, stats: dict) -> np.ndarray:
+        values = np.array([stats[name] for name in self.stat_names], dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            observation = np.where(self._baseline > 0, values / (2 * self._baseline), 0.5)
+        return np.clip(observation, 0, 1).astype(np.float32)
 
     def reset(self, seed=None, options=None):
         """重置环境到一个初始状态。"""
         super().reset(seed=seed)
-        self.current_stats = self._get_baseline_stats()
+        self.current_stats = dict(self.baseline_stats)
+        self.steps = 0
         # 将 stats 字典转换为归一化的 numpy 数组
         observation = self._stats_to_observation(self.current_stats)
         info = {}
         return observation, info
 
+    def apply_modification(self, stats: dict, high_level_action: int, low_level_action: int) -> dict:
+        """按动作修改一个数值，返回新的数值字典。数值限制在 [0, 2 倍基准值]，暴击率不超过 1。"""
+        new_stats = dict(stats)
+        if high_level_action >= len(self.stat_names):
+            return new_stats
+        name = self.stat_names[high_level_action]
+        value = new_stats[name] * (1 + MODIFY_RATIOS[low_level_action])
+        upper = 2 * self.baseline_stats[name]
+        if name == 'crit_rate':
+            upper = min(upper, 1.0)
+        new_stats[name] = float(np.clip(value, 0, upper))
+        return new_stats
+
     def step(self, action):
         """
         环境的核心：执行一步操作（修改数值 -> 模拟 -> 计算奖励）。
         """
-        high_level_action, low_level_action = action
-        
-        # 1. 解码动作并应用修改 (这部分逻辑需要您详细实现)
-        #    apply_modification 会返回修改后的新数值字典
+        high_level_action, low_level_action = (int(a) for a in action)
+
+        # 1. 解码动作并应用修改
         new_stats = self.apply_modification(self.current_stats, high_level_action, low_level_action)
-        
+
         # 2. 使用修改后的数值创建英雄，并进行大量无头战斗来评估
         #    这是整个环境中最耗时的部分
-        win_rate, avg_duration, ... = self.run_evaluation(new_stats)
-        
+        evaluation = self.run_evaluation(new_stats)
+        return self._finish_step(new_stats, evaluation)
+
+    def _finish_step(self, new_stats: dict, evaluation: dict):
         # 3. 根据评估结果，计算奖励值
-        reward = self.calculate_reward(win_rate, avg_duration, ...)
-        
+        reward = self.calculate_reward(evaluation['win_rate'], evaluation['avg_turns'])
+
         # 4. 更新环境状态
         self.current_stats = new_stats
+        self.steps += 1
         observation = self._stats_to_observation(self.current_stats)
-        
-        # 在这个“调参”任务中，每一步都是一个完整的“实验”，所以可以认为每一步都结束了
-        terminated = True
+
+        # 在这个“调参”任务中，每一步都是一个完整的“实验”；默认每一步都结束一个回合
+        terminated = self.steps >= self.max_steps
         truncated = False
-        info = {}
-        
+        info = dict(evaluation)
+
         return observation, reward, terminated, truncated, info
 
-    def run_evaluation(self, stats_to_test: dict) -> tuple:
-        """运行N次无头战斗，返回平均结果。"""
-        # ...
-        # hero_to_tune = self.unit_factory.create(self.hero_name_to_tune, **stats_to_test)
-        # opponent = self.unit_factory.create(self.opponent_name)
-        # results = [run_headless_battle(hero_to_tune, opponent) for _ in range(100)]
-        # ... 计算并返回平均胜率、时长等
-        pass
+    def run_evaluation(self, stats_to_test: dict) -> dict:
+        """
+        用给定数值运行一批固定种子的无头战斗，返回
+        {'battles', 'win_rate', 'loss_rate', 'draw_rate', 'avg_turns', 'turns_std'}。
+        """
+        return self.evaluator.evaluate(stats_to_test)
+
+    def calculate_reward(self, win_rate: float, avg_duration: float) -> float:
+        """胜率等于目标胜率时奖励为 1，偏离越多越低；可选地惩罚偏离目标回合数。"""
+        reward = 1.0 - 2.0 * abs(win_rate - self.target_win_rate)
+        if self.target_turns and self.duration_weight:
+            reward -= self.duration_weight * abs(avg_duration - self.target_turns) / self.target_turns
+        return float(reward)
+
+    def close(self):
+        if self._owns_evaluator:
+            self.evaluator.close()
+
+
+class BalanceVectorEnv(VectorEnv):
+    """
+    BalanceEnv 的向量化版本：num_envs 个子环境共享一个评估器，
+    每一步把所有子环境的候选数值交给 evaluate_many 一次性批量评估。
+    回合结束的子环境在同一步内自动重置（SAME_STEP），结束时的观测放在 infos['final_obs']。
+    """
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, unit_factory: UnitFactory, hero_name_to_tune: str, opponent_name, num_envs: int,
+                 num_battles: int = 100, seed: int = 0, workers: int = 1, cache: MatchupCache = None,
+                 stop_rule: SequentialStopRule = None, **env_kwargs):
+        self.evaluator = BalanceEvaluator(unit_factory, hero_name_to_tune, opponent_name,
+                                          num_battles=num_battles, seed=seed, workers=workers, cache=cache,
+                                          stop_rule=stop_rule)
+        self.envs = [BalanceEnv(unit_factory, hero_name_to_tune, opponent_name,
+                                evaluator=self.evaluator, **env_kwargs)
+                     for _ in range(num_envs)]
+        self.num_envs = num_envs
+        self.single_observation_space = self.envs[0].observation_space
+        self.single_action_space = self.envs[0].action_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self._observations = np.zeros((num_envs,) + self.single_observation_space.shape, dtype=np.float32)
+
+    def reset(self, seed=None, options=None):
+        seeds = [None] * self.num_envs
+        if isinstance(seed, int):
+            seeds = [seed + i for i in range(self.num_envs)]
+        elif seed is not None:
+            seeds = list(seed)
+        infos = {}
+        for i, env in enumerate(self.envs):
+            self._observations[i], info = env.reset(seed=seeds[i], options=options)
+            infos = self._add_info(infos, info, i)
+        return self._observations.copy(), infos
+
+    def step(self, actions):
+        high_actions, low_actions = (np.asarray(a) for a in actions)
+        candidates = [env.apply_modification(env.current_stats, int(high_actions[i]), int(low_actions[i]))
+                      for i, env in enumerate(self.envs)]
+        evaluations = self.evaluator.evaluate_many(candidates)
+
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminations = np.zeros(self.num_envs, dtype=np.bool_)
+        truncations = np.zeros(self.num_envs, dtype=np.bool_)
+        infos = {}
+        for i, env in enumerate(self.envs):
+            observation, rewards[i], terminations[i], truncations[i], info = env._finish_step(candidates[i], evaluations[i])
+            if terminations[i] or truncations[i]:
+                info['final_obs'] = observation
+                observation, _ = env.reset()
+            self._observations[i] = observation
+            infos = self._add_info(infos, info, i)
+        return self._observations.copy(), rewards, terminations, truncations, infos
+
+    def close_extras(self, **kwargs):
+        self.evaluator.close()
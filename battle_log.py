@@ -0,0 +1,280 @@
+# battle_log.py
+"""
+战斗事件日志。
+
+战斗中发生的事情（伤害、治疗、效果施加/移除、眩晕、技能释放……）以类型化的事件
+对象发送给按级别过滤的 BattleLog，再由日志分发给各个接收者（sink）。控制台上的
+中文战斗播报只是其中一个接收者 ConsoleRenderer。
+
+调用方在构造事件之前先检查级别：
+
+    if battle_log.level <= INFO:
+        battle_log.emit(DamageEvent(...))
+
+级别关闭时只有一次整数比较，不会格式化字符串，也不会解析单位属性。
+事件中保存的是发生时刻的名字和数值快照，不持有单位对象。
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, ClassVar, Dict, Iterator, List, Optional
+
+# 日志级别，数值与标准库 logging 一致
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': OFF}
+
+
+# --- 事件类型 ---
+
+@dataclass
+class BattleEvent:
+    level: ClassVar[int] = INFO
+
+
+@dataclass
+class BattleStartEvent(BattleEvent):
+    team1: List[str]
+    team2: List[str]
+
+
+@dataclass
+class RoundStartEvent(BattleEvent):
+    turn: int
+
+
+@dataclass
+class UnitTurnEvent(BattleEvent):
+    """MultiBattle 中轮到某个单位行动。"""
+    unit: str
+
+
+@dataclass
+class TurnStartEvent(BattleEvent):
+    unit: str
+    hp: int
+    max_hp: int
+
+
+@dataclass
+class TurnEndEvent(BattleEvent):
+    unit: str
+
+
+@dataclass
+class StunnedEvent(BattleEvent):
+    unit: str
+
+
+@dataclass
+class NormalAttackEvent(BattleEvent):
+    unit: str
+
+
+@dataclass
+class SkillCastEvent(BattleEvent):
+    unit: str
+    skill: str
+
+
+@dataclass
+class SkillNotReadyEvent(BattleEvent):
+    unit: str
+    skill: str
+
+
+@dataclass
+class DamageEvent(BattleEvent):
+    target: str
+    reduced: int
+    damage: int
+    hp: int
+    max_hp: int
+    is_crit: bool = False
+
+
+@dataclass
+class HealEvent(BattleEvent):
+    target: str
+    amount: int
+    hp: int
+    max_hp: int
+
+
+@dataclass
+class EffectAppliedEvent(BattleEvent):
+    target: str
+    effect: str
+    potency: float
+    duration: Any
+
+
+@dataclass
+class EffectRemovedEvent(BattleEvent):
+    target: str
+    effect: str
+
+
+@dataclass
+class EffectsClearedEvent(BattleEvent):
+    target: str
+
+
+@dataclass
+class FlagSetEvent(BattleEvent):
+    target: str
+    flag: str
+    value: Any
+
+
+@dataclass
+class BattleEndEvent(BattleEvent):
+    winner: str
+    survivors: List[str]
+    team1_states: List[str] = field(default_factory=list)
+    team2_states: List[str] = field(default_factory=list)
+
+
+@dataclass
+class WarningEvent(BattleEvent):
+    level: ClassVar[int] = WARNING
+    message: str
+
+
+@dataclass
+class ErrorEvent(BattleEvent):
+    level: ClassVar[int] = ERROR
+    message: str
+
+
+EventSink = Callable[[BattleEvent], None]
+
+
+# --- 日志 ---
+
+class BattleLog:
+    """
+    按级别过滤的事件分发器。
+    Args:
+        level: 低于该级别的事件被丢弃。
+        sinks: 接收事件的可调用对象列表。
+    """
+
+    def __init__(self, level: int = INFO, sinks: Optional[List[EventSink]] = None):
+        self.level = level
+        self.sinks: List[EventSink] = list(sinks) if sinks is not None else []
+
+    def is_enabled(self, level: int) -> bool:
+        return self.level <= level
+
+    def set_level(self, level: Any):
+        """设置级别，接受整数或 'debug'/'info'/'warning'/'error'/'off'。"""
+        self.level = LEVEL_NAMES[level.lower()] if isinstance(level, str) else level
+
+    def add_sink(self, sink: EventSink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink: EventSink):
+        self.sinks.remove(sink)
+
+    def emit(self, event: BattleEvent):
+        if event.level < self.level:
+            return
+        for sink in self.sinks:
+            sink(event)
+
+    def warning(self, message: str):
+        if self.level <= WARNING:
+            self.emit(WarningEvent(message))
+
+    def error(self, message: str):
+        if self.level <= ERROR:
+            self.emit(ErrorEvent(message))
+
+    @contextmanager
+    def capture(self, level: int = INFO, console: bool = False) -> Iterator[List[BattleEvent]]:
+        """
+        临时收集事件到列表中，退出时恢复原来的级别和接收者。
+        Args:
+            level: 收集期间使用的级别。
+            console: 是否同时保留原有的接收者（如控制台输出）。
+        """
+        events: List[BattleEvent] = []
+        saved = (self.level, self.sinks)
+        self.level = level
+        self.sinks = (list(self.sinks) if console else []) + [events.append]
+        try:
+            yield events
+        finally:
+            self.level, self.sinks = saved
+
+
+# --- 控制台渲染 ---
+
+def _render_battle_end(e: BattleEndEvent) -> str:
+    if e.winner == 'team1':
+        lines = ["\n====== 战斗结束 ======", "🏆 队伍1胜利！", f"存活成员: {', '.join(e.survivors)}"]
+    elif e.winner == 'team2':
+        lines = ["\n====== 战斗结束 ======", "🏆 队伍2胜利！", f"存活成员: {', '.join(e.survivors)}"]
+    else:
+        lines = ["\n====== 战斗结束 ======", "平局！"]
+    lines += ["\n最终状态：", "队伍1:"] + [f"  {state}" for state in e.team1_states]
+    lines += ["队伍2:"] + [f"  {state}" for state in e.team2_states]
+    return '\n'.join(lines)
+
+
+def _render_damage(e: DamageEvent) -> str:
+    line = f"[{e.target}] 护甲减免了 {e.reduced} 点伤害，受到了 {e.damage} 点伤害，当前生命值: {e.hp}/{e.max_hp}"
+    if e.is_crit:
+        return f"[暴击！]{e.target} 受到暴击伤害！\n{line}"
+    return line
+
+
+_CONSOLE_FORMATS: Dict[type, Callable[[Any], str]] = {
+    BattleStartEvent: lambda e: (f"====== 多英雄战斗开始 ======\n"
+                                 f"队伍1 ({len(e.team1)}人): {', '.join(e.team1)}\n"
+                                 f"队伍2 ({len(e.team2)}人): {', '.join(e.team2)}"),
+    RoundStartEvent: lambda e: f"\n★★★★★ 回合 {e.turn} ★★★★★",
+    UnitTurnEvent: lambda e: f"\n轮到 [{e.unit}] 行动...",
+    TurnStartEvent: lambda e: f"\n[{e.unit}] 的回合开始，当前生命值: {e.hp}/{e.max_hp}",
+    TurnEndEvent: lambda e: f"--- [{e.unit}] 的回合结束 ---",
+    StunnedEvent: lambda e: f"[{e.unit}] 处于眩晕状态，无法行动！",
+    NormalAttackEvent: lambda e: f"[{e.unit}] 没有可用的技能，执行普通攻击。",
+    SkillCastEvent: lambda e: f"[{e.unit}] 使用了技能：『{e.skill}』!",
+    SkillNotReadyEvent: lambda e: f"[{e.unit}] 尝试使用 [{e.skill}]，但技能尚未冷却！",
+    DamageEvent: _render_damage,
+    HealEvent: lambda e: f"[{e.target}] 恢复了 {e.amount} 点生命值，当前生命值: {e.hp}/{e.max_hp}",
+    EffectAppliedEvent: lambda e: f"[{e.target}] 获得了效果：[{e.effect}]（效力：{e.potency}, 持续：{e.duration}回合）。",
+    EffectRemovedEvent: lambda e: f"[{e.target}] 的效果 [{e.effect}] 消失了。",
+    EffectsClearedEvent: lambda e: f"[{e.target}] 的所有效果被清除了！",
+    FlagSetEvent: lambda e: f"[{e.target}] 的状态标志 '{e.flag}' 被设置为 {e.value}。",
+    BattleEndEvent: _render_battle_end,
+    WarningEvent: lambda e: e.message,
+    ErrorEvent: lambda e: e.message,
+}
+
+
+class ConsoleRenderer:
+    """把事件渲染为原有的中文战斗播报并打印到标准输出。"""
+
+    def __init__(self, formats: Optional[Dict[type, Callable[[Any], str]]] = None):
+        self.formats = dict(_CONSOLE_FORMATS)
+        if formats:
+            self.formats.update(formats)
+
+    def render(self, event: BattleEvent) -> Optional[str]:
+        formatter = self.formats.get(type(event))
+        return formatter(event) if formatter is not None else None
+
+    def __call__(self, event: BattleEvent):
+        text = self.render(event)
+        if text is not None:
+            print(text)
+
+
+# 全局日志实例，默认以 INFO 级别输出到控制台
+battle_log = BattleLog(INFO, [ConsoleRenderer()])
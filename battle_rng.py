@@ -0,0 +1,119 @@
+# battle_rng.py
+"""
+单场战斗的确定性随机数流。
+
+每场战斗使用自己的 BattleRNG，由主种子和战斗序号通过 NumPy 的 SeedSequence
+派生（spawn_key=战斗序号），所以同一主种子下每场战斗的随机数与战斗在哪个进程、
+哪个分片中运行无关，不同战斗的随机数流也互不重叠。
+
+均匀分布随机数按块（block_size 个）从 NumPy Generator 预取成 Python float 列表，
+之后通过游标逐个取出，暴击判定和目标选择不再逐次调用随机数库。
+"""
+from __future__ import annotations
+import random as _random
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+
+DEFAULT_BLOCK_SIZE = 256
+
+
+class BattleRNG:
+    """
+    Args:
+        seed: 传给 numpy.random.PCG64 的种子，可以是整数、整数序列或 SeedSequence；
+              省略时使用操作系统熵。
+        block_size: 每次预取的随机数个数。
+    """
+
+    def __init__(self, seed: Any = None, block_size: int = DEFAULT_BLOCK_SIZE):
+        self._generator = np.random.Generator(np.random.PCG64(seed))
+        self.block_size = block_size
+        self._block: List[float] = []
+        self._cursor = 0
+        # 取出当前块之后的生成器状态，由 snapshot 按需读取；块只会被整体替换，不会原地修改
+        self._block_state: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def for_battle(cls, master_seed: int, battle_index: int, block_size: int = DEFAULT_BLOCK_SIZE) -> BattleRNG:
+        """由主种子和战斗序号派生出单场战斗的随机数流。"""
+        return cls(np.random.SeedSequence(master_seed, spawn_key=(battle_index,)), block_size)
+
+    @classmethod
+    def from_global_random(cls, block_size: int = DEFAULT_BLOCK_SIZE) -> BattleRNG:
+        """用全局 random 模块取一个种子，使 random.seed() 仍能复现未显式传入随机数流的战斗。"""
+        return cls(_random.getrandbits(64), block_size)
+
+    def _refill(self):
+        self._block = self._generator.random(self.block_size).tolist()
+        self._cursor = 0
+        self._block_state = None
+
+    def random(self) -> float:
+        """返回 [0, 1) 区间的均匀分布随机数。"""
+        cursor = self._cursor
+        if cursor >= len(self._block):
+            self._refill()
+            cursor = 0
+        self._cursor = cursor + 1
+        return self._block[cursor]
+
+    def _index(self, n: int) -> int:
+        """返回 [0, n) 区间的随机整数。"""
+        index = int(self.random() * n)
+        return index if index < n else n - 1
+
+    def choice(self, seq: Sequence[T]) -> T:
+        if not seq:
+            raise IndexError("不能从空序列中选择")
+        return seq[self._index(len(seq))]
+
+    def sample(self, population: Sequence[T], k: int) -> List[T]:
+        """不放回地随机选择 k 个元素（部分 Fisher-Yates 洗牌），结果按抽取顺序排列。"""
+        n = len(population)
+        if not 0 <= k <= n:
+            raise ValueError("样本数量超出总体大小")
+        if k == 1:
+            # 与下面洗牌的第一步抽取结果相同，省去复制
+            return [population[self._index(n)]]
+        pool = list(population)
+        for i in range(k):
+            j = i + self._index(n - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+    # --- 状态保存与恢复 ---
+
+    def getstate(self) -> Dict[str, Any]:
+        return {
+            'bit_generator': self._generator.bit_generator.state,
+            'block': list(self._block),
+            'cursor': self._cursor,
+        }
+
+    def setstate(self, state: Dict[str, Any]):
+        self._generator.bit_generator.state = state['bit_generator']
+        self._block = list(state['block'])
+        self._cursor = state['cursor']
+        self._block_state = None
+
+    def snapshot(self) -> Tuple[Dict[str, Any], List[float], int]:
+        """
+        轻量的状态快照，供频繁保存/恢复（如树搜索）使用：与当前块共享列表，不复制；
+        同一块内的多次快照共享同一份生成器状态。快照只能用 restore 恢复，不要修改。
+        """
+        state = self._block_state
+        if state is None:
+            state = self._block_state = self._generator.bit_generator.state
+        return state, self._block, self._cursor
+
+    def restore(self, snapshot: Tuple[Dict[str, Any], List[float], int]):
+        """恢复 snapshot 的结果；仍在同一块内时只移动游标。"""
+        state, block, cursor = snapshot
+        if block is not self._block:
+            self._generator.bit_generator.state = state
+            self._block = block
+            self._block_state = state
+        self._cursor = cursor
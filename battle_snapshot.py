@@ -0,0 +1,176 @@
+# battle_snapshot.py
+"""
+MultiBattle 可变状态的快照与原地恢复，供树搜索（MCTS、前瞻推演）反复回到同一局面。
+
+快照不复制单位、技能和效果对象，只记录会在战斗中变化的数值，全部放在一个 array('d') 里：
+  [回合数, 行动位置, 是否等待决策, 本回合行动顺序长度 (尚未开始为 -1), 行动顺序中各单位的编号...,
+   然后每个单位依次为: 当前生命值, 是否眩晕, 各技能冷却..., 效果数, 每个效果的 (持续回合, 效力)...]
+效果实例本身按引用保存在一个元组里（名称、钩子、参数、来源在创建后都不会变化），
+恢复时把同一批实例按原顺序放回单位上，并重建阶段订阅和被动索引。
+被 SET_FLAG 修改过的自定义标志（很少见）单独保存；随机数流使用 BattleRNG.snapshot，
+与当前预取块共享列表。
+
+整数值会恢复为 int。不包含的状态：单位的基础属性（战斗中不会变化，修改请用 set_attribute
+并重新快照），以及自定义逻辑保存在效果实例上的额外字段。
+
+用法（在决策点保存，反复尝试不同的行动）：
+    snapshot = capture(battle)
+    ...推进战斗...
+    game.close()
+    restore(battle, snapshot)
+    game = battle.play(controlled_team, resume=True)
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from effect import GenericEffect
+    from hero import Unit
+    from multi_battle import MultiBattle
+
+
+class BattleSnapshot:
+    """capture 的结果。values 是数值状态，effects 是按单位顺序排列的效果实例。"""
+    __slots__ = ('values', 'effects', 'flags', 'rng')
+
+    def __init__(self, values: array, effects: Tuple[GenericEffect, ...],
+                 flags: Optional[Dict[int, Dict[str, Any]]], rng: Tuple[Any, ...]):
+        self.values = values
+        self.effects = effects
+        self.flags = flags
+        self.rng = rng
+
+    def nbytes(self) -> int:
+        """数值缓冲区和效果引用占用的字节数（不含共享的随机数块）。"""
+        return self.values.itemsize * len(self.values) + 8 * len(self.effects)
+
+
+def _number(value: float) -> Any:
+    return int(value) if value.is_integer() else value
+
+
+def capture(battle: MultiBattle) -> BattleSnapshot:
+    """保存战斗的当前状态。"""
+    round_order = battle._round
+    if round_order is None:
+        data = [battle.turn, battle._round_pos, battle._awaiting, -1]
+    else:
+        unit_index = battle._unit_index
+        data = [battle.turn, battle._round_pos, battle._awaiting, len(round_order)]
+        data.extend([unit_index[unit] for unit in round_order])
+
+    append = data.append
+    effects: List[GenericEffect] = []
+    flags = None
+    for i, unit in enumerate(battle._units):
+        append(unit._current_hp)
+        append(unit.is_stunned)
+        for skill in unit.skills.values():
+            append(skill.current_cooldown)
+        unit_effects = unit.effects
+        append(len(unit_effects))
+        for effect in unit_effects:
+            append(effect.duration)
+            append(effect._potency)
+        effects.extend(unit_effects)
+        if unit._touched_flags:
+            if flags is None:
+                flags = {}
+            flags[i] = {name: getattr(unit, name) for name in unit._touched_flags}
+    return BattleSnapshot(array('d', data), tuple(effects), flags, battle.rng.snapshot())
+
+
+def _restore_effects(unit: Unit, saved: List[GenericEffect]) -> bool:
+    """把单位的效果列表换成 saved，返回列表是否有变化。"""
+    current = unit.effects
+    if current == saved:
+        return False
+    for effect in current:
+        if effect.owner is unit:
+            effect.owner = None
+    current[:] = saved
+    # 与逐个 add_effect 的结果相同：订阅列表和被动索引都按效果列表的顺序排列
+    unit._phase_subscribers.clear()
+    unit._passive_index.clear()
+    for effect in saved:
+        unit._subscribe(effect)
+        for name in unit._passive_attribute_names(effect):
+            unit._passive_index.setdefault(name, []).append(effect)
+    return True
+
+
+def _restore_flags(unit: Unit, saved: Optional[Dict[str, Any]]):
+    for name in unit._touched_flags:
+        if saved is None or name not in saved:
+            if name in unit._FLAG_DEFAULTS:
+                setattr(unit, name, unit._FLAG_DEFAULTS[name])
+            else:
+                unit.__dict__.pop(name, None)
+    if saved is None:
+        unit._touched_flags.clear()
+        return
+    unit._touched_flags = set(saved)
+    for name, value in saved.items():
+        setattr(unit, name, value)
+
+
+def restore(battle: MultiBattle, snapshot: BattleSnapshot):
+    """
+    把战斗原地恢复到 snapshot 保存时的状态。正在运行的 play() 生成器不能继续使用，
+    应先关闭它，恢复后用 play(controlled_team, resume=True) 继续。
+    """
+    values = snapshot.values.tolist()
+    battle.turn = int(values[0])
+    battle._round_pos = int(values[1])
+    battle._awaiting = bool(values[2])
+    units = battle._units
+    round_length = int(values[3])
+    pos = 4
+    if round_length < 0:
+        battle._round = None
+    else:
+        battle._round = [units[int(index)] for index in values[pos:pos + round_length]]
+        pos += round_length
+
+    effects = snapshot.effects
+    effect_pos = 0
+    flags = snapshot.flags
+    for i, unit in enumerate(units):
+        if unit._touched_flags or (flags is not None and i in flags):
+            _restore_flags(unit, flags.get(i) if flags is not None else None)
+        hp = values[pos]
+        if unit._current_hp != hp:
+            unit._current_hp = _number(hp)
+        unit.is_stunned = bool(values[pos + 1])
+        pos += 2
+        for skill in unit.skills.values():
+            skill.current_cooldown = int(values[pos])
+            pos += 1
+
+        count = int(values[pos])
+        pos += 1
+        saved = list(effects[effect_pos:effect_pos + count]) if count else []
+        effect_pos += count
+        potency_changed = False
+        for effect in saved:
+            duration, potency = values[pos], values[pos + 1]
+            pos += 2
+            if effect.duration != duration:
+                effect.duration = _number(duration)
+            if effect._potency != potency:
+                effect._potency = _number(potency)
+                potency_changed = True
+            effect.owner = unit
+        effects_changed = _restore_effects(unit, saved)
+
+        if effects_changed or (potency_changed and unit._passive_index):
+            unit._attr_cache.clear()
+            battle.on_unit_attribute_changed(unit, None)
+        if effects_changed:
+            battle.on_unit_effects_changed(unit)
+
+    # 存活列表原地重建（play() 持有它们的引用）
+    for team_id, team in enumerate(battle._teams):
+        battle._alive[team_id][:] = [unit for unit in team if unit._current_hp > 0]
+    battle.rng.restore(snapshot.rng)
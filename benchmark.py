@@ -0,0 +1,243 @@
+# benchmark.py
+"""
+战斗热路径的基准测试。
+
+用法：
+    python benchmark.py                        # 运行全部基准并打印结果
+    python benchmark.py --save baseline.json   # 保存为基线
+    python benchmark.py --compare baseline.json  # 与保存的基线对比
+    python benchmark.py -k battle              # 只运行名称包含 battle 的基准
+
+每个基准都使用固定种子，先预热再重复测量，报告每次操作耗时的中位数、最小值、
+平均值和标准差。
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from headless_simulation import load_factories
+from multi_battle import MultiBattle
+
+BENCH_SEED = 20240101
+
+# 基准设置函数：接收 unit_factory，返回 (每次测量执行的函数, 该函数内部的操作次数)
+BenchSetup = Callable[..., Tuple[Callable[[], None], int]]
+BENCHMARKS: Dict[str, BenchSetup] = {}
+
+
+def benchmark(name: str):
+    """注册一个基准设置函数。"""
+    def decorator(setup: BenchSetup) -> BenchSetup:
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def _first_hero(unit_factory):
+    return next(iter(unit_factory._templates))
+
+
+@benchmark('attr_read_plain')
+def bench_attr_read_plain(unit_factory):
+    """没有任何效果时读取 attack/armor/speed/crit_rate。"""
+    unit = unit_factory.create(_first_hero(unit_factory))
+    loops = 10000
+
+    def run():
+        for _ in range(loops):
+            unit.attack; unit.armor; unit.speed; unit.crit_rate
+    return run, loops * 4
+
+
+@benchmark('attr_read_passive')
+def bench_attr_read_passive(unit_factory):
+    """挂着三个被动效果（虚弱、护甲强化、减速）时读取属性。"""
+    effect_factory = unit_factory.skill_factory.effect_factory
+    unit = unit_factory.create(_first_hero(unit_factory))
+    for effect_name in ('虚弱', '护甲强化', '减速'):
+        unit.add_effect(effect_factory.create(effect_name, duration=float('inf')), silent=True)
+    loops = 10000
+
+    def run():
+        for _ in range(loops):
+            unit.attack; unit.armor; unit.speed; unit.crit_rate
+    return run, loops * 4
+
+
+@benchmark('take_damage')
+def bench_take_damage(unit_factory):
+    """对带护甲的单位结算伤害。"""
+    unit = unit_factory.create(_first_hero(unit_factory))
+    loops = 10000
+
+    def run():
+        unit.current_hp = 10 ** 9
+        for _ in range(loops):
+            unit.take_damage(100, is_crit=False, silent=True)
+    return run, loops
+
+
+@benchmark('effect_apply_expire')
+def bench_effect_apply_expire(unit_factory):
+    """施加一个持续伤害和一个被动效果，再通过 process_turn_end 让它们过期。"""
+    effect_factory = unit_factory.skill_factory.effect_factory
+    names = list(unit_factory._templates)
+    unit = unit_factory.create(names[0])
+    source = unit_factory.create(names[1])
+    loops = 1000
+
+    def run():
+        for _ in range(loops):
+            for effect_name in ('剧毒', '虚弱'):
+                effect = effect_factory.create(effect_name)
+                effect.source = source
+                unit.add_effect(effect, silent=True)
+            while unit.effects:
+                unit.process_turn_end(silent=True)
+    return run, loops
+
+
+@benchmark('unit_factory_create')
+def bench_unit_factory_create(unit_factory):
+    """按模板创建每个英雄。"""
+    names = list(unit_factory._templates)
+    loops = 200
+
+    def run():
+        for _ in range(loops):
+            for name in names:
+                unit_factory.create(name)
+    return run, loops * len(names)
+
+
+def _battle_setup(team_size: int, battles: int, allow_repeats: bool = False):
+    def setup(unit_factory):
+        names = list(unit_factory._templates)
+        rng = random.Random(BENCH_SEED)
+        matchups = []
+        for _ in range(battles):
+            if allow_repeats:
+                team1 = rng.choices(names, k=team_size)
+                team2 = rng.choices(names, k=team_size)
+            else:
+                team1 = rng.sample(names, team_size)
+                team2 = rng.sample([h for h in names if h not in team1], team_size)
+            matchups.append((team1, team2))
+
+        def run():
+            random.seed(BENCH_SEED)
+            for team1, team2 in matchups:
+                MultiBattle([unit_factory.create(h) for h in team1],
+                            [unit_factory.create(h) for h in team2],
+                            silent=True).run()
+        return run, battles
+    return setup
+
+
+benchmark('battle_1v1')(_battle_setup(1, 100))
+benchmark('battle_3v3')(_battle_setup(3, 50))
+benchmark('battle_4v4')(_battle_setup(4, 40))
+benchmark('battle_large_20v20')(_battle_setup(20, 5, allow_repeats=True))
+
+
+def run_benchmarks(names: List[str] = None, repeats: int = 7, warmup: int = 1) -> Dict[str, Dict]:
+    """
+    运行基准测试，返回 {基准名: 统计结果}，耗时单位为微秒/次操作。
+    Args:
+        names: 要运行的基准名，默认全部。
+        repeats: 每个基准的测量次数。
+        warmup: 测量前的预热次数。
+    """
+    unit_factory = load_factories(silent=True)
+    results = {}
+    for name in names or list(BENCHMARKS):
+        random.seed(BENCH_SEED)
+        run, operations = BENCHMARKS[name](unit_factory)
+        for _ in range(warmup):
+            run()
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) / operations * 1e6)
+        results[name] = {
+            'median_us': statistics.median(samples),
+            'min_us': min(samples),
+            'mean_us': statistics.fmean(samples),
+            'stdev_us': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            'repeats': repeats,
+            'operations': operations,
+        }
+    return results
+
+
+def save_baseline(results: Dict[str, Dict], path: str):
+    data = {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load_baseline(path: str) -> Dict[str, Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def print_results(results: Dict[str, Dict], baseline: Dict[str, Dict] = None, tolerance: float = 0.10):
+    """打印结果表；提供基线时额外显示变化比例，超出容差的标记为回归或提升。"""
+    print(f"{'基准':24s} {'中位数(µs)':>12s} {'最小(µs)':>12s} {'标准差':>10s}", end='')
+    print(f" {'基线(µs)':>12s} {'变化':>8s}" if baseline else '')
+    print("-" * (62 + (22 if baseline else 0)))
+    regressions = []
+    for name, stats in results.items():
+        line = f"{name:24s} {stats['median_us']:12.3f} {stats['min_us']:12.3f} {stats['stdev_us']:10.3f}"
+        if baseline and name in baseline:
+            base = baseline[name]['median_us']
+            change = stats['median_us'] / base - 1
+            mark = ''
+            if change > tolerance:
+                mark = ' ⚠️ 回归'
+                regressions.append(name)
+            elif change < -tolerance:
+                mark = ' ✅ 提升'
+            line += f" {base:12.3f} {change * 100:+7.1f}%{mark}"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="战斗热路径基准测试")
+    parser.add_argument('-k', '--filter', default='', help="只运行名称包含该字符串的基准")
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--save', metavar='PATH', help="把结果保存为 JSON 基线")
+    parser.add_argument('--compare', metavar='PATH', help="与 JSON 基线对比")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="判定回归的相对变化阈值")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    results = run_benchmarks(names, repeats=args.repeats, warmup=args.warmup)
+    baseline = load_baseline(args.compare) if args.compare else None
+    regressions = print_results(results, baseline, args.tolerance)
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"\n基线已保存到 {args.save}")
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项性能回归: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@ from __future__ import annotations
 from typing import Dict, Any, Optional, TYPE_CHECKING
 
 from enums import TriggerPhase
-from action_interpreter import ActionInterpreter
+from action_interpreter import ActionInterpreter, HookCallable
+from battle_log import battle_log, INFO, EffectAppliedEvent, EffectRemovedEvent
 
 # 【修正三】创建一个解释器的单例，供所有效果实例共享和调用
 action_interpreter = ActionInterpreter()
@@ -14,30 +15,71 @@ class GenericEffect:
     """
     一个通用的效果实例。它的行为由注入的逻辑钩子函数决定。
     """
+    # 自定义逻辑仍可以在效果上保存额外状态（存放在按需创建的 __dict__ 中）
+    __slots__ = ('name', 'logic_hooks', 'compiled_hooks', 'is_control_effect', 'duration', '_potency',
+                 'target_count', 'source', 'owner', 'params', '__dict__')
+
     # 【修正二】使用更灵活的构造函数
     def __init__(self,
                  name: str,
                  logic_hooks: Dict[TriggerPhase, Any],
+                 compiled_hooks: Optional[Dict[TriggerPhase, HookCallable]] = None,
                  **kwargs):
         """
         Args:
             name (str): 效果的名称。
             logic_hooks (Dict): 从YAML加载的原始逻辑钩子字典。
+            compiled_hooks (Dict, optional): 工厂预编译好的钩子，省略时在此处编译。
             **kwargs: 效果的其他所有参数，如 duration, potency 等。
         """
         self.name = name
         self.logic_hooks = logic_hooks
+        if compiled_hooks is None:
+            compiled_hooks = action_interpreter.compile_hooks(logic_hooks)
+        self.compiled_hooks = compiled_hooks
 
         # 从 kwargs 中安全地解析标准参数，并设置默认值
         self.is_control_effect: bool = kwargs.get('is_control_effect', False)
         self.duration: int = kwargs.get('duration', 1)
-        self.potency: float = kwargs.get('potency', 1.0)
+        self._potency: float = kwargs.get('potency', 1.0)
         self.target_count: int = kwargs.get('target_count', 1)
         self.source: Optional['Unit'] = kwargs.get('source', None)
+        # 效果的持有者，由 Unit.add_effect 设置，用于在效力变化时通知其属性缓存
+        self.owner: Optional['Unit'] = None
         
         # 将所有传入的kwargs也存储起来，以备自定义逻辑使用
         self.params = kwargs
 
+    @classmethod
+    def from_params(cls, name: str, logic_hooks: Dict[TriggerPhase, Any],
+                    compiled_hooks: Dict[TriggerPhase, HookCallable], params: Dict[str, Any]) -> GenericEffect:
+        """
+        用已合并好的参数字典直接创建效果，不再展开成关键字参数；
+        params 会被直接作为 self.params 保存，不会复制，调用方不应再把它交给其他效果。
+        """
+        effect = object.__new__(cls)
+        effect.name = name
+        effect.logic_hooks = logic_hooks
+        effect.compiled_hooks = compiled_hooks
+        effect.is_control_effect = params.get('is_control_effect', False)
+        effect.duration = params.get('duration', 1)
+        effect._potency = params.get('potency', 1.0)
+        effect.target_count = params.get('target_count', 1)
+        effect.source = params.get('source', None)
+        effect.owner = None
+        effect.params = params
+        return effect
+
+    @property
+    def potency(self) -> float:
+        return self._potency
+
+    @potency.setter
+    def potency(self, value: float):
+        self._potency = value
+        if self.owner is not None:
+            self.owner.on_effect_changed(self)
+
     def tick(self) -> bool:
         if self.duration == float('inf'):
             return False
@@ -47,24 +89,23 @@ class GenericEffect:
         return self.duration <= 0
 
     def _execute_hook(self, phase: TriggerPhase, context: Dict[str, Any]) -> Any:
-        """通用钩子执行器，现在调用解释器的实例。"""
-        if phase.name in self.logic_hooks:
-            actions = self.logic_hooks[phase.name]
+        """通用钩子执行器，直接调用加载时编译好的钩子。"""
+        hook = self.compiled_hooks.get(phase)
+        if hook is not None:
             context['effect'] = self
-            # 【修正三】调用解释器的实例方法，而不是类方法
-            return action_interpreter.execute(actions, context)
+            return hook(context)
 
     # --- 【修正一】所有 on_* 方法都修正了 _execute_hook 的调用参数 ---
     
     def on_apply(self, target: 'Unit', silent: bool = False):
-        if not silent:
-            print(f"[{target.name}] 获得了效果：[{self.name}]（效力：{self.potency}, 持续：{self.duration}回合）。")
+        if not silent and battle_log.level <= INFO:
+            battle_log.emit(EffectAppliedEvent(target.name, self.name, self.potency, self.duration))
         context = {'target': target, 'user': self.source, 'silent': silent}
         self._execute_hook(TriggerPhase.ON_APPLY, context)
         
     def on_remove(self, target: 'Unit', silent: bool = False):
-        if not silent:
-            print(f"[{target.name}] 的效果 [{self.name}] 消失了。")
+        if not silent and battle_log.level <= INFO:
+            battle_log.emit(EffectRemovedEvent(target.name, self.name))
         context = {'target': target, 'user': self.source, 'silent': silent}
         self._execute_hook(TriggerPhase.ON_REMOVE, context)
 
@@ -76,13 +117,17 @@ class GenericEffect:
         context = {'target': target, 'user':self.source}
         self._execute_hook(TriggerPhase.ON_TURN_END, context)
 
-    def on_take_damage(self, target: 'Unit', damage_info: dict):
-        context = {'target': target, 'user': self.source, 'damage_info': damage_info}
+    def on_take_damage(self, target: 'Unit', damage_info: dict, silent: bool = False):
+        context = {'target': target, 'user': self.source, 'damage_info': damage_info, 'silent': silent}
         self._execute_hook(TriggerPhase.ON_TAKE_DAMAGE, context)
 
-    def on_deal_damage(self, target: 'Unit', damage_info: dict):
-        context = {'target': target, 'user': self.source, 'damage_info': damage_info}
+    def on_deal_damage(self, target: 'Unit', damage_info: dict, silent: bool = False):
+        context = {'target': target, 'user': self.source, 'damage_info': damage_info, 'silent': silent}
         self._execute_hook(TriggerPhase.ON_DEAL_DAMAGE, context)
+
+    def on_action(self, target: 'Unit', silent: bool = False):
+        context = {'target': target, 'user': self.source, 'silent': silent}
+        self._execute_hook(TriggerPhase.ON_ACTION, context)
         
     def __repr__(self) -> str:
         return f"<{self.name} (效力:{self.potency}, {self.duration}回合)>"
\ No newline at end of file
@@ -1,6 +1,9 @@
 from enum import Enum, auto
 
 class TriggerPhase(Enum):
+    # 阶段作为字典键在战斗热路径上频繁查找；成员是单例，用对象身份哈希代替 Enum 默认的按名字哈希
+    __hash__ = object.__hash__
+
     # --- 新增下面这两行 ---
     ON_APPLY = auto()        # 效果被施加时
     ON_REMOVE = auto()       # 效果被移除时
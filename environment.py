@@ -1,5 +1,7 @@
 import gymnasium as gym
 from gymnasium import spaces
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
 import numpy as np
 import random
 
@@ -82,3 +84,114 @@ class SimpleCardEnv(gym.Env):
 
     def render(self, mode="human"):
         print(f"Round {self.round}: HP_you={self.my_hp}, HP_opp={self.opp_hp}, card={self.my_card}")
+
+
+# 动作编号
+ATTACK, DEFEND, HEAL = 0, 1, 2
+
+
+class SimpleCardVectorEnv(VectorEnv):
+    """
+    Batched SimpleCardEnv: the state of num_envs games lives in NumPy arrays and
+    every game advances with a single step() call. Game rules are identical to
+    SimpleCardEnv; the opponent's action and the next card come from a seeded
+    numpy Generator shared by the batch.
+
+    Finished games are reset automatically according to autoreset_mode:
+      - NEXT_STEP (default, as in gymnasium's own vector envs): the step after a game
+        ends resets it, ignoring its action and returning reward 0.
+      - SAME_STEP: the game is reset within the same step; the observation at the end
+        of the game is in infos["final_obs"] (masked by infos["_final_obs"]).
+    """
+    metadata = {"autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, num_envs: int, max_hp: int = 30, max_round: int = 50, seed: int | None = None,
+                 autoreset_mode: AutoresetMode = AutoresetMode.NEXT_STEP):
+        if autoreset_mode not in (AutoresetMode.NEXT_STEP, AutoresetMode.SAME_STEP):
+            raise ValueError(f"unsupported autoreset_mode: {autoreset_mode}")
+        self.num_envs = num_envs
+        self.max_hp = max_hp
+        self.max_round = max_round
+        self.autoreset_mode = autoreset_mode
+        self.metadata = {"autoreset_mode": autoreset_mode}
+
+        self.single_action_space = spaces.Discrete(3)
+        self.single_observation_space = spaces.Box(
+            low=np.array([0, 0, 0], dtype=np.int32),
+            high=np.array([max_hp, max_hp, 2], dtype=np.int32),
+            dtype=np.int32,
+        )
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        self._rng = np.random.default_rng(seed)
+        # 每局的状态：列 0 = 我方生命，1 = 对手生命，2 = 手牌；回合数单独存放
+        self._state = np.zeros((num_envs, 3), dtype=np.int32)
+        self._round = np.zeros(num_envs, dtype=np.int32)
+        self._autoreset = np.zeros(num_envs, dtype=np.bool_)
+
+    def _reset_games(self, mask: np.ndarray):
+        count = int(mask.sum())
+        if count:
+            self._state[mask, 0] = self.max_hp
+            self._state[mask, 1] = self.max_hp
+            self._state[mask, 2] = self._rng.integers(0, 3, size=count, dtype=np.int32)
+            self._round[mask] = 0
+
+    def reset(self, seed: int | None = None, options: dict | None = None):
+        """Reset all games, or only those selected by options["reset_mask"]."""
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        mask = np.ones(self.num_envs, dtype=np.bool_)
+        if options and "reset_mask" in options:
+            mask = np.asarray(options["reset_mask"], dtype=np.bool_)
+        self._reset_games(mask)
+        self._autoreset[mask] = False
+        return self._state.copy(), {}
+
+    @staticmethod
+    def _apply(action: np.ndarray, self_hp: np.ndarray, opp_hp: np.ndarray, max_hp: int):
+        """Vectorized SimpleCardEnv.step.apply: updates the two hp arrays in place."""
+        opp_hp -= 6 * (action == ATTACK)
+        self_hp += 3 * (action == DEFEND)
+        heal = action == HEAL
+        self_hp[heal] = np.minimum(self_hp[heal] + 5, max_hp)
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        n = self.num_envs
+        state = self._state
+        my_hp, opp_hp = state[:, 0], state[:, 1]
+
+        # 对手动作和下一张手牌：每局各抽一次
+        draws = self._rng.integers(0, 3, size=(2, n), dtype=np.int32)
+        opp_action, next_card = draws[0], draws[1]
+
+        self._round += 1
+        self._apply(actions, my_hp, opp_hp, self.max_hp)
+        self._apply(opp_action, opp_hp, my_hp, self.max_hp)
+        state[:, 2] = next_card
+
+        terminated = (my_hp <= 0) | (opp_hp <= 0)
+        truncated = self._round >= self.max_round
+        done = terminated | truncated
+        rewards = np.where(done, np.sign(my_hp - opp_hp), 0).astype(np.float64)
+        infos = {"opp_action": opp_action, "_opp_action": np.ones(n, dtype=np.bool_)}
+
+        if self.autoreset_mode == AutoresetMode.NEXT_STEP:
+            # 上一步结束的对局本步只做重置
+            resetting = self._autoreset
+            if resetting.any():
+                self._reset_games(resetting)
+                rewards[resetting] = 0.0
+                terminated[resetting] = False
+                truncated[resetting] = False
+                infos["_opp_action"] = ~resetting
+                done = terminated | truncated
+            self._autoreset = done
+        elif done.any():
+            infos["final_obs"] = state.copy()
+            infos["_final_obs"] = done
+            self._reset_games(done)
+
+        return state.copy(), rewards, terminated, truncated, infos
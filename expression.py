@@ -0,0 +1,118 @@
+# expression.py
+"""
+效果数值表达式的受限编译器。
+
+YAML 中形如 "1.0 - effect.potency" 的字符串只允许使用：数字常量、四则运算
+（含 //, %，以及指数为小常量的 **）、比较、and/or/not、min/max 调用，以及对 effect/owner/source
+的属性访问（不允许访问下划线开头的属性）。每个不同的表达式只解析、编译一次，
+编译结果缓存为普通的 Python 函数。
+
+编译结果带有 pure 属性：表达式只读取 effect 上不会悄悄变化的字段（见
+PURE_EFFECT_ATTRIBUTES）时为 True，此时被动属性的计算结果可以被 Unit 缓存；
+引用了 owner/source、effect.duration 或 effect.source.xxx 之类链式访问时为 False。
+"""
+from __future__ import annotations
+import ast
+from typing import Any, Callable, Dict
+
+# 表达式中可以引用的名字 -> 上下文字典中的键
+EXPRESSION_NAMES = {'effect': 'effect', 'owner': 'target', 'source': 'user'}
+EXPRESSION_FUNCTIONS = {'min': min, 'max': max}
+# 效果上可以视为不变的字段：效力的修改会通过 on_effect_changed 使属性缓存失效，其余创建后不变
+PURE_EFFECT_ATTRIBUTES = frozenset({'potency', 'name', 'is_control_effect', 'target_count'})
+
+ExpressionCallable = Callable[[Dict[str, Any]], Any]
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Load, ast.Attribute, ast.Call,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UnaryOp, ast.UAdd, ast.USub, ast.Not,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+# ** 的指数只能是绝对值不超过该值的数字常量，底数中也不能再有 **，
+# 避免 "9**9**9" 这样的表达式在第一次求值时卡死进程
+MAX_EXPONENT = 4
+
+_cache: Dict[str, ExpressionCallable] = {}
+
+
+class ExpressionError(ValueError):
+    """表达式不符合受限语法时抛出。"""
+
+
+def _validate(tree: ast.AST, text: str):
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError(f"表达式 '{text}' 中不允许使用 {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, bool)):
+            raise ExpressionError(f"表达式 '{text}' 中只允许数字常量")
+        if isinstance(node, ast.Name) and node.id not in EXPRESSION_NAMES and node.id not in EXPRESSION_FUNCTIONS:
+            raise ExpressionError(f"表达式 '{text}' 中出现未知名字 '{node.id}'")
+        if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+            raise ExpressionError(f"表达式 '{text}' 中不允许访问私有属性 '{node.attr}'")
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            _validate_power(node, text)
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in EXPRESSION_FUNCTIONS:
+                raise ExpressionError(f"表达式 '{text}' 中只允许调用 min/max")
+            if node.keywords:
+                raise ExpressionError(f"表达式 '{text}' 中的函数调用不支持关键字参数")
+
+
+def _validate_power(node: ast.BinOp, text: str):
+    exponent = node.right
+    if isinstance(exponent, ast.UnaryOp) and isinstance(exponent.op, (ast.UAdd, ast.USub)):
+        exponent = exponent.operand
+    if (not isinstance(exponent, ast.Constant) or isinstance(exponent.value, bool)
+            or abs(exponent.value) > MAX_EXPONENT):
+        raise ExpressionError(f"表达式 '{text}' 中 ** 的指数只能是绝对值不超过 {MAX_EXPONENT} 的数字常量")
+    for inner in ast.walk(node.left):
+        if isinstance(inner, ast.BinOp) and isinstance(inner.op, ast.Pow):
+            raise ExpressionError(f"表达式 '{text}' 中不允许嵌套使用 **")
+
+
+def _is_pure(tree: ast.AST) -> bool:
+    """表达式是否只通过 effect.<PURE_EFFECT_ATTRIBUTES> 读取上下文。"""
+    allowed = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            if node.value.id != 'effect' or node.attr not in PURE_EFFECT_ATTRIBUTES:
+                return False
+            allowed.add(id(node.value))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in EXPRESSION_NAMES and id(node) not in allowed:
+            return False
+    return True
+
+
+def compile_expression(text: str) -> ExpressionCallable:
+    """
+    编译一个受限表达式，返回 (context) -> value 的函数。结果按表达式文本缓存。
+
+    Raises:
+        ExpressionError: 表达式有语法错误或使用了不允许的语法。
+    """
+    compiled = _cache.get(text)
+    if compiled is not None:
+        return compiled
+
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f"表达式 '{text}' 有语法错误: {e.msg}") from None
+    _validate(tree, text)
+
+    # 校验通过后生成一个普通函数：参数就是允许的名字，全局命名空间只含 min/max
+    params = ', '.join(EXPRESSION_NAMES)
+    source = f"lambda {params}: {ast.unparse(tree.body)}"
+    function = eval(compile(source, f"<expression {text!r}>", 'eval'),
+                    {'__builtins__': {}, **EXPRESSION_FUNCTIONS})
+
+    def evaluate(context: Dict[str, Any]) -> Any:
+        return function(context.get('effect'), context.get('target'), context.get('user'))
+
+    evaluate.pure = _is_pure(tree)
+    _cache[text] = evaluate
+    return evaluate
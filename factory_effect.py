@@ -1,8 +1,10 @@
 from __future__ import annotations
 from typing import Dict, Callable, Any, Optional
-import yaml
-from effect import GenericEffect # 导入我们通用的Effect类
+from effect import GenericEffect, action_interpreter # 导入我们通用的Effect类
 from enums import TriggerPhase
+from expression import ExpressionError
+from battle_log import battle_log
+from template_bundle import parse_yaml
 
 
 # 定义逻辑函数的标准签名：接受效果实例和目标单位作为参数
@@ -10,16 +12,49 @@ EffectLogicCallable = Callable[[GenericEffect, Any], None]
 
 class EffectFactory:
     def __init__(self):
-        # _templates 用于存储已注册的效果“模板”
+        # _templates 用于存储已注册的效果“模板”；加载、注册和热重载都整体替换为新字典，而不是原地修改，
+        # 所以 pinned() 视图和进行中的战斗始终看到一致的旧版本
         self._templates: Dict[str, Dict] = {}
+        self._pinned: Optional[EffectFactory] = None
+
+    def pinned(self) -> EffectFactory:
+        """
+        返回绑定到当前模板字典的效果工厂视图，技能通过它在战斗中创建效果。
+        热重载替换模板字典后，旧视图仍指向旧版本，进行中的战斗不受影响。
+        """
+        view = self._pinned
+        if view is None or view._templates is not self._templates:
+            view = object.__new__(EffectFactory)
+            view._templates = self._templates
+            view._pinned = view
+            self._pinned = view
+        return view
 
     def load_effects_from_file(self,file_path: str):
         with open(file_path, 'r', encoding='utf-8') as f:
-            all_effects_data = yaml.safe_load(f)
-        for name, template_data in all_effects_data.items():
-            self._templates[name] = template_data
-            print(f"已加载效果模板：{name}")
+            all_effects_data = parse_yaml(f.read())
+        self.load_effects(all_effects_data)
+
+    def load_effects(self, all_effects_data: Dict[str, Dict], verbose: bool = True) -> int:
+        """从已解析的数据加载效果模板，返回加载的数量。verbose 时每个模板打印一行。"""
+        templates = dict(self._templates)
+        for name, template_data in (all_effects_data or {}).items():
+            # 加载时一次性编译逻辑钩子，避免每次触发都重新解释；不修改传入的数据
+            template = dict(template_data)
+            template["compiled_hooks"] = self._compile_hooks(name, template_data.get("logic_hooks", {}))
+            templates[name] = template
+            if verbose:
+                print(f"已加载效果模板：{name}")
+        self._templates = templates
+        return len(all_effects_data or {})
     
+    def _compile_hooks(self, name: str, logic_hooks: Dict) -> Dict:
+        """编译效果的逻辑钩子，表达式错误会带上效果名抛出。"""
+        try:
+            return action_interpreter.compile_hooks(logic_hooks)
+        except ExpressionError as e:
+            raise ExpressionError(f"效果 '{name}' 的定义无效：{e}") from e
+
     def create(self, name: str, **kwargs) -> Optional[GenericEffect]:
         """
         根据名称创建一个效果实例。
@@ -33,18 +68,15 @@ class EffectFactory:
         """
         template = self._templates.get(name)
         if not template:
-            print(f"错误：尝试创建未注册的效果 '{name}'。")
+            battle_log.error(f"错误：尝试创建未注册的效果 '{name}'。")
             return None
 
-        # 合并参数：默认参数被实例化参数覆盖
-        final_params = template.get("default_params", {}).copy()
-        final_params.update(kwargs)
+        # 合并参数：默认参数被实例化参数覆盖；总是复制一份，自定义逻辑修改 effect.params 不会影响模板
+        final_params = dict(template.get("default_params") or ())
+        if kwargs:
+            final_params.update(kwargs)
 
-        return GenericEffect(
-            name=name,
-            logic_hooks=template["logic_hooks"],
-            **final_params
-        )
+        return GenericEffect.from_params(name, template["logic_hooks"], template["compiled_hooks"], final_params)
 
     def register(self,
                  name: str,
@@ -59,10 +91,12 @@ class EffectFactory:
             default_params (Dict, optional): 此状态的默认参数 (如默认持续时间)。
         """
         if name in self._templates:
-            print(f"警告：正在覆盖已注册的效果 '{name}'。")
+            battle_log.warning(f"警告：正在覆盖已注册的效果 '{name}'。")
         
-        self._templates[name] = {
+        template = {
             "logic_hooks": logic_hooks,
+            "compiled_hooks": self._compile_hooks(name, logic_hooks),
             "default_params": default_params if default_params is not None else {}
         }
+        self._templates = {**self._templates, name: template}
         print(f"成功注册新异常状态：'{name}'。")
\ No newline at end of file
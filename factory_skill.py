@@ -1,8 +1,9 @@
 # skill_factory.py
 from __future__ import annotations
-import yaml
 from typing import Dict, Any, Optional, List, TYPE_CHECKING
 from skill import Skill
+from battle_log import battle_log
+from template_bundle import parse_yaml
 
 if TYPE_CHECKING:
     from factory_effect import EffectFactory
@@ -14,16 +15,23 @@ class SkillFactory:
 
     def load_skills_from_file(self, file_path: str):
         with open(file_path, 'r', encoding='utf-8') as f:
-            all_skills_data = yaml.safe_load(f)
+            all_skills_data = parse_yaml(f.read())
+        self.load_skills(all_skills_data)
+
+    def load_skills(self, all_skills_data: Optional[Dict[str, Dict]], verbose: bool = True) -> int:
+        """从已解析的数据加载技能模板，返回加载的数量。verbose 时每个模板打印一行。"""
         if all_skills_data:
-            for name, template_data in all_skills_data.items():
-                self._templates[name] = template_data
-                print(f"从文件加载了技能模板：'{name}'")
+            # 整体替换模板字典（与 EffectFactory 相同），已经创建的技能和单位不受影响
+            self._templates = {**self._templates, **all_skills_data}
+            if verbose:
+                for name in all_skills_data:
+                    print(f"从文件加载了技能模板：'{name}'")
+        return len(all_skills_data or {})
 
     def create(self, name: str, custom_effects: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Optional[Skill]:
         template = self._templates.get(name)
         if not template:
-            print(f"错误：尝试创建未注册的技能 '{name}'。")
+            battle_log.error(f"错误：尝试创建未注册的技能 '{name}'。")
             return None
             
         final_params = template.copy()
@@ -35,7 +43,7 @@ class SkillFactory:
 
         return Skill(
             name=name,
-            effect_factory=self.effect_factory,
+            effect_factory=self.effect_factory.pinned(),
             **final_params
         )
     
\ No newline at end of file
@@ -1,9 +1,10 @@
 # unit_factory.py
 from __future__ import annotations
-import yaml
-
-from typing import Dict, Any, Optional, TYPE_CHECKING
+import threading
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
 from hero import Unit, Hero
+from battle_log import battle_log
+from template_bundle import DEFAULT_CACHE_DIR, DEFAULT_SOURCES, TemplateData, load_template_data, parse_yaml
 
 if TYPE_CHECKING:
     from factory_skill import SkillFactory
@@ -13,19 +14,104 @@ class UnitFactory:
         self._templates: Dict[str, Dict] = {}
         self.skill_factory = skill_factory
         self.unit_classes = {'Unit': Unit, 'Hero': Hero}
+        # 每个英雄模板预先构建好的“蓝图”单位，create 时直接克隆
+        self._blueprints: Dict[str, Unit] = {}
+        # 构建这些蓝图时技能工厂和效果工厂的模板字典；两者的字典在加载/注册时整体替换，
+        # 不再是同一个对象就说明蓝图可能过期，下次取蓝图时全部丢弃重建
+        self._blueprint_sources: Tuple[Optional[Dict], Optional[Dict]] = (None, None)
+        # 构建蓝图时持有；热重载在同一把锁内替换三个工厂的模板和蓝图字典，
+        # 保证构建出的单位不会混用新旧版本的模板
+        self._lock = threading.RLock()
+        # load_all_from_files 加载的模板数据，热重载以它为比较基准
+        self.template_data: Optional[TemplateData] = None
 
     def load_heroes_from_file(self, file_path: str):
         with open(file_path, 'r', encoding='utf-8') as f:
-            all_heroes_data = yaml.safe_load(f)
+            all_heroes_data = parse_yaml(f.read())
+        self.load_heroes(all_heroes_data)
+
+    def load_heroes(self, all_heroes_data: Optional[Dict[str, Dict]], verbose: bool = True) -> int:
+        """从已解析的数据加载英雄模板，返回加载的数量。verbose 时每个模板打印一行。"""
         if all_heroes_data:
-            for name, template_data in all_heroes_data.items():
-                self._templates[name] = template_data
-                print(f"从文件加载了英雄模板：'{name}'")
+            # 与热重载一样整体替换模板和蓝图字典
+            with self._lock:
+                self._templates = {**self._templates, **all_heroes_data}
+                self._blueprints = {name: blueprint for name, blueprint in self._blueprints.items()
+                                    if name not in all_heroes_data}
+            if verbose:
+                for name in all_heroes_data:
+                    print(f"从文件加载了英雄模板：'{name}'")
+        return len(all_heroes_data or {})
+
+    def load_all_from_files(self, effects_path: str = DEFAULT_SOURCES['effects'],
+                            skills_path: str = DEFAULT_SOURCES['skills'],
+                            heroes_path: str = DEFAULT_SOURCES['heroes'],
+                            cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        """
+        一次加载效果、技能、英雄三类模板（依次填充效果工厂、技能工厂和本工厂）。
+        数据来自按文件内容哈希缓存的预编译包（见 template_bundle），YAML 变化时自动重建。
+        """
+        data = load_template_data(effects_path, skills_path, heroes_path, cache_dir=cache_dir)
+        num_effects = self.skill_factory.effect_factory.load_effects(data['effects'], verbose=False)
+        num_skills = self.skill_factory.load_skills(data['skills'], verbose=False)
+        num_heroes = self.load_heroes(data['heroes'], verbose=False)
+        self.template_data = data
+        print(f"已加载模板：效果 {num_effects} 个，技能 {num_skills} 个，英雄 {num_heroes} 个")
 
     def create(self, name: str, **kwargs) -> Optional[Unit]:
+        """
+        创建一个英雄实例。没有覆盖参数时直接克隆预编译的蓝图，
+        跳过技能模板解析和参数合并。
+        """
+        if kwargs:
+            return self._build(name, **kwargs)
+        blueprint = self.get_blueprint(name)
+        return blueprint.clone() if blueprint else None
+
+    def get_blueprint(self, name: str) -> Optional[Unit]:
+        """获取（必要时构建）某个英雄模板的蓝图单位。蓝图本身不应参与战斗。"""
+        blueprint = self.current_blueprints().get(name)
+        if blueprint is None:
+            with self._lock:
+                blueprints = self.current_blueprints()
+                blueprint = blueprints.get(name)
+                if blueprint is None:
+                    blueprint = self._build(name)
+                    if blueprint:
+                        blueprints[name] = blueprint
+        return blueprint
+
+    def _blueprints_stale(self) -> bool:
+        skill_templates, effect_templates = self._blueprint_sources
+        return (skill_templates is not self.skill_factory._templates
+                or effect_templates is not self.skill_factory.effect_factory._templates)
+
+    def warm_blueprints(self) -> int:
+        """构建所有英雄模板的蓝图，返回模板数量。"""
+        for name in list(self._templates):
+            self.get_blueprint(name)
+        return len(self._templates)
+
+    def current_blueprints(self) -> Dict[str, Unit]:
+        """返回仍然有效的蓝图字典；技能或效果模板换过之后先清空。"""
+        if self._blueprints_stale():
+            with self._lock:
+                if self._blueprints_stale():
+                    # 先记下模板字典再构建：构建期间模板又被替换时，下次调用仍会发现过期
+                    self._blueprints = {}
+                    self._blueprint_sources = (self.skill_factory._templates,
+                                               self.skill_factory.effect_factory._templates)
+        return self._blueprints
+
+    def _build(self, name: str, **kwargs) -> Optional[Unit]:
+        """按模板完整构建一个英雄实例。"""
+        with self._lock:
+            return self._build_locked(name, **kwargs)
+
+    def _build_locked(self, name: str, **kwargs) -> Optional[Unit]:
         template = self._templates.get(name)
         if not template:
-            print(f"错误：尝试创建未定义的英雄 '{name}'。")
+            battle_log.error(f"错误：尝试创建未定义的英雄 '{name}'。")
             return None
 
         skill_instances = []
@@ -2,51 +2,266 @@ from factory_effect import EffectFactory
 from factory_skill import SkillFactory
 from factory_unit import UnitFactory
 from multi_battle import MultiBattle
+from battle_rng import BattleRNG
+from vectorized_battle import VectorizedBattle
+from result_sink import MemorySink
+from matchup_stats import MatchupStats, WINNER_CODES
+from matchup_cache import matchup_key
+from sequential_stopping import format_summary
+from instrumentation import HotPathStats
+import instrumentation
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
 import random
 import time
-from collections import defaultdict
+import numpy as np
 
-def run_single_battle(unit_factory, team1_names, team2_names, silent=True):
-    """运行单场战斗"""
+def run_single_battle(unit_factory, team1_names, team2_names, silent=True, rng=None):
+    """运行单场战斗，rng 为本场战斗的 BattleRNG"""
     # 创建英雄实例
-    team1_units = []
-    team2_units = []
+    team1_units = create_team(unit_factory, team1_names)
+    team2_units = create_team(unit_factory, team2_names)
     
-    for hero_name in team1_names:
-        unit = unit_factory.create(hero_name)
-        if unit:
-            team1_units.append(unit)
+    if not team1_units or not team2_units:
+        return None
     
-    for hero_name in team2_names:
+    # 开始战斗
+    battle = MultiBattle(team1_units, team2_units, silent=silent, rng=rng)
+    return battle.run()
+
+def create_team(unit_factory, hero_names):
+    """按名称创建一支队伍，忽略创建失败的英雄"""
+    units = []
+    for hero_name in hero_names:
         unit = unit_factory.create(hero_name)
         if unit:
-            team2_units.append(unit)
-    
+            units.append(unit)
+    return units
+
+def run_prepared_battle(team1_units, team2_units, silent=True, rng=None):
+    """把已创建的队伍原地重置后再战斗一场，用于重复模拟同一阵容"""
     if not team1_units or not team2_units:
         return None
-    
-    # 开始战斗
-    battle = MultiBattle(team1_units, team2_units, silent=silent)
+    for unit in team1_units + team2_units:
+        unit.reset()
+    battle = MultiBattle(team1_units, team2_units, silent=silent, rng=rng)
     return battle.run()
 
-def run_batch_simulation(num_battles=100, team_size=4):
-    """运行批量模拟"""
-    print(f"🤖 Headless模拟模式")
-    print(f"=" * 50)
-    print(f"运行 {num_battles} 场 {team_size}v{team_size} 战斗...")
-    
-    # 初始化工厂
+# numpy 引擎每次同步推进的战斗场数；分组按战斗序号对齐
+VECTOR_BLOCK = 1024
+# 单个分片的最大战斗数，限制逐场记录在内存中停留的数量
+MAX_CHUNK = 16 * VECTOR_BLOCK
+
+def load_factories(silent=False):
+    """初始化并加载效果、技能、英雄三个工厂，返回 unit_factory"""
     effect_factory = EffectFactory()
     skill_factory = SkillFactory(effect_factory)
     unit_factory = UnitFactory(skill_factory)
+
+    if silent:
+        with contextlib.redirect_stdout(io.StringIO()):
+            unit_factory.load_all_from_files()
+    else:
+        unit_factory.load_all_from_files()
+    return unit_factory
+
+def new_partial_results(hero_names=()):
+    """创建一份可合并、可跨进程传递的部分统计结果"""
+    return {
+        'team1_wins': 0,
+        'team2_wins': 0,
+        'draws': 0,
+        'total_turns': 0,
+        'matchups': MatchupStats(hero_names),
+        'battle_results': []
+    }
+
+def _count_battle(results, team1_heroes, team2_heroes, result):
+    """记录单场战斗并累计胜负与回合数（不含英雄矩阵）"""
+    results['battle_results'].append({
+        'team1': team1_heroes,
+        'team2': team2_heroes,
+        'winner': result['winner'],
+        'turns': result['turns'],
+        'survivors': result['survivors']
+    })
+    if result['winner'] == 'team1':
+        results['team1_wins'] += 1
+    elif result['winner'] == 'team2':
+        results['team2_wins'] += 1
+    else:
+        results['draws'] += 1
+    results['total_turns'] += result['turns']
+
+def record_battle(results, team1_heroes, team2_heroes, result):
+    """把单场战斗的结果累计到统计数据中"""
+    _count_battle(results, team1_heroes, team2_heroes, result)
+    results['matchups'].record(team1_heroes, team2_heroes, result['winner'])
+
+def merge_results(results, partial, sink):
+    """把一份部分统计结果合并进总结果，逐场记录写入 sink"""
+    for key in ('team1_wins', 'team2_wins', 'draws', 'total_turns'):
+        results[key] += partial[key]
+    results['matchups'].merge(partial['matchups'])
+    sink.write_many(partial['battle_results'])
+    if 'hot_stats' in partial:
+        results['hot_stats'].merge(partial['hot_stats'])
+
+def select_teams(available_heroes, team_size, rng):
+    """用单场战斗的随机数流随机选择双方英雄"""
+    team1_heroes = rng.sample(available_heroes, team_size)
+    team2_heroes = rng.sample([h for h in available_heroes if h not in team1_heroes], team_size)
+    return team1_heroes, team2_heroes
+
+def run_battle_chunk(unit_factory, available_heroes, team_size, master_seed, start, stop, engine='object'):
+    """
+    运行序号为 [start, stop) 的战斗，返回部分统计结果
+
+    engine='numpy' 时以 VECTOR_BLOCK 场为一组交给 VectorizedBattle 同步推进，每组一条随机数流，
+    整组的结果取决于组内有哪些战斗；调用方需保证 start 是 VECTOR_BLOCK 的整数倍，
+    这样分组只取决于战斗序号，结果才与分片方式无关。
+    """
+    partial = new_partial_results(available_heroes)
+    if engine == 'numpy':
+        block_start = start
+        while block_start < stop:
+            block_stop = min(block_start - block_start % VECTOR_BLOCK + VECTOR_BLOCK, stop)
+            teams = [select_teams(available_heroes, team_size, BattleRNG.for_battle(master_seed, i))
+                     for i in range(block_start, block_stop)]
+            battle = VectorizedBattle(unit_factory,
+                                      [team1 for team1, _ in teams],
+                                      [team2 for _, team2 in teams],
+                                      seed=[master_seed, block_start])
+            winners = []
+            for (team1_heroes, team2_heroes), result in zip(teams, battle.run()):
+                _count_battle(partial, team1_heroes, team2_heroes, result)
+                winners.append(WINNER_CODES[result['winner']])
+            matchups = partial['matchups']
+            matchups.record_many(np.array([matchups.ids(team1) for team1, _ in teams]),
+                                 np.array([matchups.ids(team2) for _, team2 in teams]),
+                                 np.array(winners))
+            block_start = block_stop
+        return partial
+
+    for i in range(start, stop):
+        # 每场战斗的随机数流由主种子和战斗序号派生，选英雄和战斗共用同一条流
+        rng = BattleRNG.for_battle(master_seed, i)
+        team1_heroes, team2_heroes = select_teams(available_heroes, team_size, rng)
+
+        # 运行战斗
+        result = run_single_battle(unit_factory, team1_heroes, team2_heroes, silent=True, rng=rng)
+        if result:
+            record_battle(partial, team1_heroes, team2_heroes, result)
+    return partial
+
+# --- 进程池工作进程：每个进程只加载一次工厂 ---
+
+_worker_unit_factory = None
+_worker_heroes = None
+
+def _init_worker():
+    global _worker_unit_factory, _worker_heroes
+    _worker_unit_factory = load_factories(silent=True)
+    # 预先构建蓝图：开启热路径统计时，蓝图构建不计入各工作进程的统计，总数与进程数无关
+    _worker_unit_factory.warm_blueprints()
+    _worker_heroes = list(_worker_unit_factory._templates.keys())
+
+def _run_chunk_in_worker(task):
+    team_size, master_seed, start, stop, engine, instrument = task
+    if not instrument:
+        return run_battle_chunk(_worker_unit_factory, _worker_heroes, team_size, master_seed, start, stop, engine)
+    # 开启热路径统计时，本分片的统计随部分结果一起传回主进程合并
+    with instrumentation.collect() as stats:
+        partial = run_battle_chunk(_worker_unit_factory, _worker_heroes, team_size, master_seed, start, stop, engine)
+    partial['hot_stats'] = stats.to_dict()
+    return partial
+
+class ProgressPrinter:
+    """每完成约 10% 打印一次进度"""
+    def __init__(self, total):
+        self.total = total
+        self.step = max(1, total // 10)
+        self.next_report = self.step
+
+    def update(self, done):
+        if done >= self.next_report or done == self.total:
+            print(f"进度: {done / self.total * 100:.0f}% ({done}/{self.total})")
+            while self.next_report <= done:
+                self.next_report += self.step
+
+def run_sequential_batches(unit_factory, available_heroes, team_size, master_seed, max_battles,
+                           workers, engine, stop_rule, results, sink, instrument=False):
+    """
+    按 stop_rule 分批运行随机阵容的战斗，直到队伍1胜率满足停止条件或达到 max_battles，
+    返回 stop_rule.summarize 的结果。
+    workers > 1 时每轮并行提交 workers 批；判定仍按批的顺序逐批进行，
+    停止点之后多算的批直接丢弃，所以结果与 workers 无关。
+    engine='numpy' 时批大小向上取整到 VECTOR_BLOCK 的整数倍，使批边界与向量化分组对齐，
+    结果与 batch_size 无关（只是判定的间隔变粗）。
+    """
+    batches = list(stop_rule.batches(max_battles, align=VECTOR_BLOCK if engine == 'numpy' else 1))
+    progress = ProgressPrinter(max_battles)
+    stopped_by = None
+
+    def consume(partial, stop):
+        merge_results(results, partial, sink)
+        progress.update(stop)
+        battles = results['team1_wins'] + results['team2_wins'] + results['draws']
+        return stop_rule.check(results['team1_wins'], battles)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            for wave_start in range(0, len(batches), workers):
+                wave = batches[wave_start:wave_start + workers]
+                tasks = [(team_size, master_seed, start, stop, engine, instrument) for start, stop in wave]
+                for partial, (_, stop) in zip(executor.map(_run_chunk_in_worker, tasks), wave):
+                    stopped_by = consume(partial, stop)
+                    if stopped_by:
+                        break
+                if stopped_by:
+                    break
+    else:
+        for start, stop in batches:
+            partial = run_battle_chunk(unit_factory, available_heroes, team_size, master_seed, start, stop, engine)
+            stopped_by = consume(partial, stop)
+            if stopped_by:
+                break
+
+    battles = results['team1_wins'] + results['team2_wins'] + results['draws']
+    return stop_rule.summarize(results['team1_wins'], battles, stopped_by)
+
+def run_batch_simulation(num_battles=100, team_size=4, workers=1, seed=None, engine='object', sink=None,
+                         stop_rule=None, instrument=False):
+    """
+    运行批量模拟
+
+    Args:
+        num_battles: 战斗场数
+        team_size: 每队英雄数
+        workers: 工作进程数，大于1时把战斗分片到进程池中并行运行
+        seed: 主种子；每场战斗的随机数流（BattleRNG）由主种子和战斗序号派生，
+              因此相同主种子下的结果与 workers 无关
+        engine: 'object' 逐场运行 MultiBattle；'numpy' 使用 VectorizedBattle 批量同步推进
+        sink: 逐场战斗记录的去向（见 result_sink）。默认保存在 results['battle_results'] 中；
+              传入文件 sink 时内存里只保留汇总统计，results['battle_results'] 为空
+        stop_rule: 可选的 SequentialStopRule。给定时按 stop_rule.batch_size 场一批运行，
+              队伍1胜率满足停止条件即提前结束，num_battles 成为最大场数；
+              置信区间和实际场数见 results['sequential']
+        instrument: 是否统计热路径（动作类型、效果、触发阶段、属性查询）的调用次数和耗时；
+              各工作进程的统计合并到 results['hot_stats']，并在最后打印表格
+    """
+    print(f"🤖 Headless模拟模式")
+    print(f"=" * 50)
+    print(f"运行 {num_battles} 场 {team_size}v{team_size} 战斗...")
     
-    # 加载数据（静默加载）
-    effect_factory.load_effects_from_file('effects.yaml')
-    skill_factory.load_skills_from_file('skills.yaml')
-    unit_factory.load_heroes_from_file('hero.yaml')
+    # 初始化工厂并加载数据
+    unit_factory = load_factories()
     
     # 获取所有可用英雄
     available_heroes = list(unit_factory._templates.keys())
+
+    master_seed = seed if seed is not None else random.getrandbits(31)
     
     # 统计数据
     results = {
@@ -54,139 +269,99 @@ def run_batch_simulation(num_battles=100, team_size=4):
         'team2_wins': 0,
         'draws': 0,
         'total_turns': 0,
-        'hero_win_rates': defaultdict(lambda: {'wins': 0, 'games': 0}),
-        'hero_vs_hero': defaultdict(lambda: defaultdict(lambda: {'wins': 0, 'games': 0})),
-        'battle_results': []
+        'matchups': MatchupStats(available_heroes),
+        'battle_results': [],
+        'seed': master_seed
     }
+    if sink is None:
+        sink = MemorySink(results['battle_results'])
+    if instrument:
+        results['hot_stats'] = HotPathStats()
+        # 与工作进程一样，在开始统计之前构建好全部蓝图
+        unit_factory.warm_blueprints()
     
     start_time = time.time()
-    
-    for i in range(num_battles):
-        # 随机选择英雄
-        team1_heroes = random.sample(available_heroes, team_size)
-        team2_heroes = random.sample([h for h in available_heroes if h not in team1_heroes], team_size)
-        
-        # 运行战斗
-        result = run_single_battle(unit_factory, team1_heroes, team2_heroes, silent=True)
-        
-        if result:
-            results['battle_results'].append({
-                'team1': team1_heroes,
-                'team2': team2_heroes,
-                'winner': result['winner'],
-                'turns': result['turns'],
-                'survivors': result['survivors']
-            })
-            
-            # 统计胜负
-            if result['winner'] == 'team1':
-                results['team1_wins'] += 1
-                # 统计整体英雄胜率
-                for hero in team1_heroes:
-                    results['hero_win_rates'][hero]['wins'] += 1
-                    results['hero_win_rates'][hero]['games'] += 1
-                for hero in team2_heroes:
-                    results['hero_win_rates'][hero]['games'] += 1
-                
-                # 统计英雄对英雄胜率
-                for hero1 in team1_heroes:
-                    for hero2 in team2_heroes:
-                        results['hero_vs_hero'][hero1][hero2]['wins'] += 1
-                        results['hero_vs_hero'][hero1][hero2]['games'] += 1
-                        results['hero_vs_hero'][hero2][hero1]['games'] += 1
-                        
-            elif result['winner'] == 'team2':
-                results['team2_wins'] += 1
-                # 统计整体英雄胜率
-                for hero in team2_heroes:
-                    results['hero_win_rates'][hero]['wins'] += 1
-                    results['hero_win_rates'][hero]['games'] += 1
-                for hero in team1_heroes:
-                    results['hero_win_rates'][hero]['games'] += 1
-                
-                # 统计英雄对英雄胜率
-                for hero2 in team2_heroes:
-                    for hero1 in team1_heroes:
-                        results['hero_vs_hero'][hero2][hero1]['wins'] += 1
-                        results['hero_vs_hero'][hero2][hero1]['games'] += 1
-                        results['hero_vs_hero'][hero1][hero2]['games'] += 1
-                        
-            else:
-                results['draws'] += 1
-                # 平局时所有英雄都算参与但不算胜利
-                for hero in team1_heroes + team2_heroes:
-                    results['hero_win_rates'][hero]['games'] += 1
-                
-                # 平局时英雄对英雄也算参与但不算胜利
-                for hero1 in team1_heroes:
-                    for hero2 in team2_heroes:
-                        results['hero_vs_hero'][hero1][hero2]['games'] += 1
-                        results['hero_vs_hero'][hero2][hero1]['games'] += 1
-            
-            results['total_turns'] += result['turns']
-        
-        # 显示进度
-        if (i + 1) % (num_battles // 10) == 0:
-            progress = (i + 1) / num_battles * 100
-            print(f"进度: {progress:.0f}% ({i + 1}/{num_battles})")
+
+    # 串行时在本进程统计；并行时工作进程各自统计后随部分结果传回
+    with instrumentation.collect(results['hot_stats']) if instrument else contextlib.nullcontext():
+        if stop_rule is not None:
+            results['sequential'] = run_sequential_batches(unit_factory, available_heroes, team_size, master_seed,
+                                                           num_battles, workers, engine, stop_rule, results, sink,
+                                                           instrument)
+        elif workers > 1:
+            # 按序号切成连续分片，按顺序归并保证结果与分片方式无关
+            chunk_size = min(max(1, -(-num_battles // (workers * 4))), MAX_CHUNK)
+            if engine == 'numpy':
+                chunk_size = -(-chunk_size // VECTOR_BLOCK) * VECTOR_BLOCK
+            tasks = [(team_size, master_seed, start, min(start + chunk_size, num_battles), engine, instrument)
+                     for start in range(0, num_battles, chunk_size)]
+            progress = ProgressPrinter(num_battles)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                for partial, task in zip(executor.map(_run_chunk_in_worker, tasks), tasks):
+                    merge_results(results, partial, sink)
+                    progress.update(task[3])
+        else:
+            chunk_size = min(max(1, num_battles // 10), MAX_CHUNK)
+            if engine == 'numpy':
+                chunk_size = -(-chunk_size // VECTOR_BLOCK) * VECTOR_BLOCK
+            progress = ProgressPrinter(num_battles)
+            for start in range(0, num_battles, chunk_size):
+                stop = min(start + chunk_size, num_battles)
+                partial = run_battle_chunk(unit_factory, available_heroes, team_size, master_seed, start, stop, engine)
+                merge_results(results, partial, sink)
+                progress.update(stop)
+    sink.flush()
     
     end_time = time.time()
+    battles = results['team1_wins'] + results['team2_wins'] + results['draws']
+    results['num_battles'] = battles
     
     # 输出结果
     print(f"\n📊 模拟结果统计")
     print(f"=" * 50)
-    print(f"总战斗数: {num_battles}")
+    print(f"总战斗数: {battles}")
     print(f"模拟时间: {end_time - start_time:.2f}秒")
-    print(f"平均每场战斗: {(end_time - start_time) / num_battles * 1000:.1f}毫秒")
+    print(f"平均每场战斗: {(end_time - start_time) / max(1, battles) * 1000:.1f}毫秒")
     
     print(f"\n胜负统计:")
-    print(f"队伍1胜利: {results['team1_wins']} ({results['team1_wins']/num_battles*100:.1f}%)")
-    print(f"队伍2胜利: {results['team2_wins']} ({results['team2_wins']/num_battles*100:.1f}%)")
-    print(f"平局: {results['draws']} ({results['draws']/num_battles*100:.1f}%)")
+    print(f"队伍1胜利: {results['team1_wins']} ({results['team1_wins']/max(1, battles)*100:.1f}%)")
+    print(f"队伍2胜利: {results['team2_wins']} ({results['team2_wins']/max(1, battles)*100:.1f}%)")
+    print(f"平局: {results['draws']} ({results['draws']/max(1, battles)*100:.1f}%)")
+    if stop_rule is not None:
+        print(format_summary(results['sequential'], label='队伍1胜率'))
     
     print(f"\n战斗数据:")
-    print(f"平均回合数: {results['total_turns']/num_battles:.1f}")
+    print(f"平均回合数: {results['total_turns']/max(1, battles):.1f}")
     
     # 英雄胜率排行
     print(f"\n🏆 英雄胜率排行 (至少参与10场):")
-    hero_stats = []
-    for hero, stats in results['hero_win_rates'].items():
-        if stats['games'] >= 10:
-            win_rate = stats['wins'] / stats['games'] * 100
-            hero_stats.append((hero, win_rate, stats['games'], stats['wins']))
-    
-    hero_stats.sort(key=lambda x: x[1], reverse=True)
-    
-    for i, (hero, win_rate, games, wins) in enumerate(hero_stats[:10]):
+    for i, (hero, win_rate, games, wins) in enumerate(results['matchups'].top_heroes(10, min_games=10)):
         print(f"{i+1:2d}. {hero:12s} {win_rate:5.1f}% ({wins:3d}/{games:3d})")
     
     # 英雄对英雄胜率表
-    print_hero_vs_hero_table(results['hero_vs_hero'], available_heroes)
+    print_hero_vs_hero_table(results['matchups'])
+
+    if instrument:
+        print(f"\n🔬 热路径统计")
+        print(f"=" * 50)
+        if results['hot_stats']:
+            print(results['hot_stats'].format_table())
+        else:
+            print("没有记录（numpy 引擎不经过这些热路径）")
     
     return results
 
-def print_hero_vs_hero_table(hero_vs_hero_data, available_heroes, min_games=3):
+def print_hero_vs_hero_table(matchups, min_games=3):
     """打印英雄对英雄的胜率表"""
     print(f"\n⚔️ 英雄对战胜率表 (至少{min_games}场对战):")
     print("=" * 80)
     
-    # 筛选有足够对战数据的英雄对
-    valid_matchups = []
-    for hero1 in available_heroes:
-        for hero2 in available_heroes:
-            if hero1 != hero2:
-                data = hero_vs_hero_data[hero1][hero2]
-                if data['games'] >= min_games:
-                    win_rate = data['wins'] / data['games'] * 100
-                    valid_matchups.append((hero1, hero2, win_rate, data['games'], data['wins']))
-    
+    # 筛选有足够对战数据的英雄对，按胜率排序
+    valid_matchups = matchups.top_pairs(min_games=min_games)
     if not valid_matchups:
         print("没有足够的对战数据生成胜率表")
         return
     
-    # 按胜率排序
-    valid_matchups.sort(key=lambda x: x[2], reverse=True)
-    
     print("最强克制关系 (前15位):")
     print(f"{'英雄1':12s} vs {'英雄2':12s} {'胜率':>6s} {'对战数':>6s}")
     print("-" * 50)
@@ -198,108 +373,128 @@ def print_hero_vs_hero_table(hero_vs_hero_data, available_heroes, min_games=3):
     print(f"\n📋 各英雄详细胜率表:")
     print("=" * 80)
     
-    for hero in available_heroes:
-        matchups = []
-        for opponent in available_heroes:
-            if hero != opponent:
-                data = hero_vs_hero_data[hero][opponent]
-                if data['games'] >= min_games:
-                    win_rate = data['wins'] / data['games'] * 100
-                    matchups.append((opponent, win_rate, data['games'], data['wins']))
-        
-        if matchups:
-            matchups.sort(key=lambda x: x[1], reverse=True)
+    for hero in matchups.hero_names:
+        hero_matchups = matchups.top_pairs(min_games=min_games, hero=hero)
+        if hero_matchups:
             print(f"\n{hero} 的对战记录:")
             print(f"{'对手':12s} {'胜率':>6s} {'对战数':>6s}")
             print("-" * 30)
             
-            for opponent, win_rate, games, wins in matchups:
+            for _, opponent, win_rate, games, wins in hero_matchups:
                 status = "💪" if win_rate >= 70 else "⚔️" if win_rate >= 50 else "😰"
                 print(f"{opponent:12s} {win_rate:5.1f}% ({wins:2d}/{games:2d}) {status}")
 
-def analyze_hero_relationships(hero_vs_hero_data, available_heroes, min_games=5):
+def analyze_hero_relationships(matchups, min_games=5):
     """分析英雄之间的克制关系"""
     print(f"\n🔍 英雄克制关系分析:")
     print("=" * 50)
     
-    # 找出最强的克制关系
-    strongest_counters = []
-    for hero1 in available_heroes:
-        for hero2 in available_heroes:
-            if hero1 != hero2:
-                data = hero_vs_hero_data[hero1][hero2]
-                if data['games'] >= min_games:
-                    win_rate = data['wins'] / data['games'] * 100
-                    if win_rate >= 75:  # 胜率超过75%算强克制
-                        strongest_counters.append((hero1, hero2, win_rate, data['games']))
-    
+    # 找出最强的克制关系（胜率超过75%算强克制）
+    strongest_counters = matchups.top_pairs(min_games=min_games, min_rate=75)
     if strongest_counters:
-        strongest_counters.sort(key=lambda x: x[2], reverse=True)
         print("强克制关系 (胜率≥75%):")
-        for hero1, hero2, win_rate, games in strongest_counters:
+        for hero1, hero2, win_rate, games, _ in strongest_counters:
             print(f"  {hero1} 克制 {hero2} ({win_rate:.1f}%, {games}场)")
     
-    # 找出最均衡的对战
-    balanced_matchups = []
-    for hero1 in available_heroes:
-        for hero2 in available_heroes:
-            if hero1 < hero2:  # 避免重复
-                data1 = hero_vs_hero_data[hero1][hero2]
-                data2 = hero_vs_hero_data[hero2][hero1]
-                total_games = data1['games'] + data2['games']
-                if total_games >= min_games * 2:
-                    hero1_wins = data1['wins']
-                    hero2_wins = data2['wins']
-                    total_wins = hero1_wins + hero2_wins
-                    if total_wins > 0:
-                        hero1_rate = hero1_wins / total_wins * 100
-                        if 45 <= hero1_rate <= 55:  # 胜率在45-55%之间算均衡
-                            balanced_matchups.append((hero1, hero2, hero1_rate, total_games))
-    
+    # 找出最均衡的对战（胜率在45-55%之间算均衡）
+    balanced_matchups = matchups.balanced_pairs(min_games=min_games, low=45, high=55)
     if balanced_matchups:
         print(f"\n均衡对战 (胜率45-55%):")
         for hero1, hero2, hero1_rate, games in balanced_matchups:
             print(f"  {hero1} vs {hero2} ({hero1_rate:.1f}% vs {100-hero1_rate:.1f}%, {games}场)")
 
-def run_specific_matchup(team1_names, team2_names, num_battles=50):
-    """运行特定对阵的多场战斗"""
+def run_specific_matchup(team1_names, team2_names, num_battles=50, seed=None, cache=None, stop_rule=None):
+    """
+    运行特定对阵的多场战斗
+
+    Args:
+        seed: 主种子（省略时随机）
+        cache: 可选的 MatchupCache；相同阵容、模板和种子下已模拟过的战斗直接取缓存结果
+        stop_rule: 可选的 SequentialStopRule；给定时分批运行，队伍1胜率满足停止条件即提前结束，
+                   num_battles 成为最大场数
+    Returns:
+        {'team1_wins', 'team2_wins', 'draws', 'total_turns', 'num_battles', 'seed'}，
+        自适应模式下另有 'sequential'（置信区间、实际场数和停止原因）
+    """
     print(f"\n⚔️ 特定对阵模拟")
     print(f"=" * 30)
     print(f"队伍1: {', '.join(team1_names)}")
     print(f"队伍2: {', '.join(team2_names)}")
-    print(f"战斗场数: {num_battles}")
+    print(f"战斗场数: {num_battles}" + (" (上限)" if stop_rule is not None else ""))
     
-    # 初始化工厂
-    effect_factory = EffectFactory()
-    skill_factory = SkillFactory(effect_factory)
-    unit_factory = UnitFactory(skill_factory)
-    
-    # 加载数据
-    effect_factory.load_effects_from_file('effects.yaml')
-    skill_factory.load_skills_from_file('skills.yaml')
-    unit_factory.load_heroes_from_file('hero.yaml')
+    # 初始化工厂并加载数据
+    unit_factory = load_factories()
     
     team1_wins = 0
     team2_wins = 0
     draws = 0
     total_turns = 0
     
-    for i in range(num_battles):
-        result = run_single_battle(unit_factory, team1_names, team2_names, silent=True)
-        if result:
-            if result['winner'] == 'team1':
-                team1_wins += 1
-            elif result['winner'] == 'team2':
-                team2_wins += 1
-            else:
-                draws += 1
-            total_turns += result['turns']
+    # 阵容固定，只创建一次，之后每场战斗前原地重置
+    team1_units = create_team(unit_factory, team1_names)
+    team2_units = create_team(unit_factory, team2_names)
+    
+    master_seed = seed if seed is not None else random.getrandbits(31)
+
+    def simulate(indices):
+        outcomes = {}
+        for i in indices:
+            result = run_prepared_battle(team1_units, team2_units, silent=True,
+                                         rng=BattleRNG.for_battle(master_seed, i))
+            if result:
+                outcomes[i] = (WINNER_CODES[result['winner']], result['turns'])
+        return outcomes
+
+    key = None
+    if cache is not None:
+        key = matchup_key(unit_factory, [u.name for u in team1_units], [u.name for u in team2_units], master_seed)
+        hits_before = cache.hits
+
+    def outcomes_for(indices):
+        return cache.fetch(key, indices, simulate) if cache is not None else simulate(indices)
+
+    sequential = None
+    if stop_rule is not None:
+        outcomes = {}
+        wins = 0
+        stopped_by = None
+        for start, stop in stop_rule.batches(num_battles):
+            batch = outcomes_for(range(start, stop))
+            outcomes.update(batch)
+            wins += sum(1 for winner, _ in batch.values() if winner == WINNER_CODES['team1'])
+            stopped_by = stop_rule.check(wins, len(outcomes))
+            if stopped_by:
+                break
+        sequential = stop_rule.summarize(wins, len(outcomes), stopped_by)
+    else:
+        outcomes = outcomes_for(range(num_battles))
+    battles = len(outcomes)
+
+    if cache is not None:
+        print(f"缓存命中 {cache.hits - hits_before} 场，新模拟 {battles - (cache.hits - hits_before)} 场")
+
+    for winner, turns in outcomes.values():
+        if winner == WINNER_CODES['team1']:
+            team1_wins += 1
+        elif winner == WINNER_CODES['team2']:
+            team2_wins += 1
+        else:
+            draws += 1
+        total_turns += turns
     
     print(f"\n结果:")
-    print(f"队伍1胜利: {team1_wins} ({team1_wins/num_battles*100:.1f}%)")
-    print(f"队伍2胜利: {team2_wins} ({team2_wins/num_battles*100:.1f}%)")
-    print(f"平局: {draws} ({draws/num_battles*100:.1f}%)")
-    print(f"平均回合数: {total_turns/num_battles:.1f}")
+    print(f"队伍1胜利: {team1_wins} ({team1_wins/max(1, battles)*100:.1f}%)")
+    print(f"队伍2胜利: {team2_wins} ({team2_wins/max(1, battles)*100:.1f}%)")
+    print(f"平局: {draws} ({draws/max(1, battles)*100:.1f}%)")
+    print(f"平均回合数: {total_turns/max(1, battles):.1f}")
+    if sequential is not None:
+        print(format_summary(sequential, label='队伍1胜率'))
+
+    results = {'team1_wins': team1_wins, 'team2_wins': team2_wins, 'draws': draws,
+               'total_turns': total_turns, 'num_battles': battles, 'seed': master_seed}
+    if sequential is not None:
+        results['sequential'] = sequential
+    return results
 
 def main():
     print("🎮 Headless战斗模拟器")
@@ -309,7 +504,7 @@ def main():
     results = run_batch_simulation(num_battles=200, team_size=3)
     
     # 分析英雄克制关系
-    analyze_hero_relationships(results['hero_vs_hero'], list(results['hero_win_rates'].keys()))
+    analyze_hero_relationships(results['matchups'])
     
     # 运行特定对阵测试
     run_specific_matchup(
@@ -1,40 +1,79 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Callable, List, Any, Dict, Optional, TYPE_CHECKING, Union
+from array import array
+from dataclasses import dataclass, replace
+from typing import Callable, List, Any, Dict, Optional, Tuple, TYPE_CHECKING, Union
 from abc import ABC
 import random
 
 # 确保从您的其他文件中正确导入
 from enums import TriggerPhase
+from battle_log import (battle_log, INFO, DamageEvent, NormalAttackEvent, StunnedEvent,
+                        TurnEndEvent, TurnStartEvent)
 
 if TYPE_CHECKING:
     from effect import GenericEffect
     from skill import Skill
+    from battle_rng import BattleRNG
 
-# Attribute 类保持不变，放在文件顶部
-@dataclass
+# 核心属性：基础值和倍率存放在每个单位的一个 array('d') 里，
+# 前 NUM_CORE 个是基础值，后 NUM_CORE 个是倍率
+CORE_ATTRIBUTES: Tuple[str, ...] = ('hp', 'attack', 'armor', 'speed', 'crit_rate')
+NUM_CORE = len(CORE_ATTRIBUTES)
+_CORE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(CORE_ATTRIBUTES)}
+_CORE_FINAL_TYPES: Tuple[Callable[[float], Any], ...] = (int, int, int, int, float)
+
+
+@dataclass(slots=True)
 class Attribute:
-    """用于存储单个可扩展属性的所有数据。"""
+    """自定义（非核心）属性的数据，通过 Unit.define_attribute 添加。"""
     base: float
     ratio: float = 1.0
     final_type: Callable[[float], Any] = int
-    calculation_logic: Callable[[float, float], float] = lambda base, ratio: base * ratio
+    # 省略时为 base * ratio
+    calculation_logic: Optional[Callable[[float, float], float]] = None
+
+    def raw_value(self) -> float:
+        if self.calculation_logic is None:
+            return self.base * self.ratio
+        return self.calculation_logic(self.base, self.ratio)
 
     @property
     def value(self) -> Any:
-        calculated_value = self.calculation_logic(self.base, self.ratio)
-        return self.final_type(calculated_value)
+        return self.final_type(self.raw_value())
 
 class Unit(ABC):
     """一个支持动态扩展属性和效果的、经过最终修正的单元类。"""
+
+    # 固定的实例字段放在槽里；'__dict__' 只在设置了自定义标志等动态属性时才会真正分配
+    __slots__ = ('name', 'max_hp', 'skills', 'effects', 'is_stunned', 'team_id',
+                 '_core', '_extra_attributes', '_attr_cache', '_passive_index', '_phase_subscribers',
+                 '_touched_flags', '_observer', '_current_hp', '__dict__')
+
+    # reset 时状态标志恢复到的默认值；未列出的标志会被直接删除
+    _FLAG_DEFAULTS: Dict[str, Any] = {'is_stunned': False}
     
     def __init__(self, skills: Optional[List[Skill]] = None, **kwargs):
         """通过关键字参数初始化属性，并通过列表初始化技能。"""
         # --- 1. 初始化所有容器 ---
-        self._attributes: Dict[str, Attribute] = {}
+        # 核心属性的基础值与倍率（见 CORE_ATTRIBUTES），自定义属性只在用到时才创建字典
+        self._core = array('d', [0.0] * (2 * NUM_CORE))
+        self._extra_attributes: Optional[Dict[str, Attribute]] = None
+        # 属性最终值缓存，以及“属性名 -> 会修改该属性的被动效果”索引；
+        # 只在效果列表或效果效力变化时按属性失效。被动钩子不纯（读取持有者/施加者的状态，
+        # 或是自定义函数）的属性不进缓存，每次读取都重新计算
+        self._attr_cache: Dict[str, Any] = {}
+        self._passive_index: Dict[str, List['GenericEffect']] = {}
+        # 按触发阶段分桶的效果（只包含定义了该阶段钩子的效果），在添加/移除效果时维护；
+        # 没有订阅者的阶段直接跳过分发
+        self._phase_subscribers: Dict[TriggerPhase, List['GenericEffect']] = {}
         self.effects: List['GenericEffect'] = []
         self.skills: Dict[str, Skill] = {}
         self.is_stunned: bool = False
+        # 被 SET_FLAG 修改过的状态标志名，reset 时据此恢复
+        self._touched_flags: set = set()
+        # 所在战斗的观察者（通常是 MultiBattle），在单位阵亡/复活或属性变化时收到通知
+        self._observer: Optional[Any] = None
+        self._current_hp = 0
         
         # --- 2. 填充技能字典 ---
         if skills:
@@ -42,90 +81,351 @@ class Unit(ABC):
                 self.skills[skill.name] = skill # 修正了赋值错误
         
         # --- 3. 定义核心"可计算"属性 ---
-        # 彻底移除了关于 'effects' 的错误定义
-        self._define_core_attribute('hp', kwargs.get('hp', 0))
-        self._define_core_attribute('attack', kwargs.get('attack', 0))
-        self._define_core_attribute('armor', kwargs.get('armor', 0))
-        self._define_core_attribute('speed', kwargs.get('speed', 0))
-        self._define_core_attribute('crit_rate', kwargs.get('crit_rate', 0.0), float)
+        core = self._core
+        for i, attr_name in enumerate(CORE_ATTRIBUTES):
+            core[i] = kwargs.get(attr_name, 0)
+            core[NUM_CORE + i] = 1.0
         
         # --- 4. 设置其他实例变量 ---
         self.name = kwargs.get('name', 'Unnamed Unit')
         self.max_hp = self.hp 
         self.current_hp = self.max_hp
 
-    def _define_core_attribute(self, name: str, base_value: float, final_type: Callable = int):
-        self._attributes[name] = Attribute(base=base_value, final_type=final_type)
+    @property
+    def current_hp(self) -> int:
+        return self._current_hp
+
+    @current_hp.setter
+    def current_hp(self, value: int):
+        was_alive = self._current_hp > 0
+        self._current_hp = value
+        if (value > 0) != was_alive and self._observer is not None:
+            self._observer.on_unit_alive_changed(self, value > 0)
+
+    def set_observer(self, observer: Optional[Any]):
+        """
+        设置战斗观察者。观察者需要提供 on_unit_alive_changed(unit, alive)、
+        on_unit_attribute_changed(unit, name)（name 为 None 表示所有属性）和
+        on_unit_effects_changed(unit)（添加或移除了单个效果）三个方法。
+        """
+        self._observer = observer
+
+    def define_attribute(self, name: str, base_value: float, final_type: Callable = int,
+                         calculation_logic: Optional[Callable[[float, float], float]] = None):
+        """添加一个自定义的可计算属性，它同样会被被动效果修正并缓存。"""
+        if name in _CORE_INDEX:
+            raise ValueError(f"'{name}' 是核心属性，请使用 set_attribute 修改")
+        if self._extra_attributes is None:
+            self._extra_attributes = {}
+        self._extra_attributes[name] = Attribute(base=base_value, final_type=final_type,
+                                                 calculation_logic=calculation_logic)
+        self._attribute_changed(name)
+
+    def attribute_names(self) -> List[str]:
+        """全部可计算属性的名称（核心属性在前）。"""
+        return list(CORE_ATTRIBUTES) + list(self._extra_attributes or ())
+
+    def get_attribute(self, name: str) -> Tuple[float, float]:
+        """返回属性的 (基础值, 倍率)。"""
+        index = _CORE_INDEX.get(name)
+        if index is not None:
+            return self._core[index], self._core[NUM_CORE + index]
+        attr_obj = (self._extra_attributes or {})[name]
+        return attr_obj.base, attr_obj.ratio
+
+    def set_attribute(self, name: str, base: Optional[float] = None, ratio: Optional[float] = None):
+        """修改属性的基础值和/或倍率，并使其缓存失效。"""
+        index = _CORE_INDEX.get(name)
+        if index is not None:
+            if base is not None:
+                self._core[index] = base
+            if ratio is not None:
+                self._core[NUM_CORE + index] = ratio
+        else:
+            attr_obj = (self._extra_attributes or {})[name]
+            if base is not None:
+                attr_obj.base = base
+            if ratio is not None:
+                attr_obj.ratio = ratio
+        self._attribute_changed(name)
+
+    def base_value(self, name: str) -> float:
+        """不计效果修正的属性值（基础值 × 倍率，未取整）。"""
+        index = _CORE_INDEX.get(name)
+        if index is not None:
+            return self._core[index] * self._core[NUM_CORE + index]
+        return (self._extra_attributes or {})[name].raw_value()
 
     def add_effect(self, effect: Union['GenericEffect', None], silent: bool = False):
         if effect:
             self.effects.append(effect)
+            effect.owner = self
+            self._subscribe(effect)
+            self._index_passive(effect)
+            if self._observer is not None:
+                self._observer.on_unit_effects_changed(self)
             effect.on_apply(self, silent=silent)
 
+    def remove_effect(self, effect: 'GenericEffect', silent: bool = False):
+        """移除单个效果并触发其 ON_REMOVE 钩子。"""
+        self.effects.remove(effect)
+        self._unsubscribe(effect)
+        self._unindex_passive(effect)
+        effect.owner = None
+        if self._observer is not None:
+            self._observer.on_unit_effects_changed(self)
+        effect.on_remove(self, silent=silent)
+
+    def clear_effects(self, silent: bool = False) -> List['GenericEffect']:
+        """移除全部效果，返回被移除的效果列表。"""
+        removed_effects = list(self.effects)
+        self.effects.clear()
+        self._phase_subscribers.clear()
+        self._passive_index.clear()
+        self._attribute_changed(None)
+        for effect in removed_effects:
+            effect.owner = None
+            effect.on_remove(self, silent=silent)
+        return removed_effects
+
+    def set_flag(self, flag_name: str, value: Any):
+        """设置一个状态标志（如 is_stunned），并记录下来以便 reset 时恢复。"""
+        self._touched_flags.add(flag_name)
+        setattr(self, flag_name, value)
+
+    def reset(self):
+        """
+        把单位原地恢复到刚创建时的状态：满血、技能冷却清零、状态标志复位、
+        移除所有效果。不会触发效果的 ON_REMOVE 钩子。
+        """
+        for effect in self.effects:
+            effect.owner = None
+        self.effects.clear()
+        self._phase_subscribers.clear()
+        self._passive_index.clear()
+        self._attribute_changed(None)
+        for flag_name in self._touched_flags:
+            if flag_name in self._FLAG_DEFAULTS:
+                setattr(self, flag_name, self._FLAG_DEFAULTS[flag_name])
+            else:
+                # 自定义标志保存在实例的 __dict__ 里
+                self.__dict__.pop(flag_name, None)
+        self._touched_flags.clear()
+        for skill in self.skills.values():
+            skill.reset()
+        self.current_hp = self.max_hp
+
+    def clone(self) -> 'Unit':
+        """
+        复制出一个处于初始状态的同类单位，跳过模板解析。
+        属性与技能是独立副本，当前的生命值、效果和标志不会被复制。
+        """
+        new_unit = object.__new__(type(self))
+        extra = self.__dict__
+        if extra:
+            new_unit.__dict__.update(extra)
+        new_unit.name = self.name
+        new_unit.max_hp = self.max_hp
+        new_unit.is_stunned = self.is_stunned
+        new_unit._core = array('d', self._core)
+        new_unit._extra_attributes = ({name: replace(attr) for name, attr in self._extra_attributes.items()}
+                                      if self._extra_attributes else None)
+        new_unit._attr_cache = {}
+        new_unit._passive_index = {}
+        new_unit._phase_subscribers = {}
+        new_unit._touched_flags = set(self._touched_flags)
+        new_unit._observer = None
+        new_unit._current_hp = 0
+        new_unit.effects = []
+        new_unit.skills = {name: skill.clone() for name, skill in self.skills.items()}
+        new_unit.reset()
+        if not self.effects:
+            # 没有效果时属性缓存里就是基础值，可以直接沿用
+            new_unit._attr_cache.update(self._attr_cache)
+        return new_unit
+
+    # --- 属性缓存维护 ---
+
+    def _subscribe(self, effect: 'GenericEffect'):
+        for phase in effect.compiled_hooks:
+            self._phase_subscribers.setdefault(phase, []).append(effect)
+
+    def _unsubscribe(self, effect: 'GenericEffect'):
+        for phase in effect.compiled_hooks:
+            subscribers = self._phase_subscribers.get(phase)
+            if subscribers and effect in subscribers:
+                subscribers.remove(effect)
+
+    def has_subscribers(self, phase: TriggerPhase) -> bool:
+        """是否有效果订阅了该触发阶段。"""
+        return bool(self._phase_subscribers.get(phase))
+
+    def _passive_attribute_names(self, effect: 'GenericEffect') -> List[str]:
+        """返回一个效果的被动钩子会影响的属性名。"""
+        if TriggerPhase.PASSIVE not in effect.compiled_hooks:
+            return []
+        target_attribute = effect.params.get('target_attribute')
+        if target_attribute is not None:
+            return [target_attribute]
+        # 未声明 target_attribute 的自定义被动逻辑，视为可能影响所有属性
+        return self.attribute_names()
+
+    def _index_passive(self, effect: 'GenericEffect'):
+        for name in self._passive_attribute_names(effect):
+            self._passive_index.setdefault(name, []).append(effect)
+            self._attribute_changed(name)
+
+    def _unindex_passive(self, effect: 'GenericEffect'):
+        for name in self._passive_attribute_names(effect):
+            indexed = self._passive_index.get(name)
+            if indexed and effect in indexed:
+                indexed.remove(effect)
+            self._attribute_changed(name)
+
+    def is_attribute_volatile(self, name: str) -> bool:
+        """该属性是否受不纯的被动钩子影响（值可能在没有通知的情况下变化，因此不缓存）。"""
+        for effect in self._passive_index.get(name, ()):
+            if not getattr(effect.compiled_hooks[TriggerPhase.PASSIVE], 'pure', False):
+                return True
+        return False
+
+    def on_effect_changed(self, effect: 'GenericEffect'):
+        """效果的效力等参数被修改时调用，使其影响的属性缓存失效。"""
+        for name in self._passive_attribute_names(effect):
+            self._attribute_changed(name)
+
+    def invalidate_attribute_cache(self, name: Optional[str] = None):
+        """
+        使属性缓存失效。直接修改自定义属性的 Attribute.base/ratio 之后需要调用
+        （set_attribute 会自动调用）。
+        Args:
+            name (str, optional): 要失效的属性名，省略时清空全部缓存。
+        """
+        self._attribute_changed(name)
+
+    def _attribute_changed(self, name: Optional[str]):
+        """使属性缓存失效并通知观察者；name 为 None 表示所有属性。"""
+        if name is None:
+            self._attr_cache.clear()
+        else:
+            self._attr_cache.pop(name, None)
+        if self._observer is not None:
+            self._observer.on_unit_attribute_changed(self, name)
+
+    def _resolve_attribute(self, name: str) -> Any:
+        index = _CORE_INDEX.get(name)
+        if index is not None:
+            final_value = self._core[index] * self._core[NUM_CORE + index]
+            final_type = _CORE_FINAL_TYPES[index]
+        else:
+            attr_obj = self._extra_attributes[name]
+            final_value = attr_obj.raw_value()
+            final_type = attr_obj.final_type
+        ratio_modifier, flat_modifier = 1.0, 0.0
+
+        for effect in self._passive_index.get(name, ()):
+            context = {'target': self, 'user': effect.source, 'attr_name': name}
+            modifiers = effect._execute_hook(TriggerPhase.PASSIVE, context)
+            if modifiers and isinstance(modifiers, dict):
+                ratio_modifier *= modifiers.get('ratio', 1.0)
+                flat_modifier += modifiers.get('flat', 0.0)
+
+        final_value = (final_value + flat_modifier) * ratio_modifier
+        return final_type(final_value)
+
     def __getattr__(self, name: str) -> Any:
-        if name in self._attributes:
-            attr_obj = self._attributes[name]
-            final_value = attr_obj.base * attr_obj.ratio
-            ratio_modifier, flat_modifier = 1.0, 0.0
-            
-            for effect in self.effects:
-                context = {'target': self, 'user': effect.source, 'attr_name': name}
-                modifiers = effect._execute_hook(TriggerPhase.PASSIVE, context)
-                if modifiers and isinstance(modifiers, dict):
-                    ratio_modifier *= modifiers.get('ratio', 1.0)
-                    flat_modifier += modifiers.get('flat', 0.0)
-            
-            final_value = (final_value + flat_modifier) * ratio_modifier
-            return attr_obj.final_type(final_value)
+        # 私有名与魔术方法不走属性系统（也避免 copy/pickle 时在 __init__ 之前递归）
+        if name[:1] == '_':
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        try:
+            return self._attr_cache[name]
+        except KeyError:
+            pass
+        if name in _CORE_INDEX or (self._extra_attributes and name in self._extra_attributes):
+            value = self._resolve_attribute(name)
+            if not self.is_attribute_volatile(name):
+                self._attr_cache[name] = value
+            return value
         raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
-    def take_damage(self, amount: int, is_crit: bool = False, silent: bool = False):
+    def take_damage(self, amount: int, is_crit: bool = False, silent: bool = False,
+                    source: Optional['Unit'] = None, trigger_hooks: bool = True):
+        """
+        结算一次伤害。
+        Args:
+            source (Unit, optional): 伤害来源，用于触发其 ON_DEAL_DAMAGE 钩子。
+            trigger_hooks (bool): 是否触发 ON_TAKE_DAMAGE / ON_DEAL_DAMAGE 钩子；
+                在伤害钩子内部造成的伤害不再触发，避免反伤互相递归。
+        """
         # 新的护甲计算逻辑：护甲越高，免伤比例越接近1
         armor_value = self.armor
         damage_reduction_ratio = armor_value / (armor_value + 100)
         final_damage = int(amount * (1 - damage_reduction_ratio))
         if is_crit:
             final_damage *= 2
-            if not silent:
-                print(f"[暴击！]{self.name} 受到暴击伤害！")
         self.current_hp -= final_damage
-        if not silent:
-            print(f"[{self.name}] 护甲减免了 {int(amount * damage_reduction_ratio)} 点伤害，受到了 {final_damage} 点伤害，当前生命值: {self.current_hp}/{self.hp}")
+        if not silent and battle_log.level <= INFO:
+            battle_log.emit(DamageEvent(self.name, int(amount * damage_reduction_ratio), final_damage,
+                                        self.current_hp, self.hp, is_crit))
 
-    def act(self, opponent: 'Unit'):
+        if not trigger_hooks:
+            return
+        take_subscribers = self._phase_subscribers.get(TriggerPhase.ON_TAKE_DAMAGE)
+        deal_subscribers = source._phase_subscribers.get(TriggerPhase.ON_DEAL_DAMAGE) if source is not None else None
+        if take_subscribers or deal_subscribers:
+            damage_info = {'amount': amount, 'damage': final_damage, 'is_crit': is_crit,
+                           'source': source, 'target': self}
+            for effect in list(take_subscribers or ()):
+                effect.on_take_damage(self, damage_info, silent=silent)
+            for effect in list(deal_subscribers or ()):
+                effect.on_deal_damage(source, damage_info, silent=silent)
+
+    def process_action(self, silent: bool = False):
+        """单位出手时触发 ON_ACTION 钩子（眩晕无法行动时不触发）。"""
+        subscribers = self._phase_subscribers.get(TriggerPhase.ON_ACTION)
+        if subscribers:
+            for effect in list(subscribers):
+                effect.on_action(self, silent=silent)
+
+    def act(self, opponent: 'Unit', rng: Optional['BattleRNG'] = None):
+        """单挑模式下行动一次。rng 为暴击判定使用的随机数流，省略时使用全局 random 模块。"""
         if self.is_stunned:
-            print(f"[{self.name}] 处于眩晕状态，无法行动！")
+            if battle_log.level <= INFO:
+                battle_log.emit(StunnedEvent(self.name))
             return
+        self.process_action()
         for skill in self.skills.values():
             if skill.is_ready():
-                skill.use(self, opponent)
+                skill.use(self, opponent, rng=rng)
                 return
-        print(f"[{self.name}] 没有可用的技能，执行普通攻击。")
+        if battle_log.level <= INFO:
+            battle_log.emit(NormalAttackEvent(self.name))
         # 普通攻击暴击判定
-        is_crit = random.random() < self.crit_rate
-        opponent.take_damage(self.attack, is_crit=is_crit)
+        is_crit = (rng or random).random() < self.crit_rate
+        opponent.take_damage(self.attack, is_crit=is_crit, source=self)
 
     def tick_skill_cooldowns(self):
         for skill in self.skills.values():
             skill.tick_cooldown()
     
     def process_turn_start(self, silent: bool = False):
-        if not silent:
-            print(f"\n[{self.name}] 的回合开始，当前生命值: {self.current_hp}/{self.hp}")
-        for effect in list(self.effects):
-            effect.on_turn_start(self, silent=silent)
+        if not silent and battle_log.level <= INFO:
+            battle_log.emit(TurnStartEvent(self.name, self.current_hp, self.hp))
+        subscribers = self._phase_subscribers.get(TriggerPhase.ON_TURN_START)
+        if subscribers:
+            for effect in list(subscribers):
+                effect.on_turn_start(self, silent=silent)
 
     def process_turn_end(self, silent: bool = False):
-        if not silent:
-            print(f"--- [{self.name}] 的回合结束 ---")
+        if not silent and battle_log.level <= INFO:
+            battle_log.emit(TurnEndEvent(self.name))
         expired_effects = []
         for effect in list(self.effects):
             if effect.tick():
                 expired_effects.append(effect)
         
         for effect in expired_effects:
-            self.effects.remove(effect)
-            effect.on_remove(self, silent=silent)
+            self.remove_effect(effect, silent=silent)
         
         self.tick_skill_cooldowns()
 
@@ -137,6 +437,7 @@ class Unit(ABC):
 
 class Hero(Unit):
     """一个具体的英雄类，继承自 Unit。"""
+    __slots__ = ()
     
     # 【修正】构造函数现在能正确处理 name 和 skills，并传递给父类
     def __init__(self, name: str, skills: Optional[List[Skill]] = None, **kwargs):
@@ -0,0 +1,201 @@
+# instrumentation.py
+"""
+可选的热路径计数器：按动作类型、效果名、触发阶段统计调用次数和累计耗时，
+并统计单位属性查询（Unit.__getattr__）的次数、缓存未命中次数和解析耗时。
+
+关闭时不增加任何开销：启用是把 GenericEffect._execute_hook、Unit.__getattr__ 和
+ActionInterpreter.execute 临时替换为带计时的版本，关闭时换回原实现。
+动作按编译后钩子的 action_steps 逐步计时（见 ActionInterpreter.compile）。
+
+统计结果可以序列化为普通字典，从工作进程传回主进程后合并。
+各维度的耗时都是包含关系：效果耗时包含其动作耗时，动作耗时包含其中触发的属性查询。
+"""
+from __future__ import annotations
+import contextlib
+from time import perf_counter_ns
+from typing import Any, Dict, Iterator, List, Optional
+
+from action_interpreter import ActionInterpreter
+from effect import GenericEffect
+from hero import Unit
+
+
+class HotPathStats:
+    """
+    热路径统计。
+    actions / effects / phases: 名称 -> [调用次数, 累计纳秒]
+    attributes: 属性名 -> [查询次数, 缓存未命中次数, 累计纳秒]
+    """
+
+    def __init__(self):
+        self.actions: Dict[str, List[int]] = {}
+        self.effects: Dict[str, List[int]] = {}
+        self.phases: Dict[str, List[int]] = {}
+        self.attributes: Dict[str, List[int]] = {}
+
+    def reset(self):
+        self.actions.clear()
+        self.effects.clear()
+        self.phases.clear()
+        self.attributes.clear()
+
+    def __bool__(self) -> bool:
+        return bool(self.actions or self.effects or self.phases or self.attributes)
+
+    @staticmethod
+    def _add(table: Dict[str, List[int]], name: str, elapsed: int):
+        entry = table.get(name)
+        if entry is None:
+            table[name] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def to_dict(self) -> Dict[str, Dict[str, List[int]]]:
+        return {'actions': self.actions, 'effects': self.effects,
+                'phases': self.phases, 'attributes': self.attributes}
+
+    def merge(self, other: Any):
+        """合并另一份统计（HotPathStats 或 to_dict 的结果）。"""
+        data = other.to_dict() if isinstance(other, HotPathStats) else other
+        for key, table in self.to_dict().items():
+            for name, values in data.get(key, {}).items():
+                entry = table.get(name)
+                if entry is None:
+                    table[name] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        entry[i] += value
+
+    def format_table(self, top: int = 15) -> str:
+        """按累计耗时排序，格式化为文本表格。"""
+        lines = []
+
+        def section(title: str, table: Dict[str, List[int]]):
+            if not table:
+                return
+            lines.append(f"\n{title}:")
+            lines.append(f"{'名称':16s} {'调用次数':>10s} {'总耗时(ms)':>12s} {'平均(µs)':>10s}")
+            lines.append("-" * 54)
+            for name, (count, elapsed) in sorted(table.items(), key=lambda item: -item[1][1])[:top]:
+                lines.append(f"{name:16s} {count:10d} {elapsed / 1e6:12.2f} {elapsed / count / 1e3:10.2f}")
+
+        section("动作类型", self.actions)
+        section("效果", self.effects)
+        section("触发阶段", self.phases)
+        if self.attributes:
+            lines.append("\n属性查询:")
+            lines.append(f"{'属性':16s} {'查询次数':>10s} {'未命中':>10s} {'解析耗时(ms)':>14s}")
+            lines.append("-" * 54)
+            for name, (count, misses, elapsed) in sorted(self.attributes.items(), key=lambda item: -item[1][0])[:top]:
+                lines.append(f"{name:16s} {count:10d} {misses:10d} {elapsed / 1e6:14.2f}")
+        return "\n".join(lines)
+
+
+# 当前进程的统计结果
+hot_stats = HotPathStats()
+
+_original_execute_hook = GenericEffect._execute_hook
+_original_getattr = Unit.__getattr__
+_original_execute = ActionInterpreter.execute
+_enabled = False
+
+
+def _run_hook(hook, context: Dict[str, Any]) -> Any:
+    """按 action_steps 逐步执行并计时，返回值与直接调用 hook 相同。"""
+    steps = getattr(hook, 'action_steps', None)
+    if steps is None:
+        return hook(context)
+    actions = hot_stats.actions
+    if len(steps) == 1:
+        action_type, step = steps[0]
+        start = perf_counter_ns()
+        result = step(context)
+        HotPathStats._add(actions, action_type, perf_counter_ns() - start)
+        return result
+    return_values = {}
+    for action_type, step in steps:
+        start = perf_counter_ns()
+        result = step(context)
+        HotPathStats._add(actions, action_type, perf_counter_ns() - start)
+        if result:
+            return_values.update(result)
+    if return_values:
+        return return_values
+
+
+def _instrumented_execute_hook(self: GenericEffect, phase, context: Dict[str, Any]) -> Any:
+    hook = self.compiled_hooks.get(phase)
+    if hook is not None:
+        context['effect'] = self
+        start = perf_counter_ns()
+        result = _run_hook(hook, context)
+        elapsed = perf_counter_ns() - start
+        HotPathStats._add(hot_stats.effects, self.name, elapsed)
+        HotPathStats._add(hot_stats.phases, phase.name, elapsed)
+        return result
+
+
+def _instrumented_getattr(self: Unit, name: str) -> Any:
+    if name[:1] == '_':
+        return _original_getattr(self, name)
+    miss = name not in self._attr_cache
+    start = perf_counter_ns()
+    value = _original_getattr(self, name)
+    elapsed = perf_counter_ns() - start
+    entry = hot_stats.attributes.get(name)
+    if entry is None:
+        hot_stats.attributes[name] = [1, int(miss), elapsed]
+    else:
+        entry[0] += 1
+        entry[1] += miss
+        entry[2] += elapsed
+    return value
+
+
+def _instrumented_execute(self: ActionInterpreter, actions, context: Dict[str, Any]) -> Any:
+    start = perf_counter_ns()
+    result = _run_hook(self.compile(actions), context)
+    HotPathStats._add(hot_stats.phases, 'EXECUTE', perf_counter_ns() - start)
+    return result
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    """开始统计（替换热路径方法）。"""
+    global _enabled
+    GenericEffect._execute_hook = _instrumented_execute_hook
+    Unit.__getattr__ = _instrumented_getattr
+    ActionInterpreter.execute = _instrumented_execute
+    _enabled = True
+
+
+def disable():
+    """停止统计，恢复原实现。"""
+    global _enabled
+    GenericEffect._execute_hook = _original_execute_hook
+    Unit.__getattr__ = _original_getattr
+    ActionInterpreter.execute = _original_execute
+    _enabled = False
+
+
+@contextlib.contextmanager
+def collect(stats: Optional[HotPathStats] = None) -> Iterator[HotPathStats]:
+    """
+    在 with 块内启用统计，结束时恢复原来的启用状态。
+    块内的统计结果累加到 stats（省略时新建一份）中并返回。
+    """
+    global hot_stats
+    stats = stats if stats is not None else HotPathStats()
+    previous_stats, was_enabled = hot_stats, _enabled
+    hot_stats = stats
+    enable()
+    try:
+        yield stats
+    finally:
+        hot_stats = previous_stats
+        if not was_enabled:
+            disable()
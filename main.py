@@ -19,10 +19,8 @@ def main():
     skill_factory = SkillFactory(effect_factory)
     unit_factory = UnitFactory(skill_factory)
     
-    # 加载数据
-    effect_factory.load_effects_from_file('effects.yaml')
-    skill_factory.load_skills_from_file('skills.yaml')
-    unit_factory.load_heroes_from_file('hero.yaml')
+    # 加载数据（三个模板文件一起加载，使用预编译缓存）
+    unit_factory.load_all_from_files()
     
     # 自动设置队伍人数为4
     team_size = 4
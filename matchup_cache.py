@@ -0,0 +1,197 @@
+# matchup_cache.py
+"""
+对阵评估结果的持久化缓存。
+
+缓存以“单场战斗”为粒度保存结果 (胜者编码, 回合数)，键由以下内容的规范化哈希组成：
+  - 双方每个英雄的有效模板：基础属性（含调参覆盖）、技能模板与英雄配置合并后的参数、
+    技能引用到的效果模板及参数覆盖
+  - 主种子、ENGINE_VERSION，以及调用方附加的参数（如评估方式）
+战斗序号 i 使用 BattleRNG.for_battle(主种子, i)，所以同一个键下序号相同的战斗结果
+完全确定。查询 [start, stop) 时先查内存 LRU，再查 SQLite，只模拟缺失的序号。
+"""
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from factory_unit import UnitFactory
+
+# 战斗逻辑（伤害公式、行动顺序、随机数的使用方式等）变化时递增，使旧的缓存结果失效
+ENGINE_VERSION = 1
+
+# 单场结果：(胜者编码, 回合数)，胜者编码见 matchup_stats.WINNER_CODES
+Outcome = Tuple[int, int]
+SimulateCallable = Callable[[List[int]], Dict[int, Outcome]]
+
+
+def _canonical(value: Any) -> Any:
+    """把模板数据转换为可稳定序列化的形式；自定义逻辑函数以限定名表示。"""
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if callable(value):
+        return f"<callable {getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}>"
+    if isinstance(value, float) and value in (float('inf'), float('-inf')):
+        return repr(value)
+    return value
+
+
+def effective_template(unit_factory: UnitFactory, hero_name: str,
+                       stats: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    展开英雄实际使用的全部模板数据。
+    Args:
+        stats: 可选的调参覆盖，键为基础属性名或技能名（技能的值为伤害倍率）。
+    """
+    stats = stats or {}
+    template = unit_factory._templates[hero_name]
+    skill_factory = unit_factory.skill_factory
+    effect_factory = skill_factory.effect_factory
+
+    base_stats = dict(template.get('base_stats', {}))
+    base_stats.update({name: value for name, value in stats.items() if name in base_stats})
+
+    skills = []
+    for skill_config in template.get('skills', []):
+        skill_name = skill_config.get('name')
+        if not skill_name:
+            continue
+        params = dict(skill_factory._templates.get(skill_name, {}))
+        overrides = {key: value for key, value in skill_config.items() if key not in ('name', 'effects')}
+        params.update(overrides)
+        if skill_config.get('effects'):
+            params['effects_to_apply'] = skill_config['effects']
+        if skill_name in stats:
+            params['damage_multiplier'] = stats[skill_name]
+
+        effects = []
+        for effect_data in params.get('effects_to_apply') or []:
+            effect_template = effect_factory._templates.get(effect_data.get('name'), {})
+            effects.append({
+                'overrides': effect_data,
+                'logic_hooks': effect_template.get('logic_hooks'),
+                'default_params': effect_template.get('default_params'),
+            })
+        params['effects_to_apply'] = effects
+        skills.append({'name': skill_name, 'params': params})
+
+    return {'name': hero_name, 'class': template.get('class', 'Hero'), 'base_stats': base_stats, 'skills': skills}
+
+
+def matchup_key(unit_factory: UnitFactory, team1: Sequence[Any], team2: Sequence[Any], master_seed: int,
+                **extra: Any) -> str:
+    """
+    计算对阵的缓存键。
+    Args:
+        team1 / team2: 英雄名，或 (英雄名, 调参覆盖) 二元组的列表；顺序有意义（影响同速时的先后手）。
+        master_seed: 战斗随机数流的主种子。
+        **extra: 其他会影响结果的参数。
+    """
+    def expand(team):
+        members = []
+        for member in team:
+            name, stats = (member, None) if isinstance(member, str) else member
+            members.append(effective_template(unit_factory, name, stats))
+        return members
+
+    payload = {
+        'engine_version': ENGINE_VERSION,
+        'master_seed': master_seed,
+        'team1': expand(team1),
+        'team2': expand(team2),
+        'extra': extra,
+    }
+    text = json.dumps(_canonical(payload), ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class MatchupCache:
+    """
+    单场结果缓存：内存中按键做 LRU，磁盘上是一个 SQLite 文件。
+    Args:
+        path: SQLite 文件路径；None 表示只使用内存。
+        max_keys: 内存 LRU 最多保留的键数。
+    """
+
+    def __init__(self, path: Optional[str] = 'matchup_cache.sqlite', max_keys: int = 256):
+        self.path = path
+        self.max_keys = max_keys
+        self._memory: OrderedDict[str, Dict[int, Outcome]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outcomes ("
+                " key TEXT NOT NULL, battle INTEGER NOT NULL, winner INTEGER NOT NULL, turns INTEGER NOT NULL,"
+                " PRIMARY KEY (key, battle)) WITHOUT ROWID")
+            self._db.commit()
+
+    def _entry(self, key: str) -> Dict[int, Outcome]:
+        entry = self._memory.get(key)
+        if entry is None:
+            entry = self._memory[key] = {}
+            while len(self._memory) > self.max_keys:
+                self._memory.popitem(last=False)
+        else:
+            self._memory.move_to_end(key)
+        return entry
+
+    def get(self, key: str, indices: Iterable[int]) -> Dict[int, Outcome]:
+        """返回已缓存的序号及其结果。"""
+        indices = list(indices)
+        entry = self._entry(key)
+        missing = [i for i in indices if i not in entry]
+        if missing and self._db is not None:
+            rows = self._db.execute(
+                "SELECT battle, winner, turns FROM outcomes WHERE key = ? AND battle >= ? AND battle <= ?",
+                (key, min(missing), max(missing)))
+            for battle, winner, turns in rows:
+                entry[battle] = (winner, turns)
+        return {i: entry[i] for i in indices if i in entry}
+
+    def put(self, key: str, outcomes: Dict[int, Outcome]):
+        if not outcomes:
+            return
+        self._entry(key).update(outcomes)
+        if self._db is not None:
+            self._db.executemany("INSERT OR REPLACE INTO outcomes (key, battle, winner, turns) VALUES (?, ?, ?, ?)",
+                                 [(key, i, winner, turns) for i, (winner, turns) in outcomes.items()])
+            self._db.commit()
+
+    def fetch(self, key: str, indices: Iterable[int], simulate: SimulateCallable) -> Dict[int, Outcome]:
+        """
+        返回 indices 中每个序号的结果；缺失的序号交给 simulate(缺失序号列表) 模拟并写入缓存。
+        """
+        indices = list(indices)
+        found = self.get(key, indices)
+        missing = [i for i in indices if i not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            simulated = simulate(missing)
+            self.put(key, simulated)
+            found.update(simulated)
+        return found
+
+    def clear(self):
+        self._memory.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM outcomes")
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,199 @@
+# matchup_stats.py
+"""
+英雄胜率与英雄对英雄胜率的稠密矩阵统计。
+
+英雄在创建时被映射为整数编号，胜场/场次保存在 NumPy 整数数组中：
+  hero_wins[i], hero_games[i]      英雄 i 的胜场与参战场数
+  pair_wins[i, j], pair_games[i, j] 英雄 i 与英雄 j 分属两队时，i 获胜的场数与对阵场数
+每场战斗用索引累加更新；报表（胜率、阈值筛选、排行、均衡对战）都以向量化方式计算。
+不同进程产生的统计可以直接合并，也可以序列化为 dict 或 .npz 文件。
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# 胜者编码，与 result_sink 的列式格式一致
+WINNER_CODES = {'draw': 0, 'team1': 1, 'team2': 2}
+
+
+class MatchupStats:
+    def __init__(self, hero_names: Iterable[str] = ()):
+        self.hero_names: List[str] = []
+        self.hero_ids: Dict[str, int] = {}
+        self.hero_wins = np.zeros(0, dtype=np.int64)
+        self.hero_games = np.zeros(0, dtype=np.int64)
+        self.pair_wins = np.zeros((0, 0), dtype=np.int64)
+        self.pair_games = np.zeros((0, 0), dtype=np.int64)
+        self.add_heroes(hero_names)
+
+    # --- 编号管理 ---
+
+    def add_heroes(self, hero_names: Iterable[str]):
+        """登记新英雄并扩展数组，已登记的英雄保持原编号。"""
+        new_names = [name for name in dict.fromkeys(hero_names) if name not in self.hero_ids]
+        if not new_names:
+            return
+        for name in new_names:
+            self.hero_ids[name] = len(self.hero_names)
+            self.hero_names.append(name)
+        extra = len(new_names)
+        self.hero_wins = np.pad(self.hero_wins, (0, extra))
+        self.hero_games = np.pad(self.hero_games, (0, extra))
+        self.pair_wins = np.pad(self.pair_wins, ((0, extra), (0, extra)))
+        self.pair_games = np.pad(self.pair_games, ((0, extra), (0, extra)))
+
+    def ids(self, hero_names: Sequence[str]) -> np.ndarray:
+        """把英雄名转换为编号数组，未登记的英雄会自动登记。"""
+        hero_ids = self.hero_ids
+        if any(name not in hero_ids for name in hero_names):
+            self.add_heroes(hero_names)
+        return np.fromiter((hero_ids[name] for name in hero_names), dtype=np.int64, count=len(hero_names))
+
+    # --- 更新 ---
+
+    def record(self, team1_names: Sequence[str], team2_names: Sequence[str], winner: str):
+        """记录一场战斗。winner 为 'team1'、'team2' 或 'draw'。"""
+        team1, team2 = self.ids(team1_names), self.ids(team2_names)
+        np.add.at(self.hero_games, team1, 1)
+        np.add.at(self.hero_games, team2, 1)
+        np.add.at(self.pair_games, (team1[:, None], team2[None, :]), 1)
+        np.add.at(self.pair_games, (team2[:, None], team1[None, :]), 1)
+        if winner == 'team1':
+            np.add.at(self.hero_wins, team1, 1)
+            np.add.at(self.pair_wins, (team1[:, None], team2[None, :]), 1)
+        elif winner == 'team2':
+            np.add.at(self.hero_wins, team2, 1)
+            np.add.at(self.pair_wins, (team2[:, None], team1[None, :]), 1)
+
+    def record_many(self, team1_ids: np.ndarray, team2_ids: np.ndarray, winners: np.ndarray):
+        """
+        批量记录同样队伍人数的多场战斗。
+        Args:
+            team1_ids / team2_ids: (场数, 人数) 的英雄编号数组。
+            winners: (场数,) 的胜者编码数组，见 WINNER_CODES。
+        """
+        size = len(self.hero_names)
+        team1_ids, team2_ids = np.asarray(team1_ids), np.asarray(team2_ids)
+        self.hero_games += np.bincount(team1_ids.ravel(), minlength=size)
+        self.hero_games += np.bincount(team2_ids.ravel(), minlength=size)
+
+        # 每场战斗双方所有 (队伍1英雄, 队伍2英雄) 组合
+        rows = np.repeat(team1_ids, team2_ids.shape[1], axis=1)
+        cols = np.tile(team2_ids, (1, team1_ids.shape[1]))
+        pair_counts = np.bincount((rows * size + cols).ravel(), minlength=size * size).reshape(size, size)
+        self.pair_games += pair_counts + pair_counts.T
+
+        for code, winner_ids, pair_index in ((WINNER_CODES['team1'], team1_ids, (rows, cols)),
+                                             (WINNER_CODES['team2'], team2_ids, (cols, rows))):
+            won = winners == code
+            if not won.any():
+                continue
+            self.hero_wins += np.bincount(winner_ids[won].ravel(), minlength=size)
+            flat = pair_index[0][won] * size + pair_index[1][won]
+            self.pair_wins += np.bincount(flat.ravel(), minlength=size * size).reshape(size, size)
+
+    def merge(self, other: MatchupStats):
+        """把另一份统计累加进来，按英雄名对齐编号。"""
+        if other.hero_names == self.hero_names:
+            self.hero_wins += other.hero_wins
+            self.hero_games += other.hero_games
+            self.pair_wins += other.pair_wins
+            self.pair_games += other.pair_games
+            return
+        index = self.ids(other.hero_names)
+        self.hero_wins[index] += other.hero_wins
+        self.hero_games[index] += other.hero_games
+        self.pair_wins[np.ix_(index, index)] += other.pair_wins
+        self.pair_games[np.ix_(index, index)] += other.pair_games
+
+    # --- 序列化 ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hero_names': list(self.hero_names),
+            'hero_wins': self.hero_wins.tolist(),
+            'hero_games': self.hero_games.tolist(),
+            'pair_wins': self.pair_wins.tolist(),
+            'pair_games': self.pair_games.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> MatchupStats:
+        stats = cls(data['hero_names'])
+        stats.hero_wins[:] = data['hero_wins']
+        stats.hero_games[:] = data['hero_games']
+        stats.pair_wins[:] = data['pair_wins']
+        stats.pair_games[:] = data['pair_games']
+        return stats
+
+    def save(self, path: str):
+        np.savez(path, hero_names=np.array(self.hero_names), hero_wins=self.hero_wins,
+                 hero_games=self.hero_games, pair_wins=self.pair_wins, pair_games=self.pair_games)
+
+    @classmethod
+    def load(cls, path: str) -> MatchupStats:
+        with np.load(path) as data:
+            return cls.from_dict({key: data[key].tolist() for key in data.files})
+
+    # --- 报表 ---
+
+    def win_rates(self, min_games: int = 0) -> np.ndarray:
+        """每个英雄的胜率（百分比），场次不足的为 nan。"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = self.hero_wins / self.hero_games * 100
+        return np.where((self.hero_games >= min_games) & (self.hero_games > 0), rates, np.nan)
+
+    def pair_win_rates(self, min_games: int = 0) -> np.ndarray:
+        """英雄 i 对英雄 j 的胜率矩阵（百分比），对角线和场次不足的为 nan。"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = self.pair_wins / self.pair_games * 100
+        valid = (self.pair_games >= min_games) & (self.pair_games > 0)
+        np.fill_diagonal(valid, False)
+        return np.where(valid, rates, np.nan)
+
+    def top_heroes(self, k: int = None, min_games: int = 0) -> List[Tuple[str, float, int, int]]:
+        """按胜率从高到低返回 (英雄, 胜率, 场次, 胜场)。"""
+        rates = self.win_rates(min_games)
+        valid = np.nonzero(~np.isnan(rates))[0]
+        order = valid[np.argsort(-rates[valid], kind='stable')][:k]
+        return [(self.hero_names[i], float(rates[i]), int(self.hero_games[i]), int(self.hero_wins[i])) for i in order]
+
+    def top_pairs(self, k: int = None, min_games: int = 0, min_rate: float = None,
+                  hero: str = None) -> List[Tuple[str, str, float, int, int]]:
+        """
+        按胜率从高到低返回 (英雄1, 英雄2, 英雄1胜率, 场次, 英雄1胜场)。
+        Args:
+            k: 最多返回的条数。
+            min_games: 最少对阵场数。
+            min_rate: 只返回胜率不低于该值的组合。
+            hero: 只返回英雄1为该英雄的组合。
+        """
+        rates = self.pair_win_rates(min_games)
+        if hero is not None:
+            mask = np.zeros_like(rates, dtype=bool)
+            mask[self.hero_ids[hero]] = True
+            rates = np.where(mask, rates, np.nan)
+        if min_rate is not None:
+            rates = np.where(rates >= min_rate, rates, np.nan)
+        rows, cols = np.nonzero(~np.isnan(rates))
+        order = np.argsort(-rates[rows, cols], kind='stable')[:k]
+        return [(self.hero_names[i], self.hero_names[j], float(rates[i, j]),
+                 int(self.pair_games[i, j]), int(self.pair_wins[i, j]))
+                for i, j in zip(rows[order], cols[order])]
+
+    def balanced_pairs(self, min_games: int = 0, low: float = 45, high: float = 55) -> List[Tuple[str, str, float, int]]:
+        """
+        找出双方胜率都在 [low, high] 之间的英雄组合，返回 (英雄1, 英雄2, 英雄1胜率, 总场次)。
+        每个组合只出现一次，英雄1是名称排序较小的一方。
+        """
+        total_games = self.pair_games + self.pair_games.T
+        total_wins = self.pair_wins + self.pair_wins.T
+        name_rank = np.argsort(np.argsort(np.array(self.hero_names, dtype=object)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = self.pair_wins / total_wins * 100
+        valid = ((name_rank[:, None] < name_rank[None, :]) & (total_games >= min_games * 2)
+                 & (total_wins > 0) & (rates >= low) & (rates <= high))
+        rows, cols = np.nonzero(valid)
+        return [(self.hero_names[i], self.hero_names[j], float(rates[i, j]), int(total_games[i, j]))
+                for i, j in zip(rows, cols)]
@@ -1,20 +1,81 @@
 from __future__ import annotations
-from typing import List, TYPE_CHECKING
-import random
+from typing import Generator, List, Optional, Tuple, TYPE_CHECKING
+
+from battle_rng import BattleRNG
+from battle_log import (battle_log, INFO, BattleEndEvent, BattleStartEvent, NormalAttackEvent,
+                        RoundStartEvent, SkillCastEvent, SkillNotReadyEvent, StunnedEvent, UnitTurnEvent)
 
 if TYPE_CHECKING:
     from hero import Unit
+    from skill import Skill
+
+# 受控单位的一次行动：(要使用的技能或 None 表示普通攻击, 首要目标或 None 表示随机)
+Action = Tuple[Optional['Skill'], Optional['Unit']]
 
 class MultiBattle:
-    def __init__(self, team1: List[Unit], team2: List[Unit], silent: bool = False):
+    TEAM1, TEAM2 = 0, 1
+
+    def __init__(self, team1: List[Unit], team2: List[Unit], silent: bool = False,
+                 rng: Optional[BattleRNG] = None):
+        """
+        Args:
+            rng (BattleRNG, optional): 本场战斗的随机数流（暴击判定、目标选择）。
+                省略时从全局 random 模块取种子创建，random.seed() 仍然可以复现战斗。
+        """
         self.team1 = team1
         self.team2 = team2
         self.silent = silent
+        self.rng = rng if rng is not None else BattleRNG.from_global_random()
+
+        # 调度状态：每个单位记录所在队伍编号；每队维护按队伍顺序排列的存活列表，
+        # 只在单位阵亡/复活时增量更新。行动顺序只在速度可能变化后才重新排序。
+        self._teams = (team1, team2)
+        self._alive: Tuple[List[Unit], List[Unit]] = ([], [])
+        for team_id, team in enumerate(self._teams):
+            for unit in team:
+                unit.team_id = team_id
+                unit.set_observer(self)
+                if unit.current_hp > 0:
+                    self._alive[team_id].append(unit)
+        self._turn_order: List[Unit] = team1 + team2
+        self._order_dirty = True
+        # 单位在本场战斗中的编号（队伍1在前），快照中用它引用单位
+        self._units: List[Unit] = team1 + team2
+        self._unit_index = {unit: i for i, unit in enumerate(self._units)}
+
+        # 战斗进度：回合数、本回合的行动顺序（尚未开始时为 None）、其中正在行动的位置，
+        # 以及是否停在等待受控单位决策的地方。保存在实例上，快照恢复后可以继续
+        self.turn = 1
+        self._round: Optional[List[Unit]] = None
+        self._round_pos = 0
+        self._awaiting = False
         
-        if not self.silent:
-            print("====== 多英雄战斗开始 ======")
-            print(f"队伍1 ({len(team1)}人): {', '.join([u.name for u in team1])}")
-            print(f"队伍2 ({len(team2)}人): {', '.join([u.name for u in team2])}")
+        if not self.silent and battle_log.level <= INFO:
+            battle_log.emit(BattleStartEvent([u.name for u in team1], [u.name for u in team2]))
+
+    # --- 单位状态通知（由 Unit 调用） ---
+
+    def on_unit_alive_changed(self, unit: Unit, alive: bool):
+        alive_units = self._alive[unit.team_id]
+        if not alive:
+            alive_units.remove(unit)
+            return
+        # 复活：按队伍中的原始位置插回，保持存活列表的顺序
+        team = self._teams[unit.team_id]
+        position = team.index(unit)
+        index = 0
+        while index < len(alive_units) and team.index(alive_units[index]) < position:
+            index += 1
+        alive_units.insert(index, unit)
+
+    def on_unit_attribute_changed(self, unit: Unit, name: Optional[str]):
+        if name is None or name == 'speed':
+            self._order_dirty = True
+
+    def on_unit_effects_changed(self, unit: Unit):
+        """单位添加或移除了效果；调度不关心，供子类（如观测编码）使用。"""
+
+    # --- 查询 ---
 
     def get_alive_units(self, team: List[Unit]) -> List[Unit]:
         """获取队伍中存活的单位"""
@@ -22,60 +83,108 @@ class MultiBattle:
 
     def get_all_alive_units(self) -> List[Unit]:
         """获取所有存活的单位"""
-        return self.get_alive_units(self.team1) + self.get_alive_units(self.team2)
+        return self._alive[self.TEAM1] + self._alive[self.TEAM2]
+
+    def alive_count(self, team_id: int) -> int:
+        """获取指定队伍编号（TEAM1/TEAM2）的存活人数"""
+        return len(self._alive[team_id])
 
     def get_opponents(self, unit: Unit) -> List[Unit]:
         """获取指定单位的对手队伍"""
-        if unit in self.team1:
-            return self.get_alive_units(self.team2)
-        else:
-            return self.get_alive_units(self.team1)
+        return list(self._alive[1 - unit.team_id])
+
+    def _current_turn_order(self) -> List[Unit]:
+        """本回合的行动顺序：存活单位按速度从高到低，同速保持队伍1在前、队伍内按原顺序。"""
+        if self._order_dirty or any(unit.is_attribute_volatile('speed') for unit in self._units):
+            # 速度受不纯被动影响时不会收到变化通知，每回合重新排序；对全体单位做稳定排序（reverse 排序同样保持相等元素的原顺序）
+            self._turn_order = sorted(self.team1 + self.team2, key=lambda u: u.speed, reverse=True)
+            self._order_dirty = False
+        return [unit for unit in self._turn_order if unit.current_hp > 0]
 
     def run(self):
         """执行多英雄战斗循环，直到一方全部倒下"""
-        turn = 1
+        game = self.play()
+        try:
+            next(game)
+        except StopIteration as stop:
+            return stop.value
+        raise RuntimeError("play() 在没有受控队伍时不应让出决策")
+
+    def play(self, controlled_team: Optional[int] = None,
+             resume: bool = False) -> Generator[Unit, Optional[Action], dict]:
+        """
+        以生成器形式执行战斗，返回值（StopIteration.value）与 run() 的结果相同。
+        controlled_team 队伍的单位每次可以行动（存活且未被眩晕）时，生成器让出该单位，
+        调用方通过 send((技能或 None, 目标或 None)) 指定本次行动，None 表示普通攻击 / 随机目标。
+        其他单位按默认策略行动。
+        resume 为 True 时从战斗记录的进度继续（见 battle_snapshot.restore），
+        如果进度停在决策点，会先再次让出等待决策的单位。
+        """
+        if not resume:
+            self.turn, self._round, self._round_pos, self._awaiting = 1, None, 0, False
+        team1_alive, team2_alive = self._alive
+        # 之前的生成器结束时会解除关联，这里重新关联
+        for unit in self._units:
+            unit.set_observer(self)
         
-        while self.get_alive_units(self.team1) and self.get_alive_units(self.team2):
-            if not self.silent:
-                print(f"\n★★★★★ 回合 {turn} ★★★★★")
-            
-            # 获取所有存活单位，按速度排序
-            all_alive = self.get_all_alive_units()
-            all_alive.sort(key=lambda u: u.speed, reverse=True)
-            
-            # 每个存活单位依次行动
-            for unit in all_alive:
-                if unit.current_hp <= 0:
-                    continue
-                    
-                if not self.silent:
-                    print(f"\n轮到 [{unit.name}] 行动...")
-                unit.process_turn_start(silent=self.silent)
+        try:
+            while team1_alive and team2_alive:
+                if self._round is None:
+                    if not self.silent and battle_log.level <= INFO:
+                        battle_log.emit(RoundStartEvent(self.turn))
+                    # 每个存活单位按速度顺序依次行动
+                    self._round = self._current_turn_order()
+                    self._round_pos = 0
                 
-                # 获取对手
-                opponents = self.get_opponents(unit)
-                if not opponents:
-                    break
-                
-                # 执行行动
-                self._unit_act(unit, opponents)
-                unit.process_turn_end(silent=self.silent)
+                round_order = self._round
+                while self._round_pos < len(round_order):
+                    unit = round_order[self._round_pos]
+                    if self._awaiting:
+                        # 从决策点继续：回合开始和 ON_ACTION 都已经处理过
+                        opponents = self._alive[1 - unit.team_id]
+                    else:
+                        if unit.current_hp <= 0:
+                            self._round_pos += 1
+                            continue
+                            
+                        if not self.silent and battle_log.level <= INFO:
+                            battle_log.emit(UnitTurnEvent(unit.name))
+                        unit.process_turn_start(silent=self.silent)
+                        
+                        # 获取对手（内部直接使用存活列表，避免复制）
+                        opponents = self._alive[1 - unit.team_id]
+                        if not opponents:
+                            break
+                        
+                        # 执行行动
+                        if unit.team_id == controlled_team and not unit.is_stunned:
+                            unit.process_action(silent=self.silent)
+                            self._awaiting = True
+                        else:
+                            self._unit_act(unit, opponents)
+                    if self._awaiting:
+                        skill, target = (yield unit) or (None, None)
+                        self._awaiting = False
+                        self._perform_action(unit, opponents, skill, target)
+                    unit.process_turn_end(silent=self.silent)
+                    self._round_pos += 1
+                    
+                    # 检查是否有队伍被全灭
+                    if not team1_alive or not team2_alive:
+                        break
                 
-                # 检查是否有队伍被全灭
-                if not self.get_alive_units(self.team1) or not self.get_alive_units(self.team2):
-                    break
-            
-            turn += 1
-
-        # 战斗结束，宣布胜利者
-        team1_alive = self.get_alive_units(self.team1)
-        team2_alive = self.get_alive_units(self.team2)
+                self._round = None
+                self.turn += 1
+        finally:
+            # 战斗结束（或被中途关闭），解除单位与本场战斗的关联
+            for unit in self._units:
+                unit.set_observer(None)
         
         # 返回结果而不是直接打印
         result = {
             'winner': None,
             'survivors': [],
-            'turns': turn - 1,
+            'turns': self.turn - 1,
             'team1_final': [(u.name, u.current_hp, u.hp) for u in self.team1],
             'team2_final': [(u.name, u.current_hp, u.hp) for u in self.team2]
         }
@@ -89,33 +198,33 @@ class MultiBattle:
         else:
             result['winner'] = 'draw'
         
-        if not self.silent:
-            print("\n====== 战斗结束 ======")
-            if result['winner'] == 'team1':
-                print(f"🏆 队伍1胜利！")
-                print(f"存活成员: {', '.join(result['survivors'])}")
-            elif result['winner'] == 'team2':
-                print(f"🏆 队伍2胜利！")
-                print(f"存活成员: {', '.join(result['survivors'])}")
-            else:
-                print("平局！")
-            
-            print("\n最终状态：")
-            print("队伍1:")
-            for unit in self.team1:
-                print(f"  {unit}")
-            print("队伍2:")
-            for unit in self.team2:
-                print(f"  {unit}")
+        if not self.silent and battle_log.level <= INFO:
+            battle_log.emit(BattleEndEvent(result['winner'], result['survivors'],
+                                           [repr(u) for u in self.team1], [repr(u) for u in self.team2]))
         
         return result
 
+    def _perform_action(self, unit: Unit, opponents: List[Unit], skill: Optional[Skill], target: Optional[Unit]):
+        """执行外部指定的行动：技能未就绪时改为普通攻击，目标已阵亡时随机选择目标。"""
+        if target is not None and target not in opponents:
+            target = None
+        if skill is not None and skill.is_ready():
+            self._use_skill(unit, skill, opponents, primary_target=target)
+            return
+        if not self.silent and battle_log.level <= INFO:
+            battle_log.emit(NormalAttackEvent(unit.name))
+        if target is None:
+            target = self.rng.choice(opponents)
+        is_crit = self.rng.random() < unit.crit_rate
+        target.take_damage(unit.attack, is_crit=is_crit, silent=self.silent, source=unit)
+
     def _unit_act(self, unit: Unit, opponents: List[Unit]):
         """单位行动逻辑"""
         if unit.is_stunned:
-            if not self.silent:
-                print(f"[{unit.name}] 处于眩晕状态，无法行动！")
+            if not self.silent and battle_log.level <= INFO:
+                battle_log.emit(StunnedEvent(unit.name))
             return
+        unit.process_action(silent=self.silent)
             
         # 尝试使用技能
         for skill in unit.skills.values():
@@ -124,21 +233,21 @@ class MultiBattle:
                 return
         
         # 没有可用技能，执行普通攻击
-        if not self.silent:
-            print(f"[{unit.name}] 没有可用的技能，执行普通攻击。")
-        target = random.choice(opponents)
-        is_crit = random.random() < unit.crit_rate
-        target.take_damage(unit.attack, is_crit=is_crit, silent=self.silent)
-
-    def _use_skill(self, user: Unit, skill, opponents: List[Unit]):
-        """使用技能"""
+        if not self.silent and battle_log.level <= INFO:
+            battle_log.emit(NormalAttackEvent(unit.name))
+        target = self.rng.choice(opponents)
+        is_crit = self.rng.random() < unit.crit_rate
+        target.take_damage(unit.attack, is_crit=is_crit, silent=self.silent, source=unit)
+
+    def _use_skill(self, user: Unit, skill, opponents: List[Unit], primary_target: Optional[Unit] = None):
+        """使用技能；primary_target 为指定的首要目标，其余目标仍随机选择"""
         if not skill.is_ready():
-            if not self.silent:
-                print(f"[{user.name}] 尝试使用 [{skill.name}]，但技能尚未冷却！")
+            if not self.silent and battle_log.level <= INFO:
+                battle_log.emit(SkillNotReadyEvent(user.name, skill.name))
             return False
 
-        if not self.silent:
-            print(f"[{user.name}] 使用了技能：『{skill.name}』!")
+        if not self.silent and battle_log.level <= INFO:
+            battle_log.emit(SkillCastEvent(user.name, skill.name))
         
         # 选择目标
         if skill.target_type == 'self':
@@ -146,15 +255,19 @@ class MultiBattle:
         else:  # enemy
             # 随机选择指定数量的对手
             target_count = min(skill.target_count, len(opponents))
-            targets = random.sample(opponents, target_count)
+            if primary_target is None:
+                targets = self.rng.sample(opponents, target_count)
+            else:
+                others = [unit for unit in opponents if unit is not primary_target]
+                targets = [primary_target] + self.rng.sample(others, target_count - 1)
         
         # 1. 计算并施加伤害
         if skill.damage_multiplier > 0:
             damage = int(user.attack * skill.damage_multiplier)
-            is_crit = random.random() < user.crit_rate
+            is_crit = self.rng.random() < user.crit_rate
             
             for target in targets:
-                target.take_damage(damage, is_crit=is_crit, silent=self.silent)
+                target.take_damage(damage, is_crit=is_crit, silent=self.silent, source=user)
 
         # 2. 施加效果
         for effect_data in skill.effects_to_apply:
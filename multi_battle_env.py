@@ -0,0 +1,298 @@
+# multi_battle_env.py
+"""
+回合级的强化学习环境：智能体控制 MultiBattle 中一方队伍的每次出手。
+
+- 每一步对应一个决策点：受控队伍的某个单位轮到行动（存活且未被眩晕）。
+  动作是 (技能槽位, 目标槽位)：技能槽位 0..max_skills-1 为该单位按顺序的技能，
+  max_skills 表示普通攻击；目标槽位是敌方队伍中的位置，作为首要目标
+  （多目标技能的其余目标仍随机选择，自我目标技能忽略目标）。
+- 无效动作不会报错：技能未就绪或不存在时改为普通攻击，目标已阵亡时随机选择，
+  并在 info['invalid_action'] 中标记。有效动作的掩码见 action_masks()。
+- 对手队伍使用 MultiBattle 的默认策略。每局战斗的随机数流为
+  BattleRNG.for_battle(seed, 局序号)，随机阵容也由它选择。
+- 观测是预分配的 float32 数组，按单位槽位（己方在前）排列，最后是当前行动单位的独热编码；
+  每步只重写生命值、冷却、眩晕等逐步变化的列，属性和效果列只在收到单位的
+  属性/效果变化通知后才重新编码。
+"""
+from __future__ import annotations
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+
+from battle_rng import BattleRNG
+from headless_simulation import create_team, select_teams
+from hero import Unit
+from multi_battle import MultiBattle
+
+if TYPE_CHECKING:
+    from factory_unit import UnitFactory
+
+# 每个单位槽位的特征列
+PRESENT, ALIVE, HP, ATTACK, ARMOR, SPEED, CRIT_RATE, STUNNED = range(8)
+NUM_BASE_FEATURES = 8
+# 参与归一化的属性列及属性名
+_STAT_COLUMNS = ((ATTACK, 'attack'), (ARMOR, 'armor'), (SPEED, 'speed'))
+_ENCODED_STATS = tuple(name for _, name in _STAT_COLUMNS) + ('crit_rate',)
+
+
+class _ObservedBattle(MultiBattle):
+    """把单位的属性/效果变化转告观测编码器的 MultiBattle。"""
+
+    def __init__(self, team1: List[Unit], team2: List[Unit], encoder: _ObservationEncoder,
+                 rng: Optional[BattleRNG] = None):
+        self._encoder = encoder
+        super().__init__(team1, team2, silent=True, rng=rng)
+
+    def on_unit_attribute_changed(self, unit: Unit, name: Optional[str]):
+        super().on_unit_attribute_changed(unit, name)
+        self._encoder.mark_dirty(unit)
+
+    def on_unit_effects_changed(self, unit: Unit):
+        self._encoder.mark_dirty(unit)
+
+
+class _ObservationEncoder:
+    """
+    预分配的观测缓冲区。每局开始时 bind 一次，之后 encode 只更新变化的部分。
+    每个单位槽位：8 个基础特征 + max_skills 个冷却比例 + 每种效果的层数。
+    """
+
+    def __init__(self, team_size: int, max_skills: int, effect_names: Sequence[str], stat_scales: Dict[str, float]):
+        self.team_size = team_size
+        self.max_skills = max_skills
+        self.effect_index = {name: i for i, name in enumerate(effect_names)}
+        self.num_features = NUM_BASE_FEATURES + max_skills + len(effect_names)
+        self.size = 2 * team_size * self.num_features + team_size
+        self._effect_start = NUM_BASE_FEATURES + max_skills
+        self._stat_scales = [(column, name, 1.0 / stat_scales[name] if stat_scales[name] else 0.0)
+                             for column, name in _STAT_COLUMNS]
+
+        self.buffer = np.zeros(self.size, dtype=np.float32)
+        self.rows = self.buffer[:2 * team_size * self.num_features].reshape(2 * team_size, self.num_features)
+        self.acting = self.buffer[2 * team_size * self.num_features:]
+
+        self.units: List[Optional[Unit]] = []
+        self._slot: Dict[Unit, int] = {}
+        self._dirty: set = set()
+
+    def bind(self, own_team: List[Unit], enemy_team: List[Unit]):
+        """开始新的一局：记录单位槽位并完整编码一次。"""
+        padding = [None] * self.team_size
+        self.units = (list(own_team) + padding)[:self.team_size] + (list(enemy_team) + padding)[:self.team_size]
+        self._slot = {unit: slot for slot, unit in enumerate(self.units) if unit is not None}
+        present = [slot for slot, unit in enumerate(self.units) if unit is not None]
+        self._present = np.array(present, dtype=np.int64)
+        self._inv_max_hp = np.array([1.0 / max(1, self.units[slot].max_hp) for slot in present], dtype=np.float32)
+
+        # 冷却列：(扁平下标, 技能, 1 / (冷却上限 + 1))；缺失的技能槽位保持 1（不可用）
+        self.buffer[:] = 0
+        cooldown_index, self._skills, cooldown_scale = [], [], []
+        for slot in present:
+            skills = list(self.units[slot].skills.values())[:self.max_skills]
+            self.rows[slot, NUM_BASE_FEATURES:self._effect_start] = 1.0
+            for i, skill in enumerate(skills):
+                cooldown_index.append(slot * self.num_features + NUM_BASE_FEATURES + i)
+                self._skills.append(skill)
+                cooldown_scale.append(1.0 / (skill.cooldown_max + 1))
+        self._cooldown_index = np.array(cooldown_index, dtype=np.int64)
+        self._cooldown_scale = np.array(cooldown_scale, dtype=np.float32)
+        self.rows[self._present, PRESENT] = 1.0
+        self._dirty = set(self._slot)
+
+    def mark_dirty(self, unit: Unit):
+        self._dirty.add(unit)
+
+    def _encode_unit(self, slot: int, unit: Unit):
+        row = self.rows[slot]
+        for column, name, scale in self._stat_scales:
+            row[column] = getattr(unit, name) * scale
+        row[CRIT_RATE] = unit.crit_rate
+        effects = row[self._effect_start:]
+        effects[:] = 0
+        for effect in unit.effects:
+            index = self.effect_index.get(effect.name)
+            if index is not None:
+                effects[index] += 1
+
+    def encode(self, acting: Optional[Unit]) -> np.ndarray:
+        # 受不纯被动影响的属性没有变化通知，这些单位每一步都重新编码
+        for unit in self._slot:
+            if unit._passive_index and any(unit.is_attribute_volatile(name) for name in _ENCODED_STATS):
+                self._dirty.add(unit)
+        if self._dirty:
+            for unit in self._dirty:
+                slot = self._slot.get(unit)
+                if slot is not None:
+                    self._encode_unit(slot, unit)
+            self._dirty.clear()
+
+        units = self.units
+        present = self._present
+        hp = np.array([units[slot]._current_hp for slot in present], dtype=np.float32)
+        self.rows[present, HP] = np.maximum(hp, 0) * self._inv_max_hp
+        self.rows[present, ALIVE] = hp > 0
+        self.rows[present, STUNNED] = [units[slot].is_stunned for slot in present]
+        if self._skills:
+            self.buffer[self._cooldown_index] = (np.array([skill.current_cooldown for skill in self._skills],
+                                                          dtype=np.float32) * self._cooldown_scale)
+        self.acting[:] = 0
+        slot = self._slot.get(acting) if acting is not None else None
+        if slot is not None and slot < self.team_size:
+            self.acting[slot] = 1.0
+        return self.buffer.copy()
+
+
+class MultiBattleEnv(gym.Env):
+    """
+    Args:
+        unit_factory: 英雄工厂。
+        team_size: 每队人数。
+        team1_names / team2_names: 固定阵容；省略时每局从全部英雄中随机选择。
+        agent_team: 智能体控制的队伍（MultiBattle.TEAM1 或 TEAM2）。
+        seed: 主种子，也可以通过 reset(seed=...) 设置。
+        max_steps: 每局最多决策步数，超过后截断。
+    """
+    metadata = {"render_modes": []}
+
+    def __init__(self, unit_factory: UnitFactory, team_size: int = 4,
+                 team1_names: Optional[Sequence[str]] = None, team2_names: Optional[Sequence[str]] = None,
+                 agent_team: int = MultiBattle.TEAM1, seed: int = 0, max_steps: int = 1000):
+        super().__init__()
+        self.unit_factory = unit_factory
+        self.team_size = team_size
+        self.fixed_teams = (list(team1_names), list(team2_names)) if team1_names and team2_names else None
+        self.agent_team = agent_team
+        self.master_seed = seed
+        self.max_steps = max_steps
+        self.hero_names = list(unit_factory._templates)
+
+        blueprints = [unit_factory.get_blueprint(name) for name in self.hero_names]
+        blueprints = [blueprint for blueprint in blueprints if blueprint is not None]
+        self.max_skills = max((len(blueprint.skills) for blueprint in blueprints), default=0)
+        stat_scales = {name: max((blueprint.base_value(name) for blueprint in blueprints), default=1.0)
+                       for _, name in _STAT_COLUMNS}
+        effect_names = list(unit_factory.skill_factory.effect_factory._templates)
+        self.encoder = _ObservationEncoder(team_size, self.max_skills, effect_names, stat_scales)
+
+        self.observation_space = spaces.Box(low=0.0, high=np.inf, shape=(self.encoder.size,), dtype=np.float32)
+        self.action_space = spaces.MultiDiscrete([self.max_skills + 1, team_size])
+
+        self._episode = 0
+        self._battle: Optional[_ObservedBattle] = None
+        self._game: Optional[Generator] = None
+        self._acting: Optional[Unit] = None
+        self._teams: Tuple[List[Unit], List[Unit]] = ([], [])
+        self._steps = 0
+        self._skill_mask = np.zeros(self.max_skills + 1, dtype=np.bool_)
+        self._target_mask = np.zeros(team_size, dtype=np.bool_)
+
+    # --- 对局管理 ---
+
+    def _start_battle(self):
+        rng = BattleRNG.for_battle(self.master_seed, self._episode)
+        self._episode += 1
+        if self.fixed_teams is not None:
+            team1_names, team2_names = self.fixed_teams
+        else:
+            team1_names, team2_names = select_teams(self.hero_names, self.team_size, rng)
+        teams = (create_team(self.unit_factory, team1_names), create_team(self.unit_factory, team2_names))
+        self._teams = teams
+        own, enemy = teams[self.agent_team], teams[1 - self.agent_team]
+        self.encoder.bind(own, enemy)
+        self._battle = _ObservedBattle(teams[0], teams[1], self.encoder, rng=rng)
+        self._game = self._battle.play(controlled_team=self.agent_team)
+        self._steps = 0
+
+    def _advance(self, action: Any = None) -> Optional[Dict[str, Any]]:
+        """推进到下一个决策点；战斗结束时返回结果，否则返回 None。"""
+        try:
+            self._acting = self._game.send(action) if action is not None else next(self._game)
+            return None
+        except StopIteration as stop:
+            self._acting = None
+            self._game = None
+            return stop.value
+
+    def _reward(self, result: Dict[str, Any]) -> float:
+        agent_key = 'team1' if self.agent_team == MultiBattle.TEAM1 else 'team2'
+        if result['winner'] == 'draw':
+            return 0.0
+        return 1.0 if result['winner'] == agent_key else -1.0
+
+    # --- gymnasium 接口 ---
+
+    def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
+        super().reset(seed=seed)
+        if seed is not None:
+            self.master_seed = seed
+            self._episode = 0
+        if self._game is not None:
+            self._game.close()
+        # 受控队伍在第一个决策点之前就分出胜负的对局直接跳过
+        while True:
+            self._start_battle()
+            if self._advance() is None:
+                break
+        return self.encoder.encode(self._acting), {'action_mask': self.action_masks()}
+
+    def decode_action(self, action: Any) -> Tuple[Optional[Any], Optional[Unit], bool]:
+        """把 (技能槽位, 目标槽位) 解码为 (技能或 None, 目标或 None, 是否有效)。"""
+        skill_slot, target_slot = int(action[0]), int(action[1])
+        valid = True
+        skill = None
+        if skill_slot < self.max_skills:
+            skills = list(self._acting.skills.values())
+            if skill_slot < len(skills) and skills[skill_slot].is_ready():
+                skill = skills[skill_slot]
+            else:
+                valid = False
+        enemy_team = self._teams[1 - self.agent_team]
+        target = enemy_team[target_slot] if target_slot < len(enemy_team) else None
+        if target is None or target.current_hp <= 0:
+            target = None
+            valid = False
+        return skill, target, valid
+
+    def step(self, action):
+        if self._game is None:
+            raise RuntimeError("对局已结束，请先调用 reset()")
+        skill, target, valid = self.decode_action(action)
+        result = self._advance((skill, target))
+        self._steps += 1
+
+        info: Dict[str, Any] = {'invalid_action': not valid}
+        reward, terminated, truncated = 0.0, False, False
+        if result is not None:
+            reward = self._reward(result)
+            terminated = True
+            info['result'] = result
+        elif self._steps >= self.max_steps:
+            truncated = True
+            self._game.close()
+            self._game = None
+            self._acting = None
+        observation = self.encoder.encode(self._acting)
+        info['action_mask'] = self.action_masks()
+        return observation, reward, terminated, truncated, info
+
+    def action_masks(self) -> np.ndarray:
+        """
+        有效动作掩码：前 max_skills + 1 项对应技能槽位（最后一项普通攻击总是有效），
+        后 team_size 项对应存活的敌方目标。没有决策中的单位时全部为 False。
+        """
+        self._skill_mask[:] = False
+        self._target_mask[:] = False
+        if self._acting is not None:
+            for i, skill in enumerate(list(self._acting.skills.values())[:self.max_skills]):
+                self._skill_mask[i] = skill.is_ready()
+            self._skill_mask[self.max_skills] = True
+            for i, unit in enumerate(self._teams[1 - self.agent_team][:self.team_size]):
+                self._target_mask[i] = unit.current_hp > 0
+        return np.concatenate((self._skill_mask, self._target_mask))
+
+    def close(self):
+        if self._game is not None:
+            self._game.close()
+            self._game = None
@@ -0,0 +1,243 @@
+# result_sink.py
+"""
+批量模拟的逐场战斗记录输出。
+
+run_batch_simulation 把每场战斗的记录交给一个 sink，而不是全部留在内存里：
+  - MemorySink:   保存在列表中（默认行为，适合小规模模拟）
+  - NullSink:     直接丢弃，只保留汇总统计
+  - JsonLinesSink: 每行一个 JSON 对象
+  - ColumnarSink: 紧凑的分块列式二进制格式
+
+两种文件格式都可以用 iter_records 惰性地逐条读取。
+"""
+from __future__ import annotations
+import json
+import struct
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from matchup_stats import WINNER_CODES
+
+BattleRecord = Dict[str, Any]
+
+# 列式格式：文件头 = MAGIC + 版本号；之后是若干数据块
+COLUMNAR_MAGIC = b'BTLR'
+COLUMNAR_VERSION = 1
+# 数据块头：记录数、队伍1人数、队伍2人数、新增英雄名 JSON 的字节数
+_BLOCK_HEADER = struct.Struct('<IHHI')
+# 胜者编码与 MatchupStats.record_many 的输入共用 matchup_stats.WINNER_CODES
+_WINNER_NAMES = {code: name for name, code in WINNER_CODES.items()}
+
+
+class ResultSink(ABC):
+    """逐场战斗记录的接收者基类。"""
+
+    @abstractmethod
+    def write(self, record: BattleRecord):
+        pass
+
+    def write_many(self, records: Iterable[BattleRecord]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MemorySink(ResultSink):
+    """把记录保存在内存列表中。"""
+
+    def __init__(self, records: Optional[List[BattleRecord]] = None):
+        self.records = records if records is not None else []
+
+    def write(self, record: BattleRecord):
+        self.records.append(record)
+
+    def write_many(self, records: Iterable[BattleRecord]):
+        self.records.extend(records)
+
+
+class NullSink(ResultSink):
+    """丢弃所有记录。"""
+
+    def write(self, record: BattleRecord):
+        pass
+
+    def write_many(self, records: Iterable[BattleRecord]):
+        pass
+
+
+class JsonLinesSink(ResultSink):
+    """以 JSON Lines 格式写入文件，攒够 buffer_size 条后批量写出。"""
+
+    def __init__(self, path: str, buffer_size: int = 4096):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record: BattleRecord):
+        self._buffer.append(json.dumps(record, ensure_ascii=False) + '\n')
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(''.join(self._buffer))
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class ColumnarSink(ResultSink):
+    """
+    紧凑的列式二进制格式。每个数据块存放同样队伍人数的若干条记录，按列保存：
+    英雄编号 (uint16)、胜者 (uint8)、回合数 (uint32)、存活位置位掩码 (uint64)。
+    英雄名到编号的映射随数据块增量写入，因此可以流式写出和读取。
+    """
+
+    def __init__(self, path: str, buffer_size: int = 8192):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer: List[BattleRecord] = []
+        self._hero_ids: Dict[str, int] = {}
+        self._pending_names: List[str] = []
+        self._file = open(path, 'wb')
+        self._file.write(COLUMNAR_MAGIC + struct.pack('<H', COLUMNAR_VERSION))
+
+    def write(self, record: BattleRecord):
+        if self._buffer:
+            first = self._buffer[0]
+            if len(record['team1']) != len(first['team1']) or len(record['team2']) != len(first['team2']):
+                self._write_block()
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size:
+            self._write_block()
+
+    def _hero_id(self, name: str) -> int:
+        hero_id = self._hero_ids.get(name)
+        if hero_id is None:
+            hero_id = self._hero_ids[name] = len(self._hero_ids)
+            self._pending_names.append(name)
+        return hero_id
+
+    def _write_block(self):
+        records = self._buffer
+        if not records:
+            return
+        team1_size, team2_size = len(records[0]['team1']), len(records[0]['team2'])
+        if team1_size + team2_size > 64:
+            raise ValueError("列式格式最多支持双方合计 64 个单位")
+
+        count = len(records)
+        team1 = np.empty((count, team1_size), dtype='<u2')
+        team2 = np.empty((count, team2_size), dtype='<u2')
+        winners = np.empty(count, dtype='u1')
+        turns = np.empty(count, dtype='<u4')
+        survivors = np.zeros(count, dtype='<u8')
+        for i, record in enumerate(records):
+            team1[i] = [self._hero_id(name) for name in record['team1']]
+            team2[i] = [self._hero_id(name) for name in record['team2']]
+            winners[i] = WINNER_CODES[record['winner']]
+            turns[i] = record['turns']
+            survivors[i] = _survivor_mask(record)
+
+        names = json.dumps(self._pending_names, ensure_ascii=False).encode('utf-8') if self._pending_names else b''
+        self._pending_names = []
+        self._file.write(_BLOCK_HEADER.pack(count, team1_size, team2_size, len(names)))
+        self._file.write(names)
+        for column in (team1, team2, winners, turns, survivors):
+            self._file.write(column.tobytes())
+        self._buffer = []
+
+    def flush(self):
+        self._write_block()
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def _survivor_mask(record: BattleRecord) -> int:
+    """把存活者名单编码为 (队伍1 + 队伍2) 位置上的位掩码。"""
+    survivors = record['survivors']
+    if not survivors:
+        return 0
+    offset, team = (0, record['team1']) if record['winner'] == 'team1' else (len(record['team1']), record['team2'])
+    mask, j = 0, 0
+    # 存活者名单按队伍顺序排列，顺序匹配即可处理重名
+    for position, name in enumerate(team):
+        if j < len(survivors) and survivors[j] == name:
+            mask |= 1 << (offset + position)
+            j += 1
+    return mask
+
+
+def open_sink(path: str, **kwargs) -> ResultSink:
+    """按扩展名选择文件格式：.jsonl 使用 JSON Lines，其余使用列式二进制格式。"""
+    if path.endswith('.jsonl'):
+        return JsonLinesSink(path, **kwargs)
+    return ColumnarSink(path, **kwargs)
+
+
+def iter_records(path: str) -> Iterator[BattleRecord]:
+    """惰性地逐条读取 sink 写出的记录文件，自动识别格式。"""
+    with open(path, 'rb') as f:
+        is_columnar = f.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+    if is_columnar:
+        yield from _iter_columnar(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _iter_columnar(path: str) -> Iterator[BattleRecord]:
+    names: List[str] = []
+    with open(path, 'rb') as f:
+        f.read(len(COLUMNAR_MAGIC))
+        (version,) = struct.unpack('<H', f.read(2))
+        if version != COLUMNAR_VERSION:
+            raise ValueError(f"不支持的列式文件版本: {version}")
+        while True:
+            header = f.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                return
+            count, team1_size, team2_size, names_size = _BLOCK_HEADER.unpack(header)
+            if names_size:
+                names.extend(json.loads(f.read(names_size).decode('utf-8')))
+            team1 = np.frombuffer(f.read(count * team1_size * 2), dtype='<u2').reshape(count, team1_size)
+            team2 = np.frombuffer(f.read(count * team2_size * 2), dtype='<u2').reshape(count, team2_size)
+            winners = np.frombuffer(f.read(count), dtype='u1')
+            turns = np.frombuffer(f.read(count * 4), dtype='<u4')
+            survivors = np.frombuffer(f.read(count * 8), dtype='<u8')
+            for i in range(count):
+                team1_names = [names[hero_id] for hero_id in team1[i].tolist()]
+                team2_names = [names[hero_id] for hero_id in team2[i].tolist()]
+                mask = int(survivors[i])
+                positions = team1_names + team2_names
+                yield {
+                    'team1': team1_names,
+                    'team2': team2_names,
+                    'winner': _WINNER_NAMES[int(winners[i])],
+                    'turns': int(turns[i]),
+                    'survivors': [name for position, name in enumerate(positions) if mask >> position & 1]
+                }
@@ -0,0 +1,141 @@
+# sequential_stopping.py
+"""
+自适应（序贯）评估：按批运行战斗，每批结束后检查是否已经可以停止。
+
+停止条件（满足任一即停）：
+  - 胜率的 Wilson 置信区间宽度不超过 target_width；
+  - 给定阈值 threshold 时，Wald 序贯概率比检验（SPRT）判定胜率高于或低于阈值。
+    检验的两个假设为 p = threshold - indifference 与 p = threshold + indifference，
+    两类错误率分别为 alpha、beta；真实胜率落在无差别区间内时检验可能一直无法判定，
+    由调用方给定的最大场数兜底。
+平局不计为胜利。批的边界只由 batch_size 决定，所以停止点与进程数无关。
+
+注意：每批都查看一次置信区间会让它的实际覆盖率略低于名义置信度，
+区间用于描述精度；需要严格控制错误率的判定请使用 threshold（SPRT）。
+"""
+from __future__ import annotations
+import math
+from statistics import NormalDist
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 停止原因
+STOP_CI_WIDTH = 'ci_width'
+STOP_SPRT = 'sprt'
+STOP_MAX_BATTLES = 'max_battles'
+
+# SPRT 判定结果
+ABOVE = 'above'
+BELOW = 'below'
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """二项比例的 Wilson 置信区间；trials 为 0 时返回 (0, 1)。"""
+    if trials <= 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class SequentialStopRule:
+    """
+    Args:
+        target_width: 置信区间宽度达到该值即停止；None 表示不使用该条件。
+        threshold: SPRT 检验的胜率阈值；None 表示不做检验。
+        indifference: SPRT 的无差别区间半宽。
+        confidence: 报告的置信区间的置信度。
+        alpha / beta: SPRT 误判“高于阈值” / “低于阈值”的概率上限。
+        batch_size: 每批战斗场数。
+        min_battles: 至少运行的场数，之前不检查停止条件。
+    """
+
+    def __init__(self, target_width: Optional[float] = None, threshold: Optional[float] = None,
+                 indifference: float = 0.05, confidence: float = 0.95, alpha: float = 0.05, beta: float = 0.05,
+                 batch_size: int = 50, min_battles: int = 0):
+        if target_width is None and threshold is None:
+            raise ValueError("target_width 和 threshold 至少需要指定一个")
+        if batch_size < 1:
+            raise ValueError("batch_size 必须为正数")
+        self.target_width = target_width
+        self.threshold = threshold
+        self.indifference = indifference
+        self.confidence = confidence
+        self.alpha = alpha
+        self.beta = beta
+        self.batch_size = batch_size
+        self.min_battles = min_battles
+
+        if threshold is not None:
+            p0 = min(max(threshold - indifference, 1e-9), 1 - 1e-9)
+            p1 = min(max(threshold + indifference, 1e-9), 1 - 1e-9)
+            if p1 <= p0:
+                raise ValueError("indifference 必须为正数")
+            self._win_llr = math.log(p1 / p0)
+            self._other_llr = math.log((1 - p1) / (1 - p0))
+            self._upper = math.log((1 - beta) / alpha)
+            self._lower = math.log(beta / (1 - alpha))
+
+    def batches(self, max_battles: int, align: int = 1) -> Iterator[Tuple[int, int]]:
+        """
+        依次给出每批战斗的序号范围 [start, stop)，最多到 max_battles。
+        align > 1 时批大小向上取整到 align 的整数倍。
+        """
+        batch_size = -(-self.batch_size // align) * align
+        for start in range(0, max_battles, batch_size):
+            yield start, min(start + batch_size, max_battles)
+
+    def decision(self, wins: int, battles: int) -> Optional[str]:
+        """SPRT 判定：ABOVE / BELOW，尚不能判定或未设置阈值时返回 None。"""
+        if self.threshold is None or battles <= 0:
+            return None
+        llr = wins * self._win_llr + (battles - wins) * self._other_llr
+        if llr >= self._upper:
+            return ABOVE
+        if llr <= self._lower:
+            return BELOW
+        return None
+
+    def check(self, wins: int, battles: int) -> Optional[str]:
+        """返回停止原因（STOP_CI_WIDTH / STOP_SPRT），尚不能停止时返回 None。"""
+        if battles < max(1, self.min_battles):
+            return None
+        if self.decision(wins, battles) is not None:
+            return STOP_SPRT
+        if self.target_width is not None:
+            low, high = wilson_interval(wins, battles, self.confidence)
+            if high - low <= self.target_width:
+                return STOP_CI_WIDTH
+        return None
+
+    def summarize(self, wins: int, battles: int, stopped_by: Optional[str]) -> Dict[str, Any]:
+        """
+        汇总自适应评估的结果：
+        {'battles', 'wins', 'win_rate', 'ci_low', 'ci_high', 'ci_width', 'confidence', 'decision', 'stopped_by'}
+        """
+        low, high = wilson_interval(wins, battles, self.confidence)
+        return {
+            'battles': battles,
+            'wins': wins,
+            'win_rate': wins / battles if battles else 0.0,
+            'ci_low': low,
+            'ci_high': high,
+            'ci_width': high - low,
+            'confidence': self.confidence,
+            'decision': self.decision(wins, battles),
+            'stopped_by': stopped_by or STOP_MAX_BATTLES,
+        }
+
+
+def format_summary(summary: Dict[str, Any], label: str = '胜率') -> str:
+    """把 summarize 的结果格式化为一行说明。"""
+    text = (f"{label}: {summary['win_rate'] * 100:.1f}% "
+            f"({summary['confidence'] * 100:.0f}% 置信区间 {summary['ci_low'] * 100:.1f}% ~ "
+            f"{summary['ci_high'] * 100:.1f}%)，实际运行 {summary['battles']} 场")
+    reasons = {STOP_CI_WIDTH: '区间宽度达标', STOP_SPRT: '序贯检验已判定', STOP_MAX_BATTLES: '达到最大场数'}
+    text += f"，停止原因: {reasons[summary['stopped_by']]}"
+    if summary['decision'] is not None:
+        text += f"，判定{'高于' if summary['decision'] == ABOVE else '低于'}阈值"
+    return text
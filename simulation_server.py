@@ -0,0 +1,537 @@
+# simulation_server.py
+"""
+本地常驻模拟服务：工具（调参笔记本、设计器界面等）不必各自启动 Python、加载 YAML。
+
+服务在本地 Unix 套接字或 localhost TCP 端口上收发 JSON Lines（每行一个 UTF-8 JSON 对象），
+常驻已加载的工厂和工作进程池（每个工作进程只加载一次工厂）。
+
+请求（id 由客户端指定，用于对应响应）：
+    {"id": 1, "type": "matchup", "team1": [...], "team2": [...], "num_battles": 100, "seed": 7}
+    {"id": 2, "type": "batch", "num_battles": 1000, "team_size": 4, "seed": 7}
+    {"id": 3, "type": "cancel", "target": 1}
+    {"id": 4, "type": "ping"}
+响应事件：
+    {"id": 1, "event": "accepted", "num_battles": 100, "seed": 7}
+    {"id": 1, "event": "progress", "done": 40, "total": 100}
+    {"id": 1, "event": "result", "result": {...}}
+    {"id": 1, "event": "cancelled"} / {"id": 1, "event": "error", "message": "..."}
+
+战斗序号 i 的随机数流为 BattleRNG.for_battle(seed, i)，结果与 run_specific_matchup /
+run_batch_simulation 使用同一种子时相同。请求按 chunk_size 对齐切成工作单元：
+  - 同时在排队的相同单元（同一阵容、种子和序号范围）只计算一次，结果分发给所有请求；
+  - 调度时把多个小单元打包成一个进程池任务，减少跨进程往返；
+  - 取消请求（或客户端断开）后，只属于它的排队单元不再提交，已在运行的单元结果被丢弃。
+给定 watch_interval 时监视模板文件，热重载后重建进程池，之后提交的单元使用新模板。
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import socket
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple, TYPE_CHECKING
+
+import headless_simulation
+from battle_log import battle_log
+from battle_rng import BattleRNG
+from headless_simulation import create_team, load_factories, run_battle_chunk, run_prepared_battle
+from matchup_stats import MatchupStats
+from template_reload import TemplateWatcher
+
+if TYPE_CHECKING:
+    from factory_unit import UnitFactory
+
+# 单个请求的最大战斗场数
+MAX_BATTLES = 1_000_000
+
+# 工作单元：(种类, 参数, 起始序号, 结束序号)
+WorkItem = Tuple[str, tuple, int, int]
+
+
+def _count_outcome(counts: Dict[str, int], result: Optional[dict]):
+    if not result:
+        return
+    if result['winner'] == 'team1':
+        counts['team1_wins'] += 1
+    elif result['winner'] == 'team2':
+        counts['team2_wins'] += 1
+    else:
+        counts['draws'] += 1
+    counts['total_turns'] += result['turns']
+
+
+def run_work_items(unit_factory: UnitFactory, heroes: Sequence[str], items: Sequence[WorkItem]) -> List[Dict[str, Any]]:
+    """运行一组工作单元，返回每个单元的计数（batch 单元另有英雄统计 'matchups'）。"""
+    results = []
+    for kind, params, start, stop in items:
+        if kind == 'matchup':
+            team1_names, team2_names, seed = params
+            counts = {'team1_wins': 0, 'team2_wins': 0, 'draws': 0, 'total_turns': 0}
+            # 阵容固定，只创建一次，之后每场战斗前原地重置
+            team1_units = create_team(unit_factory, team1_names)
+            team2_units = create_team(unit_factory, team2_names)
+            for i in range(start, stop):
+                _count_outcome(counts, run_prepared_battle(team1_units, team2_units, silent=True,
+                                                           rng=BattleRNG.for_battle(seed, i)))
+        else:
+            team_size, seed = params
+            partial_results = run_battle_chunk(unit_factory, heroes, team_size, seed, start, stop)
+            counts = {key: partial_results[key] for key in ('team1_wins', 'team2_wins', 'draws', 'total_turns')}
+            counts['matchups'] = partial_results['matchups'].to_dict()
+        results.append(counts)
+    return results
+
+
+def _run_items_in_worker(items: Sequence[WorkItem]) -> List[Dict[str, Any]]:
+    return run_work_items(headless_simulation._worker_unit_factory, headless_simulation._worker_heroes, items)
+
+
+class _Connection:
+    """一个客户端连接；写入失败（客户端已断开）时静默丢弃。"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.requests: Dict[Any, _Request] = {}
+        self.closed = False
+
+    async def send(self, message: Dict[str, Any]):
+        if self.closed:
+            return
+        try:
+            self.writer.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+            await self.writer.drain()
+        except (ConnectionError, RuntimeError):
+            self.closed = True
+
+
+class _Request:
+    def __init__(self, connection: _Connection, request_id: Any, kind: str, num_battles: int, seed: int):
+        self.connection = connection
+        self.id = request_id
+        self.kind = kind
+        self.total = num_battles
+        self.seed = seed
+        self.done = 0
+        self.pending_units = 0
+        self.cancelled = False
+        self.counts = {'team1_wins': 0, 'team2_wins': 0, 'draws': 0, 'total_turns': 0}
+        self.matchups: Optional[MatchupStats] = MatchupStats() if kind == 'batch' else None
+
+    def add(self, battles: int, counts: Dict[str, Any]):
+        for key in self.counts:
+            self.counts[key] += counts[key]
+        if self.matchups is not None:
+            self.matchups.merge(MatchupStats.from_dict(counts['matchups']))
+        self.done += battles
+        self.pending_units -= 1
+
+    def result(self) -> Dict[str, Any]:
+        result = dict(self.counts, num_battles=self.total, seed=self.seed)
+        if self.matchups is not None:
+            result['top_heroes'] = [{'hero': name, 'win_rate': rate, 'games': games, 'wins': wins}
+                                    for name, rate, games, wins in self.matchups.top_heroes()]
+        return result
+
+
+class _WorkUnit:
+    __slots__ = ('key', 'item', 'subscribers')
+
+    def __init__(self, key: tuple, item: WorkItem):
+        self.key = key
+        self.item = item
+        self.subscribers: List[_Request] = []
+
+    @property
+    def battles(self) -> int:
+        return self.item[3] - self.item[2]
+
+    def live(self) -> bool:
+        return any(not request.cancelled for request in self.subscribers)
+
+
+class SimulationServer:
+    """
+    Args:
+        unit_factory: 已加载的英雄工厂，省略时自动加载。
+        workers: 工作进程数；0 表示在本进程的后台线程中运行（便于调试）。
+        chunk_size: 工作单元的战斗场数，也是请求对齐和去重的粒度。
+        battles_per_task: 打包进一个进程池任务的最大战斗场数。
+        coalesce_window: 调度前等待更多请求到达的时间（秒）。
+        watch_interval: 模板文件的轮询间隔（秒），None 表示不监视。
+    """
+
+    def __init__(self, unit_factory: Optional[UnitFactory] = None, workers: int = 2, chunk_size: int = 100,
+                 battles_per_task: int = 1000, coalesce_window: float = 0.005,
+                 watch_interval: Optional[float] = None):
+        self.unit_factory = unit_factory if unit_factory is not None else load_factories()
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.battles_per_task = battles_per_task
+        self.coalesce_window = coalesce_window
+        self.watch_interval = watch_interval
+
+        self._executor: Optional[Executor] = None
+        self._generation = 0
+        self._units: Dict[tuple, _WorkUnit] = {}
+        self._queue: Deque[_WorkUnit] = deque()
+        self._running = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._handlers: Dict[asyncio.Task, _Connection] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # --- 生命周期 ---
+
+    def _new_executor(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1)
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=headless_simulation._init_worker)
+
+    def _task_function(self):
+        if self.workers <= 0:
+            return partial(run_work_items, self.unit_factory, list(self.unit_factory._templates))
+        return _run_items_in_worker
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def start(self, path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0):
+        """开始监听：给出 path 时使用 Unix 套接字，否则监听 host:port（port 为 0 时自动分配）。"""
+        self._executor = self._new_executor()
+        self._wakeup = asyncio.Event()
+        self._spawn(self._dispatch_loop())
+        if self.watch_interval is not None:
+            self._spawn(self._watch_loop(TemplateWatcher(self.unit_factory)))
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port)
+
+    @property
+    def address(self) -> Any:
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        # 断开客户端，让连接处理任务正常结束（较新的 Python 中 wait_closed 会等待所有连接）
+        handlers = list(self._handlers.items())
+        for _, connection in handlers:
+            connection.writer.close()
+        await asyncio.gather(*(handler for handler, _ in handlers), return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- 连接与请求 ---
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = _Connection(writer)
+        handler = asyncio.current_task()
+        self._handlers[handler] = connection
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("请求必须是 JSON 对象")
+                except ValueError as e:
+                    await connection.send({'id': None, 'event': 'error', 'message': f"无法解析请求：{e}"})
+                    continue
+                await self._handle_message(connection, message)
+        except ConnectionError:
+            pass
+        finally:
+            # 客户端断开：取消它的全部请求
+            connection.closed = True
+            for request in connection.requests.values():
+                request.cancelled = True
+            connection.requests.clear()
+            self._drop_cancelled()
+            del self._handlers[handler]
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _handle_message(self, connection: _Connection, message: Dict[str, Any]):
+        request_id = message.get('id')
+        kind = message.get('type')
+        if kind == 'ping':
+            await connection.send({'id': request_id, 'event': 'pong', 'queued': len(self._queue),
+                                   'running': self._running, 'generation': self._generation})
+            return
+        if kind == 'cancel':
+            request = connection.requests.pop(message.get('target'), None)
+            if request is not None:
+                request.cancelled = True
+                self._drop_cancelled()
+                await connection.send({'id': request.id, 'event': 'cancelled'})
+            return
+        if request_id in connection.requests:
+            await connection.send({'id': request_id, 'event': 'error', 'message': "该 id 的请求仍在运行"})
+            return
+        try:
+            params, num_battles, seed = self._parse_request(kind, message)
+        except (ValueError, TypeError) as e:
+            await connection.send({'id': request_id, 'event': 'error', 'message': str(e)})
+            return
+
+        request = _Request(connection, request_id, kind, num_battles, seed)
+        connection.requests[request_id] = request
+        await connection.send({'id': request_id, 'event': 'accepted', 'num_battles': num_battles, 'seed': seed})
+        if num_battles == 0:
+            await self._finish(request)
+            return
+        self._enqueue(request, kind, params)
+
+    def _parse_request(self, kind: Any, message: Dict[str, Any]) -> Tuple[tuple, int, int]:
+        """校验请求，返回 (工作单元参数, 战斗场数, 种子)。"""
+        num_battles = int(message.get('num_battles', 50))
+        if not 0 <= num_battles <= MAX_BATTLES:
+            raise ValueError(f"num_battles 必须在 0 ~ {MAX_BATTLES} 之间")
+        seed = message.get('seed')
+        seed = int(seed) if seed is not None else random.getrandbits(31)
+        heroes = self.unit_factory._templates
+        if kind == 'matchup':
+            teams = []
+            for key in ('team1', 'team2'):
+                team = message.get(key)
+                if not isinstance(team, list) or not team:
+                    raise ValueError(f"{key} 必须是非空的英雄名列表")
+                unknown = [name for name in team if name not in heroes]
+                if unknown:
+                    raise ValueError(f"未知的英雄：{', '.join(map(str, unknown))}")
+                teams.append(tuple(team))
+            return (teams[0], teams[1], seed), num_battles, seed
+        if kind == 'batch':
+            team_size = int(message.get('team_size', 4))
+            if not 1 <= team_size <= len(heroes) // 2:
+                raise ValueError(f"team_size 必须在 1 ~ {len(heroes) // 2} 之间")
+            return (team_size, seed), num_battles, seed
+        raise ValueError(f"未知的请求类型：{kind}")
+
+    def _enqueue(self, request: _Request, kind: str, params: tuple):
+        """把请求切成按 chunk_size 对齐的工作单元；已在排队或运行的相同单元直接共享。"""
+        for start in range(0, request.total, self.chunk_size):
+            stop = min(start + self.chunk_size, request.total)
+            key = (self._generation, kind, params, start, stop)
+            unit = self._units.get(key)
+            if unit is None:
+                unit = self._units[key] = _WorkUnit(key, (kind, params, start, stop))
+                self._queue.append(unit)
+            unit.subscribers.append(request)
+            request.pending_units += 1
+        self._wakeup.set()
+
+    def _drop_cancelled(self):
+        """从队列中移除所有订阅请求都已取消的工作单元；运行中的单元跑完后丢弃结果。"""
+        live = deque()
+        for unit in self._queue:
+            if unit.live():
+                live.append(unit)
+            else:
+                del self._units[unit.key]
+        self._queue = live
+
+    async def _finish(self, request: _Request):
+        request.connection.requests.pop(request.id, None)
+        await request.connection.send({'id': request.id, 'event': 'result', 'result': request.result()})
+
+    # --- 调度 ---
+
+    def _next_task(self) -> List[_WorkUnit]:
+        """从队列头部取出一个任务的工作单元；排队的战斗较少时按进程数均分，保持并行。"""
+        queued = sum(unit.battles for unit in self._queue)
+        limit = max(self.chunk_size, min(self.battles_per_task, queued // max(1, self.workers)))
+        units, battles = [], 0
+        while self._queue and battles < limit:
+            unit = self._queue.popleft()
+            units.append(unit)
+            battles += unit.battles
+        return units
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # 稍等片刻，让同时到达的请求合并成更大的任务
+            await asyncio.sleep(self.coalesce_window)
+            while self._queue and self._running < max(1, self.workers):
+                units = self._next_task()
+                if units:
+                    self._running += 1
+                    self._spawn(self._run_task(units))
+
+    async def _run_task(self, units: List[_WorkUnit]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._task_function(),
+                                                 [unit.item for unit in units])
+        except Exception as e:
+            battle_log.error(f"错误：模拟任务失败：{e}")
+            for unit in units:
+                del self._units[unit.key]
+                for request in unit.subscribers:
+                    if not request.cancelled:
+                        request.cancelled = True
+                        request.connection.requests.pop(request.id, None)
+                        await request.connection.send({'id': request.id, 'event': 'error', 'message': str(e)})
+            return
+        finally:
+            self._running -= 1
+            if self._queue:
+                self._wakeup.set()
+
+        for unit, counts in zip(units, results):
+            del self._units[unit.key]
+            for request in unit.subscribers:
+                if request.cancelled:
+                    continue
+                request.add(unit.battles, counts)
+                if request.pending_units == 0:
+                    await self._finish(request)
+                else:
+                    await request.connection.send({'id': request.id, 'event': 'progress',
+                                                   'done': request.done, 'total': request.total})
+
+    async def _watch_loop(self, watcher: TemplateWatcher):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            report = await asyncio.to_thread(watcher.poll)
+            if report:
+                # 工作进程中的工厂不会自动重载：换一个新的进程池，旧池跑完已提交的任务后退出
+                self._generation += 1
+                old_executor, self._executor = self._executor, self._new_executor()
+                old_executor.shutdown(wait=False)
+
+
+class SimulationClient:
+    """
+    阻塞式客户端，供笔记本和脚本使用。
+        with SimulationClient(path='/tmp/battle_sim.sock') as client:
+            result = client.matchup(["加尔鲁什"], ["伊利丹"], num_battles=200, seed=1)
+    """
+
+    def __init__(self, path: Optional[str] = None, host: str = '127.0.0.1', port: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(path)
+        else:
+            self._socket = socket.create_connection((host, port))
+        self._socket.settimeout(timeout)
+        self._file = self._socket.makefile('rwb')
+        self._next_id = 0
+        # 等待某个请求时读到的其他请求的事件
+        self._backlog: Dict[Any, Deque[Dict[str, Any]]] = {}
+
+    def send(self, message: Dict[str, Any]) -> Any:
+        """发送请求，返回它的 id（省略时自动分配）。"""
+        if message.get('id') is None:
+            self._next_id += 1
+            message = dict(message, id=self._next_id)
+        self._file.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        return message['id']
+
+    def events(self, request_id: Any) -> Iterator[Dict[str, Any]]:
+        """依次产生该请求的事件，直到 result / error / cancelled。"""
+        while True:
+            backlog = self._backlog.get(request_id)
+            if backlog:
+                event = backlog.popleft()
+            else:
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("服务已断开连接")
+                event = json.loads(line)
+                if event.get('id') != request_id:
+                    self._backlog.setdefault(event.get('id'), deque()).append(event)
+                    continue
+            yield event
+            if event['event'] in ('result', 'error', 'cancelled', 'pong'):
+                self._backlog.pop(request_id, None)
+                return
+
+    def request(self, message: Dict[str, Any], on_progress=None) -> Dict[str, Any]:
+        """发送请求并等待结果；on_progress(done, total) 在每次进度更新时调用。"""
+        request_id = self.send(message)
+        for event in self.events(request_id):
+            if event['event'] == 'progress' and on_progress is not None:
+                on_progress(event['done'], event['total'])
+            elif event['event'] == 'result':
+                return event['result']
+            elif event['event'] == 'pong':
+                return event
+            elif event['event'] == 'error':
+                raise RuntimeError(event['message'])
+            elif event['event'] == 'cancelled':
+                raise RuntimeError(f"请求 {request_id} 已取消")
+        raise ConnectionError("服务已断开连接")
+
+    def matchup(self, team1: Sequence[str], team2: Sequence[str], num_battles: int = 50,
+                seed: Optional[int] = None, on_progress=None) -> Dict[str, Any]:
+        return self.request({'type': 'matchup', 'team1': list(team1), 'team2': list(team2),
+                             'num_battles': num_battles, 'seed': seed}, on_progress)
+
+    def batch(self, num_battles: int = 100, team_size: int = 4, seed: Optional[int] = None,
+              on_progress=None) -> Dict[str, Any]:
+        return self.request({'type': 'batch', 'num_battles': num_battles, 'team_size': team_size,
+                             'seed': seed}, on_progress)
+
+    def cancel(self, request_id: Any):
+        self.send({'type': 'cancel', 'target': request_id})
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地战斗模拟服务（JSON Lines）")
+    parser.add_argument('--socket', metavar='PATH', help="Unix 套接字路径（省略时监听 TCP）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help="工作进程数，0 表示在本进程内运行")
+    parser.add_argument('--chunk-size', type=int, default=100)
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help="监视模板文件并热重载的轮询间隔")
+    args = parser.parse_args()
+
+    async def run():
+        server = SimulationServer(workers=args.workers, chunk_size=args.chunk_size, watch_interval=args.watch)
+        await server.start(path=args.socket, host=args.host, port=args.port)
+        print(f"模拟服务已启动：{args.socket or f'{args.host}:{args.port}'}（{args.workers} 个工作进程）")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 # skill.py
 from __future__ import annotations
-from typing import List, Dict, Any, TYPE_CHECKING
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 import random
 
+from battle_log import battle_log, INFO, SkillCastEvent, SkillNotReadyEvent
+
 if TYPE_CHECKING:
     from hero import Unit
     from factory_effect import EffectFactory
+    from battle_rng import BattleRNG
 
 class Skill:
+    __slots__ = ('name', 'effect_factory', 'damage_multiplier', 'effects_to_apply',
+                 'cooldown_max', 'current_cooldown', 'target_type', 'target_count')
+
     def __init__(self,
                  name: str,
                  effect_factory: EffectFactory,
@@ -25,6 +31,23 @@ class Skill:
         self.target_type = target_type # 'enemy' or 'self'
         self.target_count = target_count # 作用目标数量
 
+    def reset(self):
+        """把技能恢复到刚创建时的状态（冷却清零）。"""
+        self.current_cooldown = 0
+
+    def clone(self) -> Skill:
+        """复制一个处于初始状态的技能，共享不可变的配置（效果列表、工厂）。"""
+        new_skill = object.__new__(type(self))
+        new_skill.name = self.name
+        new_skill.effect_factory = self.effect_factory
+        new_skill.damage_multiplier = self.damage_multiplier
+        new_skill.effects_to_apply = self.effects_to_apply
+        new_skill.cooldown_max = self.cooldown_max
+        new_skill.current_cooldown = 0
+        new_skill.target_type = self.target_type
+        new_skill.target_count = self.target_count
+        return new_skill
+
     def is_ready(self) -> bool:
         """检查技能是否冷却完毕。"""
         return self.current_cooldown == 0
@@ -44,18 +67,21 @@ class Skill:
             return [opponent]
         return []
 
-    def use(self, user: Unit, opponent: Unit) -> bool:
+    def use(self, user: Unit, opponent: Unit, rng: Optional[BattleRNG] = None) -> bool:
         """
         使用技能。
         Args:
             user (Unit): 技能使用者。
             opponent (Unit): 技能作用的敌方目标。
+            rng (BattleRNG, optional): 暴击判定使用的随机数流，省略时使用全局 random 模块。
         """
         if not self.is_ready():
-            print(f"[{user.name}] 尝试使用 [{self.name}]，但技能尚未冷却！")
+            if battle_log.level <= INFO:
+                battle_log.emit(SkillNotReadyEvent(user.name, self.name))
             return False
 
-        print(f"[{user.name}] 使用了技能：『{self.name}』!")
+        if battle_log.level <= INFO:
+            battle_log.emit(SkillCastEvent(user.name, self.name))
         
         # 选择目标
         targets = self._select_targets(user, opponent)
@@ -64,10 +90,10 @@ class Skill:
         if self.damage_multiplier > 0:
             damage = int(user.attack * self.damage_multiplier)
             # 技能暴击判定
-            is_crit = random.random() < user.crit_rate
+            is_crit = (rng or random).random() < user.crit_rate
             
             for target in targets:
-                target.take_damage(damage, is_crit=is_crit)
+                target.take_damage(damage, is_crit=is_crit, source=user)
 
         # 2. 施加效果
         for effect_data in self.effects_to_apply:
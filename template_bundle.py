@@ -0,0 +1,167 @@
+# template_bundle.py
+"""
+模板数据的预编译缓存。
+
+effects.yaml、skills.yaml、hero.yaml 三个文件一起解析、校验后，序列化成一个二进制包
+保存在 cache_dir 下。包以三个源文件内容的 SHA-256 命名，任一文件变化都会得到新的键，
+自动重新解析并生成新包（旧包随即删除）。
+
+包文件格式：MAGIC + 负载的 SHA-256 + pickle 负载；读取时校验魔数和摘要，
+损坏或不完整的包视为不存在。写入先写临时文件再原子替换，多个工作进程同时启动也安全。
+
+YAML 解析优先使用 libyaml 的 CSafeLoader，不可用时退回纯 Python 的 SafeLoader。
+"""
+from __future__ import annotations
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# 包格式或校验规则变化时修改，使旧包失效
+MAGIC = b'TPLBUNDLE1\n'
+DEFAULT_CACHE_DIR = '.template_cache'
+
+# 模板种类 -> 默认源文件
+DEFAULT_SOURCES: Dict[str, str] = {
+    'effects': 'effects.yaml',
+    'skills': 'skills.yaml',
+    'heroes': 'hero.yaml',
+}
+
+TemplateData = Dict[str, Dict[str, Dict[str, Any]]]
+
+
+class TemplateValidationError(ValueError):
+    """模板数据结构不合法。"""
+
+
+def parse_yaml(text: str) -> Any:
+    return yaml.load(text, Loader=YamlLoader)
+
+
+def validate_templates(data: TemplateData):
+    """
+    检查三类模板的结构。只检查结构，不检查引用关系：效果也可以在代码里通过
+    EffectFactory.register 注册，未定义的引用仍在创建时报告。
+    """
+    for kind in DEFAULT_SOURCES:
+        templates = data.get(kind)
+        if not isinstance(templates, dict):
+            raise TemplateValidationError(f"{kind} 模板文件的顶层必须是映射")
+        for name, template in templates.items():
+            if not isinstance(template, dict):
+                raise TemplateValidationError(f"{kind} 模板 '{name}' 必须是映射")
+
+    def check_effect_list(owner: str, effects: Any):
+        if effects is not None and not (isinstance(effects, list)
+                                        and all(isinstance(item, dict) for item in effects)):
+            raise TemplateValidationError(f"{owner} 的效果列表必须是映射组成的列表")
+
+    for name, template in data['effects'].items():
+        for field in ('logic_hooks', 'default_params'):
+            if not isinstance(template.get(field) or {}, dict):
+                raise TemplateValidationError(f"效果 '{name}' 的 {field} 必须是映射")
+
+    for name, template in data['skills'].items():
+        check_effect_list(f"技能 '{name}'", template.get('effects_to_apply'))
+
+    for name, template in data['heroes'].items():
+        if not isinstance(template.get('base_stats') or {}, dict):
+            raise TemplateValidationError(f"英雄 '{name}' 的 base_stats 必须是映射")
+        skills = template.get('skills') or []
+        if not isinstance(skills, list) or not all(isinstance(item, dict) for item in skills):
+            raise TemplateValidationError(f"英雄 '{name}' 的 skills 必须是映射组成的列表")
+        for skill_config in skills:
+            check_effect_list(f"英雄 '{name}' 的技能 '{skill_config.get('name')}'", skill_config.get('effects'))
+
+
+def _read_sources(sources: Dict[str, str]) -> Tuple[str, Dict[str, bytes]]:
+    """读取源文件，返回 (内容键, {种类: 原始字节})。"""
+    digest = hashlib.sha256(MAGIC)
+    raw = {}
+    for kind in DEFAULT_SOURCES:
+        with open(sources[kind], 'rb') as f:
+            raw[kind] = f.read()
+        digest.update(kind.encode('utf-8'))
+        digest.update(len(raw[kind]).to_bytes(8, 'little'))
+        digest.update(raw[kind])
+    return digest.hexdigest(), raw
+
+
+def _bundle_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"templates-{key[:24]}.bundle")
+
+
+def _read_bundle(path: str) -> Optional[TemplateData]:
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+    except OSError:
+        return None
+    header = len(MAGIC) + 32
+    if len(blob) < header or not blob.startswith(MAGIC):
+        return None
+    payload = blob[header:]
+    if hashlib.sha256(payload).digest() != blob[len(MAGIC):header]:
+        return None
+    try:
+        return pickle.loads(payload)
+    except Exception:
+        return None
+
+
+def _write_bundle(cache_dir: str, path: str, data: TemplateData):
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + hashlib.sha256(payload).digest() + payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    # 删除过期的包
+    for entry in os.listdir(cache_dir):
+        stale = os.path.join(cache_dir, entry)
+        if entry.startswith('templates-') and entry.endswith('.bundle') and stale != path:
+            with contextlib.suppress(OSError):
+                os.unlink(stale)
+
+
+def load_template_data(effects_path: str = DEFAULT_SOURCES['effects'],
+                       skills_path: str = DEFAULT_SOURCES['skills'],
+                       heroes_path: str = DEFAULT_SOURCES['heroes'],
+                       cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> TemplateData:
+    """
+    读取三类模板，返回 {'effects': ..., 'skills': ..., 'heroes': ...}。
+    Args:
+        cache_dir: 预编译包的目录；None 表示不使用缓存，每次都解析 YAML。
+    """
+    sources = {'effects': effects_path, 'skills': skills_path, 'heroes': heroes_path}
+    key, raw = _read_sources(sources)
+    path = _bundle_path(cache_dir, key) if cache_dir is not None else None
+    if path is not None:
+        data = _read_bundle(path)
+        if data is not None:
+            return data
+
+    data = {kind: parse_yaml(raw[kind].decode('utf-8')) or {} for kind in DEFAULT_SOURCES}
+    validate_templates(data)
+    if path is not None:
+        try:
+            _write_bundle(cache_dir, path, data)
+        except OSError:
+            # 缓存目录不可写时照常使用解析结果
+            pass
+    return data
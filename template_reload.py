@@ -0,0 +1,204 @@
+# template_reload.py
+"""
+模板热重载：常驻进程在 YAML 文件被修改后，只替换受影响的模板和蓝图，而不必重启。
+
+- TemplateWatcher 轮询三个源文件的修改时间和大小，变化时通过 template_bundle 重新加载。
+- diff_templates 比较新旧数据，找出变化（新增/修改/删除）的效果和技能，以及需要
+  重建蓝图的英雄：英雄模板本身变化，或引用了变化的技能/效果。
+- apply_reload 先在临时工厂里编译变化的效果钩子、构建新蓝图，全部成功后才在
+  UnitFactory 的锁内把新的模板字典和蓝图字典一起换进工厂；构建蓝图也持有这把锁，
+  所以不会用新旧混合的模板构建单位。任何一步出错都不会改动正在使用的工厂。
+- 工厂的模板字典是整体替换的：技能持有的 EffectFactory.pinned() 视图和已经创建的单位
+  仍指向旧版本，所以进行中的战斗不受影响，之后 create 的单位使用新版本。
+
+工作进程中的工厂不会自动重载；常驻进程池需要在重载后重建。
+"""
+from __future__ import annotations
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set, Tuple, TYPE_CHECKING
+
+from battle_log import battle_log
+from factory_effect import EffectFactory
+from factory_skill import SkillFactory
+from factory_unit import UnitFactory
+from template_bundle import DEFAULT_CACHE_DIR, DEFAULT_SOURCES, TemplateData, load_template_data
+
+if TYPE_CHECKING:
+    from hero import Unit
+
+
+@dataclass
+class ReloadReport:
+    """一次重载涉及的模板名。"""
+    effects: Set[str] = field(default_factory=set)
+    skills: Set[str] = field(default_factory=set)
+    heroes: Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.effects or self.skills or self.heroes)
+
+    def describe(self) -> str:
+        parts = []
+        for label, names in (('效果', self.effects), ('技能', self.skills), ('英雄', self.heroes)):
+            if names:
+                parts.append(f"{label}: {', '.join(sorted(names))}")
+        return '；'.join(parts) if parts else '无变化'
+
+
+def _effect_names(effects: Any) -> Set[str]:
+    return {effect_data.get('name') for effect_data in effects or ()}
+
+
+def diff_templates(old: TemplateData, new: TemplateData) -> ReloadReport:
+    """比较两份模板数据，返回变化的效果、技能以及需要重建蓝图的英雄。"""
+    def changed(kind: str) -> Set[str]:
+        old_templates, new_templates = old.get(kind, {}), new.get(kind, {})
+        return {name for name in old_templates.keys() | new_templates.keys()
+                if old_templates.get(name) != new_templates.get(name)}
+
+    report = ReloadReport(effects=changed('effects'), skills=changed('skills'))
+    # 技能模板未变，但默认效果列表引用了变化的效果
+    for name, template in new['skills'].items():
+        if _effect_names(template.get('effects_to_apply')) & report.effects:
+            report.skills.add(name)
+
+    report.heroes = changed('heroes')
+    for name, template in new['heroes'].items():
+        for skill_config in template.get('skills') or []:
+            if (skill_config.get('name') in report.skills
+                    or _effect_names(skill_config.get('effects')) & report.effects):
+                report.heroes.add(name)
+                break
+    return report
+
+
+def apply_reload(unit_factory: UnitFactory, new: TemplateData, report: ReloadReport):
+    """把 report 中涉及的模板替换为 new 中的版本，并重建受影响英雄的蓝图。"""
+    skill_factory = unit_factory.skill_factory
+    effect_factory = skill_factory.effect_factory
+
+    effect_templates = dict(effect_factory._templates)
+    for name in report.effects:
+        if name in new['effects']:
+            template = dict(new['effects'][name])
+            template['compiled_hooks'] = effect_factory._compile_hooks(name, template.get('logic_hooks', {}))
+            effect_templates[name] = template
+        else:
+            effect_templates.pop(name, None)
+
+    skill_templates = dict(skill_factory._templates)
+    hero_templates = dict(unit_factory._templates)
+    for templates, kind, names in ((skill_templates, 'skills', report.skills),
+                                   (hero_templates, 'heroes', report.heroes)):
+        for name in names:
+            if name in new[kind]:
+                templates[name] = new[kind][name]
+            else:
+                templates.pop(name, None)
+
+    # 在临时工厂中构建新蓝图，新蓝图的技能绑定到新的效果模板字典
+    staged_effects = EffectFactory()
+    staged_effects._templates = effect_templates
+    staged_skills = SkillFactory(staged_effects)
+    staged_skills._templates = skill_templates
+    staged_units = UnitFactory(staged_skills)
+    staged_units.unit_classes = unit_factory.unit_classes
+    staged_units._templates = hero_templates
+
+    blueprints: Dict[str, Unit] = {name: blueprint for name, blueprint in unit_factory.current_blueprints().items()
+                                   if name not in report.heroes}
+    for name in report.heroes:
+        if name in hero_templates:
+            blueprint = staged_units._build(name)
+            if blueprint is not None:
+                blueprints[name] = blueprint
+
+    # 整体替换；替换前取到旧字典的调用方继续使用旧版本
+    with unit_factory._lock:
+        effect_factory._templates = effect_templates
+        skill_factory._templates = skill_templates
+        unit_factory._templates = hero_templates
+        unit_factory._blueprints = blueprints
+        unit_factory._blueprint_sources = (skill_templates, effect_templates)
+        unit_factory.template_data = new
+
+
+class TemplateWatcher:
+    """
+    监视模板源文件，变化时热重载 unit_factory（以及它的技能、效果工厂）。
+    Args:
+        unit_factory: 已通过 load_all_from_files 加载过这些文件的英雄工厂，
+            以它加载时的数据为基准比较（没有记录时从源文件读取）。
+        cache_dir: 预编译包目录，见 template_bundle.load_template_data。
+    """
+
+    def __init__(self, unit_factory: UnitFactory,
+                 effects_path: str = DEFAULT_SOURCES['effects'],
+                 skills_path: str = DEFAULT_SOURCES['skills'],
+                 heroes_path: str = DEFAULT_SOURCES['heroes'],
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self.unit_factory = unit_factory
+        self.paths = (effects_path, skills_path, heroes_path)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._signature = self._stat()
+        self._data = unit_factory.template_data
+        if self._data is None:
+            self._data = load_template_data(*self.paths, cache_dir=cache_dir)
+
+    def _stat(self) -> Tuple[Optional[Tuple[int, int]], ...]:
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def poll(self) -> Optional[ReloadReport]:
+        """文件有变化时重载，返回重载报告；没有变化或重载失败时返回 None。"""
+        signature = self._stat()
+        if signature == self._signature:
+            return None
+        return self.reload(signature)
+
+    def reload(self, signature: Optional[tuple] = None) -> Optional[ReloadReport]:
+        """立即重新读取源文件并应用差异。出错时保留当前版本，等文件再次变化后重试。"""
+        with self._lock:
+            self._signature = signature or self._stat()
+            try:
+                data = load_template_data(*self.paths, cache_dir=self.cache_dir)
+                report = diff_templates(self._data, data)
+                if report:
+                    apply_reload(self.unit_factory, data, report)
+            except Exception as e:
+                battle_log.error(f"错误：模板热重载失败，继续使用当前版本：{e}")
+                return None
+            self._data = data
+        if report:
+            print(f"模板已热重载（{report.describe()}）")
+        return report
+
+    def start(self, interval: float = 1.0):
+        """在后台线程中每隔 interval 秒轮询一次。"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.wait(interval):
+                self.poll()
+
+        self._thread = threading.Thread(target=run, name='TemplateWatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,346 @@
+# tournament.py
+"""
+循环赛模式：穷举阵容之间的全部对阵，每个对阵用 K 个种子各战斗一场，得到完整的阵容级胜负矩阵。
+
+- 阵容默认是英雄池中 team_size 个英雄的全部组合；也可以只给出部分阵容（它们之间两两对阵），
+  或直接给出对阵列表。枚举时跳过有共同英雄的两个阵容（直接给出的对阵不检查）。
+- 对阵按顺序编号后每 shard_size 个分为一个分片，分片是并行和断点续跑的单位：
+  每完成一个分片就把它的计数原子地写入 out_dir/shard-NNNNN.npz，中断后重新运行同样的配置
+  只补跑缺失的分片。out_dir/tournament.json 记录配置和模板指纹，配置不同时拒绝续跑。
+- 第 k 个种子的战斗随机数流由主种子、对阵双方的阵容和 k 派生，与分片方式、进程数和
+  对阵是否属于子集都无关。偶数种子由编号小的阵容担任队伍1，奇数种子交换，抵消先后手的影响。
+"""
+from __future__ import annotations
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import headless_simulation
+from battle_rng import BattleRNG
+from headless_simulation import ProgressPrinter, create_team, run_prepared_battle
+from matchup_cache import matchup_key
+
+if TYPE_CHECKING:
+    from factory_unit import UnitFactory
+
+Composition = Tuple[str, ...]
+
+MANIFEST_NAME = 'tournament.json'
+# 记录格式变化时修改，使旧的分片失效
+FORMAT_VERSION = 1
+
+
+def enumerate_compositions(hero_names: Sequence[str], team_size: int) -> List[Composition]:
+    """英雄池中 team_size 个英雄的全部组合，组合内按英雄池的顺序排列。"""
+    return list(combinations(hero_names, team_size))
+
+
+def enumerate_pairings(compositions: Sequence[Composition]) -> np.ndarray:
+    """没有共同英雄的全部阵容对 (i, j)，i < j，返回形状为 (P, 2) 的编号数组。"""
+    hero_bits: Dict[str, int] = {}
+    for composition in compositions:
+        for name in composition:
+            hero_bits.setdefault(name, len(hero_bits))
+    if len(hero_bits) <= 63:
+        masks = np.array([sum(1 << hero_bits[name] for name in composition) for composition in compositions],
+                         dtype=np.int64)
+        pairs = [np.stack([np.full(len(partners), i), partners + i + 1], axis=1)
+                 for i in range(len(masks))
+                 for partners in [np.flatnonzero((masks[i + 1:] & masks[i]) == 0)]]
+    else:
+        sets = [frozenset(composition) for composition in compositions]
+        pairs = [np.array([(i, j) for j in range(i + 1, len(sets)) if sets[i].isdisjoint(sets[j])]).reshape(-1, 2)
+                 for i in range(len(sets))]
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.concatenate(pairs).astype(np.int64)
+
+
+def pairing_rng(master_seed: int, team_a: Composition, team_b: Composition, seed_index: int) -> BattleRNG:
+    """对阵 (team_a, team_b) 第 seed_index 个种子的随机数流，与双方的先后顺序无关。"""
+    text = '|'.join(sorted(','.join(team) for team in (team_a, team_b)))
+    pairing_key = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return BattleRNG(np.random.SeedSequence(master_seed, spawn_key=(pairing_key, seed_index)))
+
+
+def run_pairings(unit_factory: UnitFactory, pairings: Sequence[Tuple[Composition, Composition]],
+                 seeds_per_pairing: int, master_seed: int) -> Dict[str, np.ndarray]:
+    """
+    运行一组对阵，返回每个对阵的计数数组：
+    {'wins_a', 'wins_b', 'draws', 'turns'}，a/b 为对阵中的第一、第二个阵容。
+    """
+    count = len(pairings)
+    counts = {key: np.zeros(count, dtype=np.int64) for key in ('wins_a', 'wins_b', 'draws', 'turns')}
+    for index, (team_a, team_b) in enumerate(pairings):
+        # 阵容固定，只创建一次，之后每场战斗前原地重置
+        units_a = create_team(unit_factory, team_a)
+        units_b = create_team(unit_factory, team_b)
+        for k in range(seeds_per_pairing):
+            rng = pairing_rng(master_seed, team_a, team_b, k)
+            swapped = k % 2 == 1
+            if swapped:
+                result = run_prepared_battle(units_b, units_a, silent=True, rng=rng)
+            else:
+                result = run_prepared_battle(units_a, units_b, silent=True, rng=rng)
+            if not result:
+                continue
+            winner = result['winner']
+            if winner == 'draw':
+                counts['draws'][index] += 1
+            elif (winner == 'team1') != swapped:
+                counts['wins_a'][index] += 1
+            else:
+                counts['wins_b'][index] += 1
+            counts['turns'][index] += result['turns']
+    return counts
+
+
+def _run_shard_in_worker(task):
+    shard_index, pairings, seeds_per_pairing, master_seed = task
+    return shard_index, run_pairings(headless_simulation._worker_unit_factory, pairings,
+                                     seeds_per_pairing, master_seed)
+
+
+class TournamentResult:
+    """
+    阵容级胜负矩阵。
+    wins[i, j]: 阵容 i 对阵容 j 的胜场；games[i, j]: 两者的对阵场数（对称），平局 = games - wins - wins.T。
+    """
+
+    def __init__(self, compositions: Sequence[Composition], wins: np.ndarray, games: np.ndarray,
+                 total_turns: int = 0):
+        self.compositions: List[Composition] = [tuple(composition) for composition in compositions]
+        self.wins = wins
+        self.games = games
+        self.total_turns = total_turns
+
+    @property
+    def draws(self) -> np.ndarray:
+        return self.games - self.wins - self.wins.T
+
+    @property
+    def num_battles(self) -> int:
+        return int(self.games.sum() // 2)
+
+    def win_rates(self, min_games: int = 0) -> np.ndarray:
+        """阵容 i 对阵容 j 的胜率矩阵（百分比），没有对阵或场次不足的为 nan。"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = self.wins / self.games * 100
+        return np.where((self.games >= min_games) & (self.games > 0), rates, np.nan)
+
+    def composition_win_rates(self) -> np.ndarray:
+        """每个阵容对全部对手的总胜率（百分比），没有对阵的为 nan。"""
+        games = self.games.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = self.wins.sum(axis=1) / games * 100
+        return np.where(games > 0, rates, np.nan)
+
+    def top_compositions(self, k: Optional[int] = None) -> List[Tuple[Composition, float, int, int]]:
+        """按总胜率从高到低排列：[(阵容, 胜率, 胜场, 场次)]。"""
+        rates = self.composition_win_rates()
+        wins, games = self.wins.sum(axis=1), self.games.sum(axis=1)
+        order = [i for i in np.argsort(-rates, kind='stable') if games[i] > 0][:k]
+        return [(self.compositions[i], float(rates[i]), int(wins[i]), int(games[i])) for i in order]
+
+    def save(self, path: str):
+        np.savez(path, compositions=np.array([','.join(c) for c in self.compositions]),
+                 wins=self.wins, games=self.games, total_turns=self.total_turns)
+
+    @classmethod
+    def load(cls, path: str) -> TournamentResult:
+        with np.load(path) as data:
+            compositions = [tuple(text.split(',')) for text in data['compositions'].tolist()]
+            return cls(compositions, data['wins'], data['games'], int(data['total_turns']))
+
+
+class Tournament:
+    """
+    Args:
+        unit_factory: 英雄工厂（只用于单进程运行和计算模板指纹；工作进程自行加载）。
+        out_dir: 分片记录和配置的目录。
+        team_size: 每队英雄数（给出 compositions 或 pairings 时由它们决定）。
+        seeds_per_pairing: 每个对阵的战斗场数 K。
+        master_seed: 主种子。
+        shard_size: 每个分片的对阵数。
+        heroes: 英雄池，默认全部英雄。
+        compositions: 只在这些阵容之间对阵。
+        pairings: 直接给出的对阵列表 [(阵容, 阵容)]，优先于 compositions。
+    """
+
+    def __init__(self, unit_factory: UnitFactory, out_dir: str, team_size: int = 3,
+                 seeds_per_pairing: int = 10, master_seed: int = 0, shard_size: int = 64,
+                 heroes: Optional[Sequence[str]] = None,
+                 compositions: Optional[Iterable[Sequence[str]]] = None,
+                 pairings: Optional[Iterable[Tuple[Sequence[str], Sequence[str]]]] = None):
+        if seeds_per_pairing < 1 or shard_size < 1:
+            raise ValueError("seeds_per_pairing 和 shard_size 必须为正数")
+        self.unit_factory = unit_factory
+        self.out_dir = out_dir
+        self.seeds_per_pairing = seeds_per_pairing
+        self.master_seed = master_seed
+        self.shard_size = shard_size
+
+        if pairings is not None:
+            composition_ids: Dict[Composition, int] = {}
+            pairing_list = []
+            for team_a, team_b in pairings:
+                ids = [composition_ids.setdefault(tuple(team), len(composition_ids)) for team in (team_a, team_b)]
+                pairing_list.append(ids)
+            self.compositions = list(composition_ids)
+            self.pairings = np.array(pairing_list, dtype=np.int64).reshape(-1, 2)
+        else:
+            if compositions is not None:
+                self.compositions = list(dict.fromkeys(tuple(team) for team in compositions))
+            else:
+                roster = list(heroes) if heroes is not None else list(unit_factory._templates)
+                self.compositions = enumerate_compositions(roster, team_size)
+            self.pairings = enumerate_pairings(self.compositions)
+        self.team_size = len(self.compositions[0]) if self.compositions else team_size
+        self.num_shards = -(-len(self.pairings) // shard_size)
+
+    # --- 配置与分片记录 ---
+
+    def _manifest(self) -> Dict[str, Any]:
+        heroes = sorted({name for composition in self.compositions for name in composition})
+        return {
+            'format_version': FORMAT_VERSION,
+            'seeds_per_pairing': self.seeds_per_pairing,
+            'master_seed': self.master_seed,
+            'shard_size': self.shard_size,
+            'compositions': [list(composition) for composition in self.compositions],
+            'pairings': hashlib.sha256(self.pairings.tobytes()).hexdigest(),
+            # 英雄模板（含引用的技能和效果）与战斗引擎版本的指纹
+            'templates': matchup_key(self.unit_factory, heroes, [], self.master_seed),
+        }
+
+    def _prepare_out_dir(self):
+        """创建输出目录并写入配置；已有记录的配置不同时抛出 ValueError。"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, MANIFEST_NAME)
+        manifest = self._manifest()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            if existing != manifest:
+                changed = sorted(key for key in manifest.keys() | existing.keys()
+                                 if manifest.get(key) != existing.get(key))
+                raise ValueError(f"{self.out_dir} 中已有配置不同的循环赛记录（{', '.join(changed)}），"
+                                 f"请换一个目录或删除旧记录")
+            return
+        self._write_atomic(path, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+
+    def _write_atomic(self, path: str, payload: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.out_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def _shard_path(self, shard_index: int) -> str:
+        return os.path.join(self.out_dir, f"shard-{shard_index:05d}.npz")
+
+    def shard_pairings(self, shard_index: int) -> List[Tuple[Composition, Composition]]:
+        """分片中的对阵（阵容名）。"""
+        start = shard_index * self.shard_size
+        return [(self.compositions[a], self.compositions[b])
+                for a, b in self.pairings[start:start + self.shard_size].tolist()]
+
+    def _read_shard(self, shard_index: int) -> Optional[Dict[str, np.ndarray]]:
+        """读取分片记录；不存在或不完整时返回 None。"""
+        expected = len(self.pairings[shard_index * self.shard_size:(shard_index + 1) * self.shard_size])
+        try:
+            with np.load(self._shard_path(shard_index)) as data:
+                counts = {key: data[key] for key in ('wins_a', 'wins_b', 'draws', 'turns')}
+        except (OSError, ValueError, KeyError):
+            return None
+        if any(len(values) != expected for values in counts.values()):
+            return None
+        return counts
+
+    def _save_shard(self, shard_index: int, counts: Dict[str, np.ndarray]):
+        buffer = io.BytesIO()
+        np.savez(buffer, **counts)
+        self._write_atomic(self._shard_path(shard_index), buffer.getvalue())
+
+    def completed_shards(self) -> Set[int]:
+        return {i for i in range(self.num_shards) if self._read_shard(i) is not None}
+
+    # --- 运行与汇总 ---
+
+    def run(self, workers: int = 1) -> TournamentResult:
+        """运行（或续跑）全部缺失的分片，返回完整的胜负矩阵。"""
+        self._prepare_out_dir()
+        done = self.completed_shards()
+        pending = [i for i in range(self.num_shards) if i not in done]
+        total_battles = len(self.pairings) * self.seeds_per_pairing
+
+        print(f"\n🏆 循环赛")
+        print(f"=" * 30)
+        print(f"阵容 {len(self.compositions)} 个，对阵 {len(self.pairings)} 个 × {self.seeds_per_pairing} 个种子 "
+              f"= {total_battles} 场")
+        print(f"分片 {self.num_shards} 个（每片 {self.shard_size} 个对阵），已完成 {len(done)} 个")
+
+        progress = ProgressPrinter(max(1, self.num_shards))
+        finished = len(done)
+        if workers > 1 and pending:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=headless_simulation._init_worker)
+            try:
+                futures = [executor.submit(_run_shard_in_worker,
+                                           (i, self.shard_pairings(i), self.seeds_per_pairing, self.master_seed))
+                           for i in pending]
+                for future in as_completed(futures):
+                    shard_index, counts = future.result()
+                    self._save_shard(shard_index, counts)
+                    finished += 1
+                    progress.update(finished)
+            except BaseException:
+                # 中断时不再等待排队中的分片；已完成的分片已经落盘
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+        else:
+            for shard_index in pending:
+                counts = run_pairings(self.unit_factory, self.shard_pairings(shard_index),
+                                      self.seeds_per_pairing, self.master_seed)
+                self._save_shard(shard_index, counts)
+                finished += 1
+                progress.update(finished)
+
+        result = self.result()
+        print(f"\n完成 {result.num_battles} 场，平均回合数: {result.total_turns / max(1, result.num_battles):.1f}")
+        print(f"\n胜率最高的阵容:")
+        for composition, rate, wins, games in result.top_compositions(5):
+            print(f"  {', '.join(composition)}: {rate:.1f}% ({wins}/{games})")
+        return result
+
+    def result(self) -> TournamentResult:
+        """汇总已完成的分片；未完成的对阵在矩阵中没有场次。"""
+        count = len(self.compositions)
+        wins = np.zeros((count, count), dtype=np.int64)
+        games = np.zeros((count, count), dtype=np.int64)
+        total_turns = 0
+        for shard_index in range(self.num_shards):
+            counts = self._read_shard(shard_index)
+            if counts is None:
+                continue
+            pairs = self.pairings[shard_index * self.shard_size:(shard_index + 1) * self.shard_size]
+            a, b = pairs[:, 0], pairs[:, 1]
+            played = counts['wins_a'] + counts['wins_b'] + counts['draws']
+            np.add.at(wins, (a, b), counts['wins_a'])
+            np.add.at(wins, (b, a), counts['wins_b'])
+            np.add.at(games, (a, b), played)
+            np.add.at(games, (b, a), played)
+            total_turns += int(counts['turns'].sum())
+        return TournamentResult(self.compositions, wins, games, total_turns)
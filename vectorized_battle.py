@@ -0,0 +1,516 @@
+# vectorized_battle.py
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+
+from enums import TriggerPhase
+from effect import action_interpreter
+
+if TYPE_CHECKING:
+    from factory_unit import UnitFactory
+    from factory_effect import EffectFactory
+    from effect import GenericEffect
+
+# 核心属性在数组最后一维中的位置
+ATTRIBUTES = ('hp', 'attack', 'armor', 'speed', 'crit_rate')
+HP, ATTACK, ARMOR, SPEED, CRIT_RATE = range(len(ATTRIBUTES))
+# 与 Unit 中 final_type=int 的属性保持一致
+INT_ATTRIBUTES = (True, True, True, True, False)
+
+# 引擎会触发的阶段（与 MultiBattle 一致）；PASSIVE 被预先折算成倍率表
+EVENT_PHASES = (TriggerPhase.ON_APPLY, TriggerPhase.ON_REMOVE, TriggerPhase.ON_TURN_START)
+
+TARGET_OWNER, TARGET_SOURCE = 'owner', 'source'
+
+
+class EffectSpecTable:
+    """
+    把技能里的每一种效果配置（效果名 + 实例化参数）编译为一个整数编号的静态规格。
+
+    同一规格的效力、持续时间和被动倍率在战斗中不会变化，因此被动修饰直接折算成
+    ratio/flat 表，动作被编译成简单的操作元组。被动钩子和数值必须只取决于效果本身
+    （编译结果的 pure 属性），读取持有者/施加者状态的定义会被拒绝。编号 0 保留给空槽位。
+    """
+    def __init__(self, effect_factory: EffectFactory):
+        self.effect_factory = effect_factory
+        self._ids: Dict[Tuple, int] = {}
+        self.names: List[Optional[str]] = [None]
+        self.durations: List[float] = [0.0]
+        self.ratios: List[List[float]] = [[1.0] * len(ATTRIBUTES)]
+        self.flats: List[List[float]] = [[0.0] * len(ATTRIBUTES)]
+        self.ops: Dict[TriggerPhase, List[List[tuple]]] = {phase: [[]] for phase in EVENT_PHASES}
+
+    def get_id(self, effect_data: Dict[str, Any]) -> int:
+        key = tuple(sorted((k, repr(v)) for k, v in effect_data.items()))
+        spec_id = self._ids.get(key)
+        if spec_id is None:
+            spec_id = self._compile(effect_data)
+            self._ids[key] = spec_id
+        return spec_id
+
+    def _compile(self, effect_data: Dict[str, Any]) -> int:
+        effect = self.effect_factory.create(**effect_data)
+        if effect is None:
+            return 0
+
+        ratios, flats = [], []
+        passive = effect.compiled_hooks.get(TriggerPhase.PASSIVE)
+        if passive is not None and not getattr(passive, 'pure', False):
+            raise ValueError(f"向量化引擎不支持效果 '{effect.name}' 依赖持有者/施加者状态或自定义函数的被动逻辑")
+        for attr_name in ATTRIBUTES:
+            modifiers = None
+            if passive is not None:
+                context = {'target': None, 'user': None, 'attr_name': attr_name, 'effect': effect}
+                modifiers = passive(context)
+            modifiers = modifiers if isinstance(modifiers, dict) else {}
+            ratios.append(float(modifiers.get('ratio', 1.0)))
+            flats.append(float(modifiers.get('flat', 0.0)))
+
+        phase_ops = {phase: [] for phase in EVENT_PHASES}
+        for phase_key, actions in effect.logic_hooks.items():
+            phase = phase_key if isinstance(phase_key, TriggerPhase) else TriggerPhase.__members__.get(str(phase_key))
+            if phase == TriggerPhase.PASSIVE:
+                continue
+            if phase not in phase_ops:
+                raise ValueError(f"向量化引擎不支持效果 '{effect.name}' 的触发阶段 '{phase_key}'")
+            if callable(actions):
+                raise ValueError(f"向量化引擎不支持效果 '{effect.name}' 的自定义逻辑函数")
+            phase_ops[phase] = [op for op in (self._compile_op(action, effect) for action in actions) if op]
+
+        self.names.append(effect.name)
+        self.durations.append(float(effect.duration))
+        self.ratios.append(ratios)
+        self.flats.append(flats)
+        for phase in EVENT_PHASES:
+            self.ops[phase].append(phase_ops[phase])
+        return len(self.names) - 1
+
+    def _compile_op(self, action: Dict[str, Any], effect: GenericEffect) -> Optional[tuple]:
+        action_type = str(action.get('type', '')).upper()
+        target = action.get('target')
+        if target not in (TARGET_OWNER, TARGET_SOURCE):
+            return None
+        if action_type in ('DEAL_DAMAGE', 'HEAL'):
+            return (action_type, target) + self._compile_amount(action.get('amount'), effect)
+        if action_type == 'SET_FLAG':
+            if not action.get('flag_name'):
+                return None
+            return (action_type, target, action['flag_name'], bool(action.get('value')))
+        if action_type == 'CLEAR_EFFECTS':
+            return (action_type, target)
+        raise ValueError(f"向量化引擎不支持的动作类型 '{action_type}'")
+
+    def _compile_amount(self, amount_def: Any, effect: GenericEffect) -> tuple:
+        if isinstance(amount_def, dict) and amount_def.get('source') == 'source_attack':
+            multiplier = amount_def.get('multiplier', 1.0)
+            if isinstance(multiplier, str):
+                multiplier = effect.params.get(multiplier, 1.0)
+            return ('source_attack', float(multiplier))
+        # 其余数值只能依赖效果自身的参数，在编译时求出
+        get_value = action_interpreter.compile_value(amount_def)
+        if not get_value.pure:
+            raise ValueError(f"向量化引擎不支持效果 '{effect.name}' 依赖持有者/施加者状态的数值定义: {amount_def}")
+        value = get_value({'target': None, 'user': None, 'effect': effect})
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"向量化引擎无法静态求值的数值定义: {amount_def}")
+        return ('const', float(value))
+
+
+class VectorizedBattle:
+    """
+    用 NumPy 同步推进多场 MultiBattle 的引擎。
+
+    每场战斗的单位按“队伍1在前、队伍2在后”排成一行，所有状态都以 (战斗, 单位, ...)
+    形状的数组保存。每回合按速度排序后，第 k 个行动位在所有战斗中同时执行，
+    规则与 MultiBattle/Unit/GenericEffect 相同：第一个就绪的技能、随机目标、
+    暴击判定、护甲减伤、持续效果的回合开始/结束结算。
+    随机数来自独立的 NumPy 生成器，因此与对象引擎逐场的结果不同，但统计上等价。
+    """
+    def __init__(self,
+                 unit_factory: UnitFactory,
+                 team1_names: List[List[str]],
+                 team2_names: List[List[str]],
+                 seed: Any = None,
+                 max_turns: int = 1000,
+                 effect_slots: int = 8):
+        """
+        Args:
+            unit_factory: 已加载模板的英雄工厂。
+            team1_names / team2_names: 每场战斗双方的英雄名列表，长度必须一致。
+            seed: NumPy 随机数生成器的种子。
+            max_turns: 回合上限，达到上限仍未分出胜负的战斗记为平局。
+            effect_slots: 每个单位初始的效果槽位数，不够时自动扩容。
+        """
+        if len(team1_names) != len(team2_names):
+            raise ValueError("team1_names 与 team2_names 的战斗场数不一致")
+        self.rng = np.random.default_rng(seed)
+        self.max_turns = max_turns
+        self.specs = EffectSpecTable(unit_factory.skill_factory.effect_factory)
+
+        num_battles = len(team1_names)
+        team1_size = max((len(team) for team in team1_names), default=0)
+        team2_size = max((len(team) for team in team2_names), default=0)
+        num_units = team1_size + team2_size
+
+        # --- 英雄表：编号 0 是填充用的“不存在”单位 ---
+        hero_ids: Dict[str, int] = {}
+        hero_rows: List[Tuple[List[float], List[tuple]]] = [([0.0] * len(ATTRIBUTES), [])]
+        hero_names: List[Optional[str]] = [None]
+        hero_idx = np.zeros((num_battles, num_units), dtype=np.int64)
+        for n in range(num_battles):
+            for offset, team in ((0, team1_names[n]), (team1_size, team2_names[n])):
+                for i, name in enumerate(team):
+                    if name not in hero_ids:
+                        row = self._compile_hero(unit_factory, name)
+                        if row is None:
+                            continue
+                        hero_ids[name] = len(hero_rows)
+                        hero_rows.append(row)
+                        hero_names.append(name)
+                    hero_idx[n, offset + i] = hero_ids[name]
+
+        num_skills = max([len(skills) for _, skills in hero_rows] + [1])
+        num_effects = max([len(skill[4]) for _, skills in hero_rows for skill in skills] + [1])
+        num_heroes = len(hero_rows)
+        self.hero_names = hero_names
+        self.hero_base = np.array([base for base, _ in hero_rows], dtype=np.float64)
+        self.hero_skill_exists = np.zeros((num_heroes, num_skills), dtype=bool)
+        self.hero_skill_mult = np.zeros((num_heroes, num_skills), dtype=np.float64)
+        self.hero_skill_cd = np.zeros((num_heroes, num_skills), dtype=np.int64)
+        self.hero_skill_self = np.zeros((num_heroes, num_skills), dtype=bool)
+        self.hero_skill_count = np.zeros((num_heroes, num_skills), dtype=np.int64)
+        self.hero_skill_specs = np.zeros((num_heroes, num_skills, num_effects), dtype=np.int64)
+        for h, (_, skills) in enumerate(hero_rows):
+            for s, (mult, cooldown, is_self, count, spec_ids) in enumerate(skills):
+                self.hero_skill_exists[h, s] = True
+                self.hero_skill_mult[h, s] = mult
+                self.hero_skill_cd[h, s] = cooldown
+                self.hero_skill_self[h, s] = is_self
+                self.hero_skill_count[h, s] = count
+                self.hero_skill_specs[h, s, :len(spec_ids)] = spec_ids
+
+        self.spec_ratio = np.array(self.specs.ratios, dtype=np.float64)
+        self.spec_flat = np.array(self.specs.flats, dtype=np.float64)
+        self.spec_duration = np.array(self.specs.durations, dtype=np.float64)
+
+        # --- 战斗状态 ---
+        self.team = np.array([0] * team1_size + [1] * team2_size, dtype=np.int64)
+        self.hero_idx = hero_idx
+        self.exists = hero_idx != 0
+        self.base = self.hero_base[hero_idx]
+        self.skill_cd = np.zeros((num_battles, num_units, num_skills), dtype=np.int64)
+        self.flags: Dict[str, np.ndarray] = {'is_stunned': np.zeros((num_battles, num_units), dtype=bool)}
+        self.slot_spec = np.zeros((num_battles, num_units, effect_slots), dtype=np.int64)
+        self.slot_dur = np.zeros((num_battles, num_units, effect_slots), dtype=np.float64)
+        self.slot_src = np.full((num_battles, num_units, effect_slots), -1, dtype=np.int64)
+        self.slot_count = np.zeros((num_battles, num_units), dtype=np.int64)
+        self.current_hp = self._stat_all(HP).astype(np.int64)
+        self.current_hp[~self.exists] = 0
+        self.turns = np.zeros(num_battles, dtype=np.int64)
+
+    def _compile_hero(self, unit_factory: UnitFactory, name: str) -> Optional[Tuple[List[float], List[tuple]]]:
+        """从英雄蓝图中提取基础属性和技能参数。"""
+        blueprint = unit_factory.get_blueprint(name)
+        if blueprint is None:
+            return None
+        base = []
+        for attr_name in ATTRIBUTES:
+            base.append(blueprint.base_value(attr_name))
+        skills = []
+        for skill in blueprint.skills.values():
+            spec_ids = [self.specs.get_id(effect_data) for effect_data in skill.effects_to_apply]
+            skills.append((skill.damage_multiplier, skill.cooldown_max,
+                           skill.target_type == 'self', skill.target_count,
+                           [spec_id for spec_id in spec_ids if spec_id]))
+        return base, skills
+
+    # --- 属性与状态查询 ---
+
+    def _stat(self, attr: int, b: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """计算指定单位经过被动效果修正后的属性值。"""
+        specs = self.slot_spec[b, u]
+        value = (self.base[b, u, attr] + self.spec_flat[specs, attr].sum(-1)) * self.spec_ratio[specs, attr].prod(-1)
+        return np.trunc(value) if INT_ATTRIBUTES[attr] else value
+
+    def _stat_all(self, attr: int) -> np.ndarray:
+        specs = self.slot_spec
+        value = (self.base[..., attr] + self.spec_flat[specs, attr].sum(-1)) * self.spec_ratio[specs, attr].prod(-1)
+        return np.trunc(value) if INT_ATTRIBUTES[attr] else value
+
+    def _alive(self, b: Optional[np.ndarray] = None) -> np.ndarray:
+        if b is None:
+            return (self.current_hp > 0) & self.exists
+        return (self.current_hp[b] > 0) & self.exists[b]
+
+    def _teams_standing(self, b: Optional[np.ndarray] = None) -> np.ndarray:
+        """双方都还有存活单位的战斗。"""
+        alive = self._alive(b)
+        return (alive & (self.team == 0)).any(1) & (alive & (self.team == 1)).any(1)
+
+    def _opponent_mask(self, b: np.ndarray, a: np.ndarray) -> np.ndarray:
+        return self._alive(b) & (self.team[None, :] != self.team[a][:, None])
+
+    def _flag(self, flag_name: str) -> np.ndarray:
+        flag = self.flags.get(flag_name)
+        if flag is None:
+            flag = self.flags[flag_name] = np.zeros(self.current_hp.shape, dtype=bool)
+        return flag
+
+    # --- 基本动作 ---
+
+    def _take_damage(self, b: np.ndarray, t: np.ndarray, amount: np.ndarray, is_crit: np.ndarray):
+        armor = self._stat(ARMOR, b, t)
+        damage_reduction_ratio = armor / (armor + 100)
+        final_damage = np.trunc(amount * (1 - damage_reduction_ratio)).astype(np.int64)
+        final_damage = np.where(is_crit, final_damage * 2, final_damage)
+        np.subtract.at(self.current_hp, (b, t), final_damage)
+
+    def _heal(self, b: np.ndarray, t: np.ndarray, amount: np.ndarray):
+        missing = self._stat(HP, b, t) - self.current_hp[b, t]
+        heal_amount = np.minimum(amount, missing).astype(np.int64)
+        np.add.at(self.current_hp, (b, t), heal_amount)
+
+    def _run_phase(self, phase: TriggerPhase, spec: np.ndarray, b: np.ndarray, owner: np.ndarray, src: np.ndarray):
+        """对一批效果事件执行某个阶段的动作。"""
+        phase_ops = self.specs.ops[phase]
+        for spec_id in np.unique(spec):
+            ops = phase_ops[spec_id]
+            if not ops:
+                continue
+            m = spec == spec_id
+            for op in ops:
+                self._run_op(op, b[m], owner[m], src[m])
+
+    def _run_op(self, op: tuple, b: np.ndarray, owner: np.ndarray, src: np.ndarray):
+        action_type, target_kind = op[0], op[1]
+        if target_kind == TARGET_SOURCE:
+            has_source = src >= 0
+            b, owner, src = b[has_source], owner[has_source], src[has_source]
+            target = src
+        else:
+            target = owner
+        if b.size == 0:
+            return
+
+        if action_type in ('DEAL_DAMAGE', 'HEAL'):
+            amount_kind, amount_value = op[2], op[3]
+            if amount_kind == 'source_attack':
+                has_source = src >= 0
+                attack = self._stat(ATTACK, b, np.where(has_source, src, 0))
+                amount = np.where(has_source, np.trunc(attack * amount_value), 0.0)
+            else:
+                amount = np.full(b.size, amount_value)
+            positive = amount > 0
+            if action_type == 'DEAL_DAMAGE':
+                # 持续伤害不触发暴击
+                self._take_damage(b[positive], target[positive], amount[positive], np.zeros(int(positive.sum()), dtype=bool))
+            else:
+                self._heal(b[positive], target[positive], amount[positive])
+        elif action_type == 'SET_FLAG':
+            self._flag(op[2])[b, target] = op[3]
+        elif action_type == 'CLEAR_EFFECTS':
+            self._clear_effects(b, target)
+
+    # --- 效果槽位管理 ---
+
+    def _grow_slots(self):
+        extra = self.slot_spec.shape[2]
+        pad = ((0, 0), (0, 0), (0, extra))
+        self.slot_spec = np.pad(self.slot_spec, pad)
+        self.slot_dur = np.pad(self.slot_dur, pad)
+        self.slot_src = np.pad(self.slot_src, pad, constant_values=-1)
+
+    def _compact(self, b: np.ndarray, u: np.ndarray, keep: np.ndarray):
+        """移除未保留的效果并把剩余效果前移，保持施加顺序。"""
+        order = np.argsort(~keep, axis=1, kind='stable')
+        rows = np.arange(b.size)[:, None]
+        kept = keep[rows, order]
+        for arr, empty in ((self.slot_spec, 0), (self.slot_dur, 0.0), (self.slot_src, -1)):
+            values = arr[b, u][rows, order]
+            values[~kept] = empty
+            arr[b, u] = values
+        self.slot_count[b, u] = keep.sum(1)
+
+    def _apply_effect(self, b: np.ndarray, t: np.ndarray, spec: np.ndarray, src: np.ndarray):
+        pos = self.slot_count[b, t]
+        while pos.max() >= self.slot_spec.shape[2]:
+            self._grow_slots()
+        self.slot_spec[b, t, pos] = spec
+        self.slot_dur[b, t, pos] = self.spec_duration[spec]
+        self.slot_src[b, t, pos] = src
+        self.slot_count[b, t] = pos + 1
+        self._run_phase(TriggerPhase.ON_APPLY, spec, b, t, src)
+
+    def _clear_effects(self, b: np.ndarray, t: np.ndarray):
+        _, first = np.unique(b * self.current_hp.shape[1] + t, return_index=True)
+        b, t = b[first], t[first]
+        specs = self.slot_spec[b, t].copy()
+        srcs = self.slot_src[b, t].copy()
+        self.slot_spec[b, t] = 0
+        self.slot_dur[b, t] = 0.0
+        self.slot_src[b, t] = -1
+        self.slot_count[b, t] = 0
+        for e in range(specs.shape[1]):
+            m = specs[:, e] != 0
+            if m.any():
+                self._run_phase(TriggerPhase.ON_REMOVE, specs[m, e], b[m], t[m], srcs[m, e])
+
+    # --- 行动阶段 ---
+
+    def _turn_start(self, b: np.ndarray, a: np.ndarray):
+        specs = self.slot_spec[b, a].copy()
+        srcs = self.slot_src[b, a].copy()
+        for e in range(int(self.slot_count[b, a].max(initial=0))):
+            m = specs[:, e] != 0
+            if m.any():
+                self._run_phase(TriggerPhase.ON_TURN_START, specs[m, e], b[m], a[m], srcs[m, e])
+
+    def _turn_end(self, b: np.ndarray, a: np.ndarray):
+        specs = self.slot_spec[b, a]
+        active = specs != 0
+        durations = self.slot_dur[b, a] - active
+        self.slot_dur[b, a] = durations
+        expired = active & (durations <= 0)
+        rows = expired.any(1)
+        if rows.any():
+            eb, ea = b[rows], a[rows]
+            expired_specs = np.where(expired, specs, 0)[rows]
+            expired_srcs = self.slot_src[b, a][rows]
+            self._compact(eb, ea, active[rows] & ~expired[rows])
+            for e in range(expired_specs.shape[1]):
+                m = expired_specs[:, e] != 0
+                if m.any():
+                    self._run_phase(TriggerPhase.ON_REMOVE, expired_specs[m, e], eb[m], ea[m], expired_srcs[m, e])
+        self.skill_cd[b, a] = np.maximum(self.skill_cd[b, a] - 1, 0)
+
+    def _act(self, b: np.ndarray, a: np.ndarray):
+        can_act = ~self.flags['is_stunned'][b, a]
+        b, a = b[can_act], a[can_act]
+        if b.size == 0:
+            return
+        h = self.hero_idx[b, a]
+        ready = self.hero_skill_exists[h] & (self.skill_cd[b, a] == 0)
+        has_skill = ready.any(1)
+
+        # 没有可用技能，执行普通攻击
+        nb, na = b[~has_skill], a[~has_skill]
+        if nb.size:
+            opponents = self._opponent_mask(nb, na)
+            target = np.where(opponents, self.rng.random(opponents.shape), -1.0).argmax(1)
+            is_crit = self.rng.random(nb.size) < self._stat(CRIT_RATE, nb, na)
+            self._take_damage(nb, target, self._stat(ATTACK, nb, na), is_crit)
+
+        if has_skill.any():
+            self._use_skill(b[has_skill], a[has_skill], h[has_skill], ready[has_skill].argmax(1))
+
+    def _use_skill(self, b: np.ndarray, a: np.ndarray, h: np.ndarray, s: np.ndarray):
+        num_units = self.current_hp.shape[1]
+        count = len(b)
+        is_self = self.hero_skill_self[h, s]
+
+        # 选择目标：随机选择指定数量的存活对手，或者自己
+        opponents = self._opponent_mask(b, a)
+        order = np.argsort(np.where(opponents, self.rng.random(opponents.shape), np.inf), axis=1)
+        target_count = np.minimum(self.hero_skill_count[h, s], opponents.sum(1))
+        selected = np.zeros((count, num_units), dtype=bool)
+        selected[np.arange(count)[:, None], order] = np.arange(num_units)[None, :] < target_count[:, None]
+        selected[is_self] = False
+        selected[np.nonzero(is_self)[0], a[is_self]] = True
+        rows, targets = np.nonzero(selected)
+        target_b = b[rows]
+
+        # 1. 计算并施加伤害
+        mult = self.hero_skill_mult[h, s]
+        damage = np.trunc(self._stat(ATTACK, b, a) * mult)
+        is_crit = self.rng.random(count) < self._stat(CRIT_RATE, b, a)
+        hit = (mult > 0)[rows]
+        self._take_damage(target_b[hit], targets[hit], damage[rows][hit], is_crit[rows][hit])
+
+        # 2. 施加效果
+        specs = self.hero_skill_specs[h, s]
+        for j in range(specs.shape[1]):
+            spec = specs[rows, j]
+            m = spec != 0
+            if m.any():
+                self._apply_effect(target_b[m], targets[m], spec[m], a[rows][m])
+
+        # 3. 进入冷却
+        self.skill_cd[b, a, s] = self.hero_skill_cd[h, s] + 1
+
+    # --- 主循环 ---
+
+    def run(self) -> List[Dict[str, Any]]:
+        """推进所有战斗直到结束，返回与 MultiBattle.run 相同格式的结果列表。"""
+        num_battles, num_units = self.current_hp.shape
+        all_battles = np.arange(num_battles)
+        done = ~self._teams_standing()
+
+        while True:
+            active = ~done & (self.turns < self.max_turns)
+            if not active.any():
+                break
+            self.turns[active] += 1
+
+            # 所有存活单位按速度排序，死亡或不存在的单位排在最后
+            speed = self._stat_all(SPEED)
+            order = np.argsort(np.where(self._alive(), -speed, np.inf), axis=1, kind='stable')
+
+            in_round = active.copy()
+            for k in range(num_units):
+                actor = order[:, k]
+                acting = in_round & (self.current_hp[all_battles, actor] > 0) & self.exists[all_battles, actor]
+                b = np.nonzero(acting)[0]
+                if b.size == 0:
+                    continue
+                a = actor[b]
+                self._turn_start(b, a)
+
+                # 没有对手时结束本回合
+                has_opponents = self._opponent_mask(b, a).any(1)
+                in_round[b[~has_opponents]] = False
+                b, a = b[has_opponents], a[has_opponents]
+                if b.size == 0:
+                    continue
+
+                self._act(b, a)
+                self._turn_end(b, a)
+
+                # 检查是否有队伍被全灭
+                in_round[b[~self._teams_standing(b)]] = False
+
+            done = ~self._teams_standing()
+
+        return self._results()
+
+    def _results(self) -> List[Dict[str, Any]]:
+        team1_size = int((self.team == 0).sum())
+        hp_values = self._stat_all(HP).astype(np.int64)
+        alive = self._alive()
+        results = []
+        for n in range(self.current_hp.shape[0]):
+            finals = ([], [])
+            survivors = ([], [])
+            for u in np.nonzero(self.exists[n])[0]:
+                name = self.hero_names[self.hero_idx[n, u]]
+                team = 0 if u < team1_size else 1
+                finals[team].append((name, int(self.current_hp[n, u]), int(hp_values[n, u])))
+                if alive[n, u]:
+                    survivors[team].append(name)
+
+            result = {
+                'winner': None,
+                'survivors': [],
+                'turns': int(self.turns[n]),
+                'team1_final': finals[0],
+                'team2_final': finals[1]
+            }
+            if survivors[0] and not survivors[1]:
+                result['winner'] = 'team1'
+                result['survivors'] = survivors[0]
+            elif survivors[1] and not survivors[0]:
+                result['winner'] = 'team2'
+                result['survivors'] = survivors[1]
+            else:
+                result['winner'] = 'draw'
+            results.append(result)
+        return results